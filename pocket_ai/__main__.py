@@ -7,7 +7,7 @@ import sys
 import argparse
 
 from .server import run_server
-from .agent.agent import PocketAI
+from .agent.agent import AsyncPocketAI, PocketAI
 from .config import update_config
 from .utils.logger import get_logger
 
@@ -23,6 +23,12 @@ def main():
     parser.add_argument("--host", help="Host for the web server")
     parser.add_argument("--headless", action="store_true", help="Run browser in headless mode")
     parser.add_argument("--task", help="Run a single task and exit")
+    parser.add_argument("--llm-backend", choices=["live", "record", "replay", "fake"],
+                        help="LLM backend: live API, record to or replay from a cassette, or scripted responses")
+    parser.add_argument("--cassette", help="Cassette file for the record and replay backends")
+    parser.add_argument("--llm-latency", help="Replay latency in seconds, or 'recorded'")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run the task with the asyncio agent")
     
     # Parse arguments
     args = parser.parse_args()
@@ -41,11 +47,21 @@ def main():
     if args.headless is not None:
         update_config("browser.headless", args.headless)
     
+    if args.llm_backend:
+        update_config("llm.backend.mode", args.llm_backend)
+    
+    if args.cassette:
+        update_config("llm.backend.cassette", args.cassette)
+    
+    if args.llm_latency:
+        latency = args.llm_latency
+        update_config("llm.backend.latency", latency if latency == "recorded" else float(latency))
+    
     # Run a single task if specified
     if args.task:
         logger.info(f"Running task: {args.task}")
         
-        agent = PocketAI()
+        agent = AsyncPocketAI() if args.use_async else PocketAI()
         result = agent.run(args.task)
         
         print("\nTask result:")
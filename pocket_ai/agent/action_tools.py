@@ -0,0 +1,87 @@
+"""
+Action Tools - Messages API tool definitions for the agent's actions
+
+Each action handled by PocketAI._execute_action is declared as a tool with
+a typed input schema, so Claude selects the next action with a tool call
+instead of free-form JSON that has to be parsed out of prose.
+"""
+
+from typing import Dict, Any, List
+
+# Every tool accepts an optional explanation, returned as the action's reasoning
+REASONING_PROPERTY = {
+    "type": "string",
+    "description": "Briefly explain why this is the right next action"
+}
+
+LANGUAGE_PROPERTY = {
+    "type": "string",
+    "enum": ["python", "javascript"],
+    "description": "The programming language of the code"
+}
+
+
+def _tool(name: str, description: str, properties: Dict[str, Any], required: List[str]) -> Dict[str, Any]:
+    """Build a tool definition with the shared reasoning property"""
+    return {
+        "name": name,
+        "description": description,
+        "input_schema": {
+            "type": "object",
+            "properties": {**properties, "reasoning": REASONING_PROPERTY},
+            "required": required
+        }
+    }
+
+
+ACTION_TOOLS: List[Dict[str, Any]] = [
+    _tool(
+        "browse",
+        "Open a URL in the browser and read the page content.",
+        {"url": {"type": "string", "description": "The URL to open"}},
+        ["url"]
+    ),
+    _tool(
+        "click",
+        "Click an element on the currently open page.",
+        {"selector": {"type": "string", "description": "CSS selector of the element to click"}},
+        ["selector"]
+    ),
+    _tool(
+        "type",
+        "Type text into an input element on the currently open page.",
+        {
+            "selector": {"type": "string", "description": "CSS selector of the input element"},
+            "text": {"type": "string", "description": "The text to type"}
+        },
+        ["selector", "text"]
+    ),
+    _tool(
+        "execute_code",
+        "Run a code snippet and return its output.",
+        {"code": {"type": "string", "description": "The code to run"}, "language": LANGUAGE_PROPERTY},
+        ["code"]
+    ),
+    _tool(
+        "search_code",
+        "Search for code examples.",
+        {"query": {"type": "string", "description": "What to search for"}, "language": LANGUAGE_PROPERTY},
+        ["query"]
+    ),
+    _tool(
+        "analyze_code",
+        "Statically analyze a code snippet for problems.",
+        {
+            "code": {"type": "string", "description": "The code to analyze"},
+            "language": LANGUAGE_PROPERTY,
+            "deep": {"type": "boolean", "description": "Also run pylint (slower, more thorough)"}
+        },
+        ["code"]
+    ),
+    _tool(
+        "complete",
+        "Finish the task once it has been accomplished.",
+        {"summary": {"type": "string", "description": "A short summary of the result for the user"}},
+        []
+    ),
+]
@@ -2,13 +2,18 @@
 Agent implementation for ポケットAI (Pocket AI)
 """
 
+import asyncio
 import os
-import json
 from typing import Dict, Any, List, Optional, Union, Callable
 
+from ..config import get_config
 from ..core.agent_loop import AgentLoop
-from ..core.llm import LLMManager
+from ..core.async_runtime import run_sync
+from ..core.llm import LLMManager, LLMError
+from ..core.action_parser import extract_action
+from ..browser.async_browser import AsyncBrowserManager
 from ..browser.browser_manager import BrowserManager
+from .action_tools import ACTION_TOOLS
 from .programming_tools import ProgrammingTools
 from ..utils.logger import get_logger
 
@@ -19,18 +24,22 @@ class PocketAI:
     ポケットAI (Pocket AI) - A Doraemon-inspired AI assistant
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, llm: Optional[LLMManager] = None):
         """
         Initialize the ポケットAI agent
         
         Args:
             api_key: Optional API key for the LLM
+            llm: Optional existing LLM manager to share (its API key takes precedence)
         """
         self.agent_loop = AgentLoop()
-        self.llm = LLMManager(api_key=api_key)
+        self.llm = llm or LLMManager(api_key=api_key)
         self.browser_manager = BrowserManager()
         self.programming_tools = ProgrammingTools()
         
+        # Streamed response whose reasoning is still being read
+        self.pending_response = None
+        
         # Register components in the agent loop
         self._register_components()
         
@@ -67,7 +76,9 @@ class PocketAI:
         if context.get("browser_url"):
             try:
                 with self.browser_manager as browser:
-                    browser.open(context["browser_url"])
+                    # A pooled browser is still on the page from the last action
+                    if browser.current_url != context["browser_url"]:
+                        browser.open(context["browser_url"])
                     observations["browser_content"] = browser.get_content()
                     
                     # Take a screenshot if needed
@@ -94,17 +105,52 @@ class PocketAI:
         Returns:
             Updated context with judgment
         """
-        # Use the LLM to determine the next action
-        context = self.llm.get_next_action(context)
+        try:
+            if get_config("llm.streaming"):
+                # Dispatch as soon as the action and parameters have streamed in;
+                # the reasoning keeps arriving in the background
+                response = self.llm.stream_next_action(context)
+                action_data = response.wait_for_action()
+                if action_data is not None:
+                    response.drain_in_background()
+                    self.pending_response = response
+                    context["next_action"] = response.text
+                    context["parsed_action"] = action_data
+                    return context
+                
+                context["next_action"] = response.finish()
+            elif get_config("llm.tool_use"):
+                # Let the LLM pick the action with a tool call
+                return self.llm.get_next_action(context, tools=ACTION_TOOLS)
+            else:
+                # Use the LLM to determine the next action
+                context = self.llm.get_next_action(context)
+        except LLMError as e:
+            # Don't act on a made-up response; end the task with the error
+            logger.error(f"Could not get the next action: {e}")
+            context["error"] = str(e)
+            context["stop_reason"] = "llm_error"
+            return context
+        
+        return self._parse_next_action(context)
+    
+    def _parse_next_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parse the action out of the LLM's free-form response
         
-        # Parse the next action
+        Args:
+            context: The current context with next_action
+            
+        Returns:
+            Updated context with parsed_action
+        """
         next_action = context.get("next_action", "")
         
-        try:
-            # Try to parse as JSON
-            action_data = json.loads(next_action)
+        # Find the JSON action even when it is wrapped in prose or code fences
+        action_data = extract_action(next_action)
+        if action_data is not None:
             context["parsed_action"] = action_data
-        except:
+        else:
             # If parsing fails, use the raw text
             context["parsed_action"] = {
                 "action": "unknown",
@@ -140,7 +186,7 @@ class PocketAI:
                         results["browser_content"] = browser.get_content()
                         
                         # Set the URL for future observations
-                        context["browser_url"] = url
+                        context["browser_url"] = browser.current_url or url
                 else:
                     results["error"] = "No URL provided for browse action"
             
@@ -188,14 +234,14 @@ class PocketAI:
                 code = parameters.get("code", "")
                 language = parameters.get("language", "python")
                 if code:
-                    results = self.programming_tools.analyze_code(code, language)
+                    results = self.programming_tools.analyze_code(code, language, deep=parameters.get("deep"))
                 else:
                     results["error"] = "No code provided for analyze_code action"
             
             elif action == "complete":
                 # Mark the task as complete
                 context["complete"] = True
-                results["message"] = "Task completed successfully"
+                results["message"] = parameters.get("summary") or "Task completed successfully"
             
             else:
                 results["error"] = f"Unknown action: {action}"
@@ -209,6 +255,22 @@ class PocketAI:
         
         return context
     
+    def _finish_pending_response(self, context: Dict[str, Any]) -> None:
+        """
+        Wait for a streamed response and fill in its reasoning
+        
+        Args:
+            context: The current context
+        """
+        if self.pending_response is None:
+            return
+        
+        response, self.pending_response = self.pending_response, None
+        context["next_action"] = response.finish()
+        
+        action_data = context.get("parsed_action", {})
+        action_data["reasoning"] = response.parser.get_action()["reasoning"]
+    
     def _evaluate_results(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Evaluate the results of the action
@@ -219,6 +281,8 @@ class PocketAI:
         Returns:
             Updated context with evaluation
         """
+        self._finish_pending_response(context)
+        
         action_data = context.get("parsed_action", {})
         action = action_data.get("action", "unknown")
         results = context.get("action_results", {})
@@ -238,15 +302,222 @@ class PocketAI:
         
         return context
     
-    def run(self, task: str, initial_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def run(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+            should_stop: Optional[Callable[[], bool]] = None,
+            resume_task_id: Optional[str] = None,
+            budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Run the agent for a given task
         
         Args:
             task: The task to perform
             initial_context: Optional initial context
+            should_stop: Optional callable that stops the loop early when it returns True
+            resume_task_id: Optional id of an interrupted task to resume from its last checkpoint
+            budget: Optional deadline, token and sandbox CPU limits (see AgentLoop.run)
+            
+        Returns:
+            Final context after completing the task
+        """
+        try:
+            return self.agent_loop.run(task, initial_context, should_stop=should_stop,
+                                       resume_task_id=resume_task_id, budget=budget)
+        finally:
+            self.pending_response = None
+            # Return the task's browser to the pool
+            self.browser_manager.close_browser()
+
+class AsyncPocketAI(PocketAI):
+    """
+    ポケットAI on asyncio
+    
+    LLM requests, browsing and code execution are awaited instead of
+    blocking a thread, so one event loop can drive hundreds of agents at
+    once (one AsyncPocketAI per concurrent task, sharing an LLMManager).
+    Streaming next actions (llm.streaming) is not supported; actions are
+    chosen with a tool call or free-form JSON as with llm.streaming off.
+    """
+    
+    # Actions whose I/O is awaited; the rest are quick or CPU-bound and run on a thread
+    ASYNC_ACTIONS = ("browse", "click", "type", "execute_code")
+    
+    def __init__(self, api_key: Optional[str] = None, llm: Optional[LLMManager] = None):
+        """
+        Initialize the agent
+        
+        Args:
+            api_key: Optional API key for the LLM
+            llm: Optional existing LLM manager to share (its API key takes precedence)
+        """
+        super().__init__(api_key=api_key, llm=llm)
+        self.browser_manager = AsyncBrowserManager()
+    
+    def _register_components(self) -> None:
+        """Register the async components in the agent loop"""
+        self.agent_loop.register_observer(self._aobserve_environment)
+        self.agent_loop.register_judge(self._ajudge_next_action)
+        self.agent_loop.register_actor(self._aexecute_action)
+        self.agent_loop.register_evaluator(self._evaluate_results)
+    
+    async def _aobserve_environment(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Observe the environment
+        
+        Args:
+            context: The current context
+            
+        Returns:
+            Updated context with observations
+        """
+        observations = {}
+        
+        if context.get("browser_url"):
+            try:
+                async with self.browser_manager as browser:
+                    if browser.current_url != context["browser_url"]:
+                        await browser.open(context["browser_url"])
+                    observations["browser_content"] = await browser.get_content()
+                    
+                    if context.get("take_screenshot", False):
+                        screenshot_path = f"/tmp/pocket_ai_screenshot_{context['task_id']}_{context['iterations']}.png"
+                        await browser.screenshot(screenshot_path)
+                        observations["screenshot_path"] = screenshot_path
+            except Exception as e:
+                logger.error(f"Error observing browser: {e}")
+                observations["browser_error"] = str(e)
+        
+        context["observations"] = observations
+        
+        return context
+    
+    async def _ajudge_next_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Judge what action to take next
+        
+        Args:
+            context: The current context
+            
+        Returns:
+            Updated context with judgment
+        """
+        try:
+            if get_config("llm.tool_use"):
+                return await self.llm.aget_next_action(context, tools=ACTION_TOOLS)
+            context = await self.llm.aget_next_action(context)
+        except LLMError as e:
+            logger.error(f"Could not get the next action: {e}")
+            context["error"] = str(e)
+            context["stop_reason"] = "llm_error"
+            return context
+        
+        return self._parse_next_action(context)
+    
+    async def _aexecute_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the chosen action
+        
+        Args:
+            context: The current context
+            
+        Returns:
+            Updated context with action results
+        """
+        action_data = context.get("parsed_action", {})
+        action = action_data.get("action", "unknown")
+        parameters = action_data.get("parameters", {})
+        
+        if action not in self.ASYNC_ACTIONS:
+            return await asyncio.to_thread(self._execute_action, context)
+        
+        results = {}
+        
+        try:
+            if action == "browse":
+                url = parameters.get("url", "")
+                if url:
+                    async with self.browser_manager as browser:
+                        await browser.open(url)
+                        results["browser_content"] = await browser.get_content()
+                        context["browser_url"] = browser.current_url or url
+                else:
+                    results["error"] = "No URL provided for browse action"
+            
+            elif action == "click":
+                selector = parameters.get("selector", "")
+                if selector and context.get("browser_url"):
+                    async with self.browser_manager as browser:
+                        await browser.click(selector)
+                        results["browser_content"] = await browser.get_content()
+                else:
+                    results["error"] = "No selector or browser URL provided for click action"
+            
+            elif action == "type":
+                selector = parameters.get("selector", "")
+                text = parameters.get("text", "")
+                if selector and text and context.get("browser_url"):
+                    async with self.browser_manager as browser:
+                        await browser.type(selector, text)
+                        results["browser_content"] = await browser.get_content()
+                else:
+                    results["error"] = "No selector, text, or browser URL provided for type action"
+            
+            elif action == "execute_code":
+                code = parameters.get("code", "")
+                language = parameters.get("language", "python")
+                if code:
+                    results = await self.programming_tools.aexecute_code(code, language)
+                else:
+                    results["error"] = "No code provided for execute_code action"
+        
+        except Exception as e:
+            logger.error(f"Error executing action {action}: {e}")
+            results["error"] = str(e)
+        
+        context["action_results"] = results
+        
+        return context
+    
+    async def arun(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None,
+                   resume_task_id: Optional[str] = None,
+                   budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run the agent for a given task on the running event loop
+        
+        Args:
+            task: The task to perform
+            initial_context: Optional initial context
+            should_stop: Optional callable that stops the loop early when it returns True
+            resume_task_id: Optional id of an interrupted task to resume from its last checkpoint
+            budget: Optional deadline, token and sandbox CPU limits (see AgentLoop.run)
+            
+        Returns:
+            Final context after completing the task
+        """
+        try:
+            return await self.agent_loop.arun(task, initial_context, should_stop=should_stop,
+                                              resume_task_id=resume_task_id, budget=budget)
+        finally:
+            await self.browser_manager.close_browser()
+    
+    def run(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+            should_stop: Optional[Callable[[], bool]] = None,
+            resume_task_id: Optional[str] = None,
+            budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run the agent for a given task, blocking until it finishes
+        
+        The task runs on the process-wide event loop (see core.async_runtime),
+        so the async clients are reused across calls.
+        
+        Args:
+            task: The task to perform
+            initial_context: Optional initial context
+            should_stop: Optional callable that stops the loop early when it returns True
+            resume_task_id: Optional id of an interrupted task to resume from its last checkpoint
+            budget: Optional deadline, token and sandbox CPU limits (see AgentLoop.run)
             
         Returns:
             Final context after completing the task
         """
-        return self.agent_loop.run(task, initial_context)
\ No newline at end of file
+        return run_sync(self.arun(task, initial_context, should_stop, resume_task_id, budget))
@@ -0,0 +1,193 @@
+"""
+Agent Cache - Keeps warm ポケットAI agents per API key
+
+Building a PocketAI creates a new Anthropic client (with its own connection
+pool), a browser manager and an agent loop. The cache keeps one LLM client
+per API key and a few idle agents on top of it. Each checkout gets an agent
+to itself, so concurrent requests never share mutable loop state.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+from .agent import PocketAI
+from ..core.llm import LLMManager
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def hash_api_key(api_key: Optional[str]) -> str:
+    """
+    Hash an API key for use as a cache key
+
+    Args:
+        api_key: The API key (empty or None for the configured default)
+
+    Returns:
+        Hex digest identifying the key
+    """
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+class AgentCacheEntry:
+    """The shared LLM client and idle agents for one API key"""
+
+    def __init__(self, api_key: Optional[str]):
+        """
+        Initialize the entry
+
+        Args:
+            api_key: The API key for the LLM client
+        """
+        self.llm = LLMManager(api_key=api_key or None)
+        self.idle: List[PocketAI] = []
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+class AgentCache:
+    """
+    A bounded LRU of warm agents keyed by a hash of the API key
+    """
+
+    def __init__(self,
+                 max_keys: Optional[int] = None,
+                 max_idle_per_key: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        Initialize the agent cache
+
+        Args:
+            max_keys: Maximum number of API keys kept in the cache
+            max_idle_per_key: Maximum number of idle agents kept per API key
+            ttl: Seconds an unused API key entry is kept
+        """
+        self.max_keys = max_keys or get_config("agent_cache.max_keys")
+        self.max_idle_per_key = max_idle_per_key if max_idle_per_key is not None else get_config("agent_cache.max_idle_per_key")
+        self.ttl = ttl if ttl is not None else get_config("agent_cache.ttl")
+
+        self.entries: "OrderedDict[str, AgentCacheEntry]" = OrderedDict()
+        self.owners: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "clients_created": 0,
+            "evictions": 0,
+        }
+
+    def _evict(self) -> None:
+        """Drop expired entries and shrink to max_keys (lock must be held)"""
+        now = time.time()
+        for key, entry in list(self.entries.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.ttl:
+                del self.entries[key]
+                self.counters["evictions"] += 1
+
+        # Least recently used entries are at the front
+        for key, entry in list(self.entries.items()):
+            if len(self.entries) <= self.max_keys:
+                break
+            if entry.in_use == 0:
+                del self.entries[key]
+                self.counters["evictions"] += 1
+
+    def checkout(self, api_key: Optional[str] = None) -> PocketAI:
+        """
+        Check out an agent for the given API key
+
+        Args:
+            api_key: The API key (empty or None for the configured default)
+
+        Returns:
+            An agent reserved for the caller until checkin
+        """
+        key = hash_api_key(api_key)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = AgentCacheEntry(api_key)
+                self.entries[key] = entry
+                self.counters["clients_created"] += 1
+            self.entries.move_to_end(key)
+
+            entry.in_use += 1
+            entry.last_used = time.time()
+
+            if entry.idle:
+                agent = entry.idle.pop()
+                self.counters["hits"] += 1
+            else:
+                agent = None
+                self.counters["misses"] += 1
+
+            self._evict()
+
+        if agent is None:
+            # Share the LLM client but give the agent its own loop and browser
+            agent = PocketAI(llm=entry.llm)
+
+        with self.lock:
+            self.owners[id(agent)] = key
+
+        return agent
+
+    def checkin(self, agent: PocketAI) -> None:
+        """
+        Return an agent to the cache
+
+        Args:
+            agent: The agent returned by checkout
+        """
+        with self.lock:
+            key = self.owners.pop(id(agent), None)
+            entry = self.entries.get(key) if key is not None else None
+            if entry is None:
+                return
+
+            entry.in_use -= 1
+            entry.last_used = time.time()
+            if len(entry.idle) < self.max_idle_per_key:
+                entry.idle.append(agent)
+
+            self._evict()
+
+    @contextmanager
+    def agent(self, api_key: Optional[str] = None) -> Iterator[PocketAI]:
+        """
+        Context manager that checks an agent out and back in
+
+        Args:
+            api_key: The API key (empty or None for the configured default)
+
+        Yields:
+            An agent reserved for the caller
+        """
+        agent = self.checkout(api_key)
+        try:
+            yield agent
+        finally:
+            self.checkin(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with cache size, usage and lifetime counters
+        """
+        with self.lock:
+            return {
+                "keys": len(self.entries),
+                "max_keys": self.max_keys,
+                "idle_agents": sum(len(entry.idle) for entry in self.entries.values()),
+                "agents_in_use": sum(entry.in_use for entry in self.entries.values()),
+                **self.counters,
+            }
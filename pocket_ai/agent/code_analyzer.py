@@ -0,0 +1,348 @@
+"""
+Code Analyzer - Fast in-process static analysis for Python snippets
+
+Parses the snippet with ast and symtable instead of starting pylint, and
+reports syntax errors, undefined names, unused imports and the cyclomatic
+complexity of every function. Results are cached by a hash of the code.
+"""
+
+import ast
+import builtins
+import copy
+import hashlib
+import symtable
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Name used for the snippet in diagnostics
+SNIPPET_FILENAME = "main.py"
+
+# Module attributes that exist without being assigned
+MODULE_NAMES = {"__name__", "__file__", "__doc__", "__builtins__", "__spec__",
+                "__loader__", "__package__", "__annotations__", "__path__", "__cached__"}
+
+# Upper bounds of the "low" and "medium" complexity ratings
+COMPLEXITY_LOW = 5
+COMPLEXITY_MEDIUM = 10
+
+
+def _diagnostic(line: int, column: int, code: str, message: str) -> Dict[str, Any]:
+    """Build a diagnostic entry"""
+    return {"line": line, "column": column, "code": code, "message": message}
+
+
+class ComplexityVisitor(ast.NodeVisitor):
+    """
+    Computes McCabe cyclomatic complexity for one function body
+
+    Nested functions and classes are scored separately and do not add to
+    the enclosing function.
+    """
+
+    def __init__(self):
+        """Initialize the visitor"""
+        self.complexity = 1
+
+    def _branch(self, node: ast.AST) -> None:
+        """Count a node that adds one decision point"""
+        self.complexity += 1
+        self.generic_visit(node)
+
+    visit_If = _branch
+    visit_For = _branch
+    visit_AsyncFor = _branch
+    visit_While = _branch
+    visit_IfExp = _branch
+    visit_ExceptHandler = _branch
+    visit_match_case = _branch
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        """Count each short-circuit operator"""
+        self.complexity += len(node.values) - 1
+        self.generic_visit(node)
+
+    def visit_comprehension(self, node: ast.comprehension) -> None:
+        """Count a comprehension's loop and its conditions"""
+        self.complexity += 1 + len(node.ifs)
+        self.generic_visit(node)
+
+    def _skip(self, node: ast.AST) -> None:
+        """Do not descend into nested scopes"""
+        pass
+
+    visit_FunctionDef = _skip
+    visit_AsyncFunctionDef = _skip
+    visit_ClassDef = _skip
+
+
+def function_complexities(tree: ast.Module) -> List[Dict[str, Any]]:
+    """
+    Score every function (and the module body) of a parsed snippet
+
+    Args:
+        tree: The parsed module
+
+    Returns:
+        List of {"name", "line", "complexity"} entries; methods are named
+        Class.method
+    """
+    results = []
+
+    def score(name: str, line: int, body: List[ast.stmt]) -> None:
+        visitor = ComplexityVisitor()
+        for statement in body:
+            visitor.visit(statement)
+        results.append({"name": name, "line": line, "complexity": visitor.complexity})
+
+    def walk(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                score(prefix + child.name, child.lineno, child.body)
+                walk(child, f"{prefix}{child.name}.")
+            elif isinstance(child, ast.ClassDef):
+                walk(child, f"{prefix}{child.name}.")
+            else:
+                walk(child, prefix)
+
+    score("<module>", 1, tree.body)
+    walk(tree, "")
+    return results
+
+
+def complexity_rating(complexity: int) -> str:
+    """
+    Rate a cyclomatic complexity
+
+    Args:
+        complexity: The highest complexity in the snippet
+
+    Returns:
+        "low", "medium" or "high"
+    """
+    if complexity <= COMPLEXITY_LOW:
+        return "low"
+    if complexity <= COMPLEXITY_MEDIUM:
+        return "medium"
+    return "high"
+
+
+def _first_loads(tree: ast.Module) -> Dict[str, ast.Name]:
+    """Map each loaded name to its first occurrence"""
+    loads: Dict[str, ast.Name] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            first = loads.get(node.id)
+            if first is None or (node.lineno, node.col_offset) < (first.lineno, first.col_offset):
+                loads[node.id] = node
+    return loads
+
+
+def find_undefined_names(code: str, tree: ast.Module) -> List[Dict[str, Any]]:
+    """
+    Find names that are read but never bound anywhere they could resolve to
+
+    Args:
+        code: The source code
+        tree: The parsed module
+
+    Returns:
+        Diagnostics for undefined names
+    """
+    # A star import can bind anything
+    if any(isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names)
+           for node in ast.walk(tree)):
+        return []
+
+    table = symtable.symtable(code, SNIPPET_FILENAME, "exec")
+    defined: Set[str] = set(dir(builtins)) | MODULE_NAMES
+    referenced: Set[str] = set()
+
+    def collect(scope: symtable.SymbolTable, is_module: bool) -> None:
+        for symbol in scope.get_symbols():
+            name = symbol.get_name()
+            bound = symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()
+            if bound and (is_module or symbol.is_declared_global()):
+                defined.add(name)
+            if symbol.is_referenced() and symbol.is_global() and not (is_module and bound):
+                referenced.add(name)
+        for child in scope.get_children():
+            collect(child, False)
+
+    collect(table, True)
+
+    loads = _first_loads(tree)
+    diagnostics = []
+    for name in sorted(referenced - defined):
+        node = loads.get(name)
+        line, column = (node.lineno, node.col_offset) if node is not None else (0, 0)
+        diagnostics.append(_diagnostic(line, column, "undefined-name", f"Undefined name '{name}'"))
+
+    return sorted(diagnostics, key=lambda d: (d["line"], d["column"]))
+
+
+def _string_annotation_names(annotation: Optional[ast.expr]) -> Set[str]:
+    """Collect the names used inside string (forward reference) annotations"""
+    names: Set[str] = set()
+    if annotation is None:
+        return names
+
+    for node in ast.walk(annotation):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            try:
+                parsed = ast.parse(node.value.strip(), mode="eval")
+            except SyntaxError:
+                continue
+            names.update(child.id for child in ast.walk(parsed) if isinstance(child, ast.Name))
+            names.update(_string_annotation_names(parsed.body))
+    return names
+
+
+def find_unused_imports(tree: ast.Module) -> List[Dict[str, Any]]:
+    """
+    Find imported names that are never used
+
+    Args:
+        tree: The parsed module
+
+    Returns:
+        Diagnostics for unused imports
+    """
+    used: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, ast.AnnAssign):
+            used.update(_string_annotation_names(node.annotation))
+        elif isinstance(node, ast.arg):
+            used.update(_string_annotation_names(node.annotation))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            used.update(_string_annotation_names(node.returns))
+        elif isinstance(node, ast.Assign):
+            # Names re-exported through __all__ count as used
+            if any(isinstance(target, ast.Name) and target.id == "__all__" for target in node.targets) \
+                    and isinstance(node.value, (ast.List, ast.Tuple)):
+                used.update(elt.value for elt in node.value.elts
+                            if isinstance(elt, ast.Constant) and isinstance(elt.value, str))
+
+    diagnostics = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                bound = alias.asname or alias.name.split(".")[0]
+                if bound not in used:
+                    diagnostics.append(_diagnostic(node.lineno, node.col_offset, "unused-import",
+                                                   f"'{alias.name}' imported but unused"))
+        elif isinstance(node, ast.ImportFrom) and node.module != "__future__":
+            for alias in node.names:
+                bound = alias.asname or alias.name
+                if alias.name != "*" and bound not in used:
+                    diagnostics.append(_diagnostic(node.lineno, node.col_offset, "unused-import",
+                                                   f"'{node.module or '.'}.{alias.name}' imported but unused"))
+
+    return sorted(diagnostics, key=lambda d: (d["line"], d["column"]))
+
+
+def _suggestions(tree: ast.Module, functions: List[Dict[str, Any]], unused: List[Dict[str, Any]]) -> List[str]:
+    """Derive suggestions from the analysis"""
+    suggestions = []
+
+    for function in functions:
+        if function["name"] != "<module>" and function["complexity"] > COMPLEXITY_MEDIUM:
+            suggestions.append(f"Consider splitting {function['name']} (complexity {function['complexity']})")
+
+    undocumented = [node.name for node in ast.walk(tree)
+                    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+                    and not node.name.startswith("_") and ast.get_docstring(node) is None]
+    if undocumented:
+        suggestions.append(f"Add docstrings to: {', '.join(undocumented)}")
+
+    unannotated = [node.name for node in ast.walk(tree)
+                   if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                   and node.returns is None and not any(arg.annotation for arg in node.args.args)]
+    if unannotated:
+        suggestions.append(f"Add type hints to: {', '.join(unannotated)}")
+
+    if unused:
+        suggestions.append("Remove unused imports")
+
+    return suggestions
+
+
+def analyze_source(code: str) -> Dict[str, Any]:
+    """
+    Analyze Python source without using the cache
+
+    Args:
+        code: The source code
+
+    Returns:
+        Dictionary with issues, suggestions, complexity, max_complexity,
+        functions and diagnostics
+    """
+    result: Dict[str, Any] = {
+        "issues": [],
+        "suggestions": [],
+        "complexity": "low",
+        "max_complexity": 0,
+        "functions": [],
+        "diagnostics": [],
+    }
+
+    try:
+        tree = ast.parse(code, SNIPPET_FILENAME)
+    except SyntaxError as e:
+        diagnostic = _diagnostic(e.lineno or 0, (e.offset or 1) - 1, "syntax-error", f"Syntax error: {e.msg}")
+        result["diagnostics"].append(diagnostic)
+        result["issues"].append(f"{SNIPPET_FILENAME}:{diagnostic['line']}:{diagnostic['column']}: {diagnostic['message']}")
+        return result
+
+    functions = function_complexities(tree)
+    unused = find_unused_imports(tree)
+    diagnostics = sorted(find_undefined_names(code, tree) + unused, key=lambda d: (d["line"], d["column"]))
+
+    result["functions"] = functions
+    result["max_complexity"] = max(function["complexity"] for function in functions)
+    result["complexity"] = complexity_rating(result["max_complexity"])
+    result["diagnostics"] = diagnostics
+    result["issues"] = [f"{SNIPPET_FILENAME}:{d['line']}:{d['column']}: {d['message']} ({d['code']})" for d in diagnostics]
+    result["suggestions"] = _suggestions(tree, functions, unused)
+    return result
+
+
+# Analysis results by code hash, most recently used last
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def analyze_python(code: str) -> Dict[str, Any]:
+    """
+    Analyze Python source, reusing the result for code seen before
+
+    Args:
+        code: The source code
+
+    Returns:
+        Dictionary with issues, suggestions, complexity, max_complexity,
+        functions and diagnostics (a copy the caller may modify)
+    """
+    key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return copy.deepcopy(result)
+
+    result = analyze_source(code)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > get_config("analysis.cache_size"):
+            _cache.popitem(last=False)
+
+    return copy.deepcopy(result)
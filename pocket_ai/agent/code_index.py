@@ -0,0 +1,553 @@
+"""
+Code Index - Local trigram index behind ProgrammingTools.search_code
+
+Source files under the configured directories are indexed by the trigrams
+of their lowercased content. The index lives on disk as immutable segment
+files that are memory-mapped for lookups, plus a JSON manifest that maps
+document ids to paths and records each file's mtime. A refresh only reads
+files whose mtime or size changed: their old ids are tombstoned and the new
+versions go into a fresh segment. Segments are merged once there are too
+many of them.
+
+A query is narrowed to candidate files by intersecting trigram postings,
+then the candidates are read and ranked by term frequency, term rarity and
+file name matches.
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# File extensions indexed, by language
+LANGUAGE_EXTENSIONS = {
+    "python": (".py", ".pyi"),
+    "javascript": (".js", ".mjs", ".cjs", ".jsx"),
+    "typescript": (".ts", ".tsx"),
+    "java": (".java",),
+    "go": (".go",),
+    "rust": (".rs",),
+    "c": (".c", ".h"),
+    "cpp": (".cc", ".cpp", ".cxx", ".hpp", ".hh"),
+    "ruby": (".rb",),
+    "php": (".php",),
+    "shell": (".sh", ".bash"),
+}
+
+EXTENSION_LANGUAGES = {ext: language for language, exts in LANGUAGE_EXTENSIONS.items() for ext in exts}
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Lines of context shown around the best matching line
+CONTEXT_LINES = 3
+
+
+def file_language(path: str) -> Optional[str]:
+    """Get the language of a file from its extension (None if not indexed)"""
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+
+def trigrams(data: bytes) -> Set[int]:
+    """
+    Get the distinct trigrams of a byte string
+
+    Args:
+        data: The (lowercased) content
+
+    Returns:
+        Set of trigrams packed into 24-bit integers
+    """
+    return {int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2)}
+
+
+def _contains(ids: array, document_id: int) -> bool:
+    """Check whether a sorted postings list contains a document"""
+    position = bisect_left(ids, document_id)
+    return position < len(ids) and ids[position] == document_id
+
+
+class IndexSegment:
+    """
+    An immutable on-disk segment mapping trigrams to sorted document ids
+
+    Layout: a header, the postings (uint32 document ids), then a table of
+    (trigram, offset, count) entries sorted by trigram for binary search.
+    """
+
+    MAGIC = b"PAIX"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIIQ")  # magic, version, entry count, entry table offset
+    ENTRY = struct.Struct("<III")  # trigram, postings offset (in ids), postings count
+
+    def __init__(self, path: str):
+        """
+        Open a segment
+
+        Args:
+            path: The segment file
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, self.entries_offset = self.HEADER.unpack_from(self.mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Not a code index segment: {path}")
+
+    @classmethod
+    def write(cls, path: str, postings: Iterator[Tuple[int, array]]) -> None:
+        """
+        Write a segment
+
+        Args:
+            path: The segment file to create
+            postings: (trigram, document ids) pairs in ascending trigram order
+        """
+        entries = array("I")
+        offset = 0
+        count = 0
+
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"\0" * cls.HEADER.size)
+            for trigram, ids in postings:
+                if not ids:
+                    continue
+                if sys.byteorder == "big":
+                    ids = array("I", ids)
+                    ids.byteswap()
+                ids.tofile(f)
+                entries.extend((trigram, offset, len(ids)))
+                offset += len(ids)
+                count += 1
+
+            entries_offset = f.tell()
+            if sys.byteorder == "big":
+                entries.byteswap()
+            entries.tofile(f)
+
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, count, entries_offset))
+
+        os.replace(path + ".tmp", path)
+
+    def _read_ids(self, offset: int, count: int) -> array:
+        """Read a postings list"""
+        start = self.HEADER.size + offset * 4
+        ids = array("I")
+        ids.frombytes(self.mmap[start:start + count * 4])
+        if sys.byteorder == "big":
+            ids.byteswap()
+        return ids
+
+    def lookup(self, trigram: int) -> array:
+        """
+        Get the documents containing a trigram
+
+        Args:
+            trigram: The packed trigram
+
+        Returns:
+            Sorted document ids (empty if the trigram does not occur)
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            key, offset, count = self.ENTRY.unpack_from(self.mmap, self.entries_offset + middle * self.ENTRY.size)
+            if key == trigram:
+                return self._read_ids(offset, count)
+            if key < trigram:
+                low = middle + 1
+            else:
+                high = middle
+        return array("I")
+
+    def postings(self) -> Iterator[Tuple[int, array]]:
+        """Iterate over all (trigram, document ids) pairs in trigram order"""
+        for index in range(self.count):
+            key, offset, count = self.ENTRY.unpack_from(self.mmap, self.entries_offset + index * self.ENTRY.size)
+            yield key, self._read_ids(offset, count)
+
+
+class CodeIndex:
+    """
+    Incrementally updated trigram index over local source directories
+    """
+
+    def __init__(self,
+                 index_dir: Optional[str] = None,
+                 paths: Optional[List[str]] = None,
+                 max_file_bytes: Optional[int] = None,
+                 max_segments: Optional[int] = None):
+        """
+        Initialize the index, loading what is already on disk
+
+        Args:
+            index_dir: Directory holding the manifest and segment files
+            paths: Directories to index
+            max_file_bytes: Larger files are skipped
+            max_segments: Segments are merged when there are more than this
+        """
+        self.index_dir = index_dir or get_config("code_search.index_dir")
+        self.paths = [os.path.abspath(os.path.expanduser(p)) for p in (paths if paths is not None else get_config("code_search.paths"))]
+        self.max_file_bytes = max_file_bytes or get_config("code_search.max_file_bytes")
+        self.max_segments = max_segments or get_config("code_search.max_segments")
+        self.exclude_dirs = set(get_config("code_search.exclude_dirs") or [])
+
+        # path -> [document id, mtime_ns, size, language]
+        self.files: Dict[str, List[Any]] = {}
+        # document id -> (path, language) for live documents
+        self.documents: Dict[int, Tuple[str, str]] = {}
+        self.deleted: Set[int] = set()
+        self.segments: List[IndexSegment] = []
+        self.next_id = 0
+        self.built_at = 0.0
+
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.refresh_thread: Optional[threading.Thread] = None
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Load the manifest and open its segments"""
+        manifest_path = os.path.join(self.index_dir, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return
+
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            segments = [IndexSegment(os.path.join(self.index_dir, name)) for name in manifest["segments"]]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable code index in {self.index_dir}: {e}")
+            return
+
+        self.files = manifest["files"]
+        self.deleted = set(manifest["deleted"])
+        self.next_id = manifest["next_id"]
+        self.built_at = manifest.get("built_at", 0.0)
+        self.segments = segments
+        self.documents = {entry[0]: (path, entry[3]) for path, entry in self.files.items()}
+
+    def _save(self, segment_names: List[str]) -> None:
+        """Write the manifest atomically (refresh lock must be held)"""
+        manifest = {
+            "next_id": self.next_id,
+            "built_at": self.built_at,
+            "segments": segment_names,
+            "deleted": sorted(self.deleted),
+            "files": self.files,
+        }
+        manifest_path = os.path.join(self.index_dir, MANIFEST_FILENAME)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _scan(self) -> Dict[str, Tuple[int, int, str]]:
+        """Find indexable files: path -> (mtime_ns, size, language)"""
+        found = {}
+        for root in self.paths:
+            for directory, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in self.exclude_dirs and not d.startswith(".")]
+                for filename in filenames:
+                    language = file_language(filename)
+                    if language is None:
+                        continue
+                    path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if stat.st_size <= self.max_file_bytes:
+                        found[path] = (stat.st_mtime_ns, stat.st_size, language)
+        return found
+
+    def _read(self, path: str) -> Optional[bytes]:
+        """Read a file's content, or None if it is unreadable or binary"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None
+        return data
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Bring the index up to date with the files on disk
+
+        Returns:
+            Dictionary with counts of added, updated, removed and unchanged files
+        """
+        with self.refresh_lock:
+            started_at = time.time()
+            found = self._scan()
+            counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+            files = dict(self.files)
+            deleted = set(self.deleted)
+            postings: Dict[int, array] = {}
+
+            for path in [p for p in files if p not in found]:
+                deleted.add(files.pop(path)[0])
+                counts["removed"] += 1
+
+            for path in sorted(found):
+                mtime_ns, size, language = found[path]
+                entry = files.get(path)
+                if entry is not None and entry[1] == mtime_ns and entry[2] == size:
+                    counts["unchanged"] += 1
+                    continue
+
+                data = self._read(path)
+                if entry is not None:
+                    deleted.add(entry[0])
+                    del files[path]
+                if data is None:
+                    continue
+
+                document_id = self.next_id
+                self.next_id += 1
+                for trigram in trigrams(data.lower()):
+                    postings.setdefault(trigram, array("I")).append(document_id)
+                files[path] = [document_id, mtime_ns, size, language]
+                counts["updated" if entry is not None else "added"] += 1
+
+            segment_names = [os.path.basename(segment.path) for segment in self.segments]
+            segments = list(self.segments)
+
+            if postings:
+                name = f"segment-{self.next_id:010d}.idx"
+                IndexSegment.write(os.path.join(self.index_dir, name), iter(sorted(postings.items())))
+                segments.append(IndexSegment(os.path.join(self.index_dir, name)))
+                segment_names.append(name)
+
+            if len(segments) > self.max_segments:
+                segments, segment_names = self._merge(segments, deleted)
+                deleted = set()
+
+            self.built_at = time.time()
+            self.files = files
+            self.deleted = deleted
+            self._save(segment_names)
+
+            with self.lock:
+                self.segments = segments
+                self.documents = {entry[0]: (path, entry[3]) for path, entry in files.items()}
+
+            self._remove_stale_segments(segment_names)
+            logger.info(f"Refreshed code index in {time.time() - started_at:.2f}s: {counts}")
+            return counts
+
+    def _merge(self, segments: List[IndexSegment], deleted: Set[int]) -> Tuple[List[IndexSegment], List[str]]:
+        """Merge all segments into one, dropping deleted documents"""
+        def tagged(index: int, segment: IndexSegment) -> Iterator[Tuple[int, int, array]]:
+            for key, postings in segment.postings():
+                yield key, index, postings
+
+        def merged() -> Iterator[Tuple[int, array]]:
+            current, ids = None, array("I")
+            # Later segments hold higher ids, so concatenating keeps each list sorted
+            streams = [tagged(index, segment) for index, segment in enumerate(segments)]
+            for key, _, postings in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+                if key != current:
+                    if current is not None:
+                        yield current, ids
+                    current, ids = key, array("I")
+                ids.extend(d for d in postings if d not in deleted)
+            if current is not None:
+                yield current, ids
+
+        name = f"segment-{self.next_id:010d}-merged.idx"
+        IndexSegment.write(os.path.join(self.index_dir, name), merged())
+        logger.info(f"Merged {len(segments)} code index segments")
+        return [IndexSegment(os.path.join(self.index_dir, name))], [name]
+
+    def _remove_stale_segments(self, keep: List[str]) -> None:
+        """Delete segment files that are no longer in the manifest"""
+        for name in os.listdir(self.index_dir):
+            if name.startswith("segment-") and name not in keep:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+
+    def refresh_if_stale(self) -> None:
+        """Refresh synchronously if never built, or in the background if out of date"""
+        if not self.built_at:
+            self.refresh()
+            return
+
+        if time.time() - self.built_at < get_config("code_search.refresh_interval"):
+            return
+
+        with self.lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+            self.refresh_thread.start()
+
+    def _term_candidates(self, term: str, segments: List[IndexSegment], live: Dict[int, Tuple[str, str]]) -> Set[int]:
+        """Get the live documents that contain every trigram of a term"""
+        postings = [[segment.lookup(trigram) for segment in segments] for trigram in trigrams(term.encode("utf-8"))]
+        postings.sort(key=lambda lists: sum(len(ids) for ids in lists))
+
+        # Start from the rarest trigram and probe the sorted lists of the others
+        candidates = {d for ids in postings[0] for d in ids if d in live}
+        for lists in postings[1:]:
+            if not candidates:
+                break
+            candidates = {d for d in candidates if any(_contains(ids, d) for ids in lists)}
+        return candidates
+
+    def search(self, query: str, language: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Search the index
+
+        Args:
+            query: Whitespace-separated search terms (case-insensitive)
+            language: Optional language filter
+            limit: Maximum number of results (defaults to code_search.max_results)
+
+        Returns:
+            Ranked results with title, code, language, source, path, line and score
+        """
+        limit = limit or get_config("code_search.max_results")
+        terms = list(dict.fromkeys(t for t in query.lower().split() if t))
+        indexed_terms = [t for t in terms if len(t.encode("utf-8")) >= 3]
+        if not indexed_terms:
+            return []
+
+        with self.lock:
+            segments = list(self.segments)
+            live = self.documents
+
+        language = language.lower() if language else None
+        term_documents = {term: self._term_candidates(term, segments, live) for term in indexed_terms}
+
+        total = max(len(live), 1)
+        idf = {term: math.log(1 + total / (1 + len(term_documents.get(term, live)))) for term in terms}
+
+        # Before reading any file, prefer files that may contain the rarer terms
+        priority: Dict[int, float] = {}
+        for term, ids in term_documents.items():
+            for document_id in ids:
+                if language is None or live[document_id][1] == language:
+                    priority[document_id] = priority.get(document_id, 0.0) + idf[term]
+        candidates = heapq.nlargest(get_config("code_search.max_candidates"), priority, key=lambda d: (priority[d], -d))
+
+        scored = []
+        for document_id in candidates:
+            path, file_language = live[document_id]
+            text = self._read(path)
+            if text is None:
+                continue
+            score = self._score(path, text.decode("utf-8", "replace").lower(), terms, idf)
+            if score > 0:
+                scored.append((score, document_id))
+
+        results = []
+        for score, document_id in heapq.nlargest(limit, scored):
+            path, file_language = live[document_id]
+            result = self._build_result(path, file_language, terms, score)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def _score(self, path: str, lowered: str, terms: List[str], idf: Dict[str, float]) -> float:
+        """Score a candidate file's lowercased content (0 if no term really occurs)"""
+        name = os.path.basename(path).lower()
+        score = 0.0
+        for term in terms:
+            count = lowered.count(term)
+            if count:
+                score += idf[term] * (1 + math.log(count))
+                if term in name:
+                    score += idf[term] * 1.5
+        return score
+
+    def _build_result(self, path: str, language: str, terms: List[str], score: float) -> Optional[Dict[str, Any]]:
+        """Build a search result showing the line that contains the most distinct terms"""
+        data = self._read(path)
+        if data is None:
+            return None
+
+        lines = data.decode("utf-8", "replace").split("\n")
+        best_line, best_hits = 0, 0
+        for number, line in enumerate(lines):
+            lowered = line.lower()
+            hits = sum(1 for term in terms if term in lowered)
+            if hits > best_hits:
+                best_line, best_hits = number, hits
+                if hits == len(terms):
+                    break
+
+        start = max(0, best_line - CONTEXT_LINES)
+        end = min(len(lines), best_line + CONTEXT_LINES + 1)
+        source = self._display_path(path)
+        return {
+            "title": f"{source}:{best_line + 1}",
+            "code": "\n".join(lines[start:end]),
+            "language": language,
+            "source": source,
+            "path": path,
+            "line": best_line + 1,
+            "score": round(score, 4),
+        }
+
+    def _display_path(self, path: str) -> str:
+        """Show a path relative to the indexed directory that contains it"""
+        for root in self.paths:
+            if path.startswith(root + os.sep):
+                return os.path.relpath(path, os.path.dirname(root))
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index statistics
+
+        Returns:
+            Dictionary with indexed paths, document and segment counts
+        """
+        with self.lock:
+            return {
+                "paths": self.paths,
+                "documents": len(self.documents),
+                "deleted": len(self.deleted),
+                "segments": len(self.segments),
+                "built_at": self.built_at,
+            }
+
+
+# Shared index used by every ProgrammingTools call in the process
+_index: Optional[CodeIndex] = None
+_index_lock = threading.Lock()
+
+def get_code_index() -> CodeIndex:
+    """
+    Get the process-wide code index, loading it on first use
+
+    Returns:
+        The shared CodeIndex
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = CodeIndex()
+        return _index
@@ -3,9 +3,17 @@ Programming Tools - Tools for programming tasks
 """
 
 import os
-import subprocess
-from typing import Dict, Any, List, Optional, Union
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Union
 
+from .code_analyzer import analyze_python
+from .code_index import get_code_index
+from .result_cache import get_result_cache, is_deterministic, make_result_key
+from ..config import get_config
+from ..sandbox.executor import arun_snippet, get_limits, run_command, run_snippet, stream_snippet
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -16,16 +24,98 @@ class ProgrammingTools:
     """
     
     @staticmethod
-    def execute_code(code: str, language: str = "python") -> Dict[str, Any]:
+    def _format_execution(execution: Dict[str, Any], limits: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn a sandbox execution result into an execute_code result
+        
+        Args:
+            execution: The result from the sandbox executor
+            limits: The limits the run was started with
+            
+        Returns:
+            Dictionary with execution results, timing and peak memory use
+        """
+        result = {
+            "success": execution["returncode"] == 0 and not execution["timed_out"],
+            "output": execution["stdout"],
+            "error": execution["stderr"]
+        }
+        
+        # Explain why the sandbox stopped the run
+        notes = []
+        if execution["timed_out"]:
+            notes.append(f"Execution timed out after {limits['timeout']}s")
+        if execution["output_limited"]:
+            notes.append("Execution stopped: output size limit exceeded")
+        if notes:
+            result["error"] = "\n".join([execution["stderr"].rstrip("\n")] + notes).lstrip("\n")
+        
+        result["exit_code"] = execution["returncode"]
+        result["timed_out"] = execution["timed_out"]
+        result["output_limited"] = execution["output_limited"]
+        result["duration"] = round(execution["wall_time"], 4)
+        result["cpu_time"] = round(execution["cpu_time"], 4)
+        result["peak_rss_kb"] = execution["peak_rss_kb"]
+        
+        if "output_truncated" in execution:
+            result["output_truncated"] = execution["output_truncated"]
+            result["dropped_chars"] = execution["dropped_chars"]
+        
+        return result
+    
+    @staticmethod
+    def _result_cache_key(kind: str,
+                          code: str,
+                          language: str,
+                          options: Dict[str, Any],
+                          use_cache: Optional[bool],
+                          check_determinism: bool = True) -> Optional[str]:
+        """
+        Get the result cache key for a call, or None if it should not be cached
+        
+        Args:
+            kind: The call ("execute" or "analyze")
+            code: The code
+            language: The programming language
+            options: Other inputs that affect the result
+            use_cache: Optional override of result_cache.enabled for this call
+            check_determinism: Skip code that reads time, randomness or other outside state
+            
+        Returns:
+            The cache key, or None
+        """
+        enabled = get_config("result_cache.enabled") if use_cache is None else use_cache
+        if not enabled:
+            return None
+        
+        if check_determinism and not is_deterministic(code, language):
+            get_result_cache().skip()
+            return None
+        
+        return make_result_key(kind, language, code, options)
+    
+    @staticmethod
+    def execute_code(code: str,
+                     language: str = "python",
+                     timeout: Optional[float] = None,
+                     use_cache: Optional[bool] = None) -> Dict[str, Any]:
         """
         Execute code in the specified language
         
+        Each run is isolated in its own working directory and process group
+        and bounded by the limits in the sandbox.limits config. Results of
+        deterministic code can be reused from the result cache.
+        
         Args:
             code: The code to execute
             language: The programming language
+            timeout: Optional wall-clock limit in seconds (defaults to sandbox.limits.timeout)
+            use_cache: Optional override of result_cache.enabled for this call
+                (False for code that must always run)
             
         Returns:
-            Dictionary with execution results
+            Dictionary with execution results, timing and peak memory use;
+            "cached" is set when the result was reused
         """
         result = {
             "success": False,
@@ -34,70 +124,159 @@ class ProgrammingTools:
         }
         
         try:
-            if language.lower() == "python":
-                # Create a temporary file
-                temp_file = "/tmp/pocket_ai_temp.py"
-                with open(temp_file, "w") as f:
-                    f.write(code)
-                
-                # Execute the code
-                process = subprocess.Popen(
-                    ["python", temp_file],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                stdout, stderr = process.communicate()
-                
-                # Check if execution was successful
-                if process.returncode == 0:
-                    result["success"] = True
-                    result["output"] = stdout
-                else:
-                    result["error"] = stderr
-                
-                # Clean up
-                os.remove(temp_file)
-                
-            elif language.lower() == "javascript":
-                # Create a temporary file
-                temp_file = "/tmp/pocket_ai_temp.js"
-                with open(temp_file, "w") as f:
-                    f.write(code)
-                
-                # Execute the code
-                process = subprocess.Popen(
-                    ["node", temp_file],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                stdout, stderr = process.communicate()
-                
-                # Check if execution was successful
-                if process.returncode == 0:
-                    result["success"] = True
-                    result["output"] = stdout
-                else:
-                    result["error"] = stderr
-                
-                # Clean up
-                os.remove(temp_file)
-                
-            else:
-                result["error"] = f"Unsupported language: {language}"
-                
+            limits = get_limits({"timeout": timeout})
+            
+            cache_key = ProgrammingTools._result_cache_key("execute", code, language, limits, use_cache)
+            if cache_key is not None:
+                cached = get_result_cache().get(cache_key)
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+            
+            execution = run_snippet(code, language, limits)
+            result = ProgrammingTools._format_execution(execution, limits)
+            ProgrammingTools._cache_execution(cache_key, execution, result)
         except Exception as e:
             result["error"] = str(e)
             
         return result
     
+    @staticmethod
+    async def aexecute_code(code: str,
+                            language: str = "python",
+                            timeout: Optional[float] = None,
+                            use_cache: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Execute code in the specified language without blocking the event loop
+        
+        Args:
+            code: The code to execute
+            language: The programming language
+            timeout: Optional wall-clock limit in seconds (defaults to sandbox.limits.timeout)
+            use_cache: Optional override of result_cache.enabled for this call
+            
+        Returns:
+            Dictionary with execution results (see execute_code)
+        """
+        result = {
+            "success": False,
+            "output": "",
+            "error": ""
+        }
+        
+        try:
+            limits = get_limits({"timeout": timeout})
+            
+            cache_key = ProgrammingTools._result_cache_key("execute", code, language, limits, use_cache)
+            if cache_key is not None:
+                cached = get_result_cache().get(cache_key)
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+            
+            execution = await arun_snippet(code, language, limits)
+            result = ProgrammingTools._format_execution(execution, limits)
+            ProgrammingTools._cache_execution(cache_key, execution, result)
+        except Exception as e:
+            result["error"] = str(e)
+            
+        return result
+    
+    @staticmethod
+    def _cache_execution(cache_key: Optional[str], execution: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Store an execute_code result, unless the run may not repeat"""
+        # Runs cut short by the sandbox or a crashed worker may not repeat
+        if cache_key is not None and not execution["timed_out"] and execution["returncode"] >= 0:
+            get_result_cache().set(cache_key, result)
+    
+    @staticmethod
+    def execute_many(snippets: List[Dict[str, Any]],
+                     parallelism: Optional[int] = None,
+                     use_cache: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several snippets concurrently
+        
+        Every snippet runs in its own sandboxed process, so up to
+        parallelism snippets run at once on separate cores. Each snippet has
+        its own timeout and errors are reported per item, so a slow or
+        failing snippet does not hold up the others.
+        
+        Args:
+            snippets: List of {"code", "language", "timeout"} dictionaries;
+                language and timeout are optional
+            parallelism: Maximum number of snippets run at once (defaults to
+                and is capped by sandbox.batch.parallelism)
+            use_cache: Optional override of result_cache.enabled for these calls
+            
+        Returns:
+            One execute_code result per snippet, in input order, each with
+            its index, wait_time (seconds queued before it started) and
+            elapsed (seconds from start to result)
+        """
+        max_parallelism = get_config("sandbox.batch.parallelism")
+        parallelism = min(parallelism or max_parallelism, max_parallelism)
+        submitted = time.monotonic()
+        
+        def run(index: int, snippet: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.monotonic()
+            code = snippet.get("code", "") if isinstance(snippet, dict) else ""
+            if code:
+                result = ProgrammingTools.execute_code(
+                    code,
+                    snippet.get("language", "python"),
+                    timeout=snippet.get("timeout"),
+                    use_cache=use_cache
+                )
+            else:
+                result = {"success": False, "output": "", "error": "No code provided"}
+            
+            finished = time.monotonic()
+            result["index"] = index
+            result["wait_time"] = round(started - submitted, 4)
+            result["elapsed"] = round(finished - started, 4)
+            return result
+        
+        if not snippets:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="pocket-ai-batch") as executor:
+            futures = [executor.submit(run, index, snippet) for index, snippet in enumerate(snippets)]
+            return [future.result() for future in futures]
+    
+    @staticmethod
+    def execute_code_stream(code: str,
+                            language: str = "python",
+                            timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Execute code and yield its output as it is produced
+        
+        Args:
+            code: The code to execute
+            language: The programming language
+            timeout: Optional wall-clock limit in seconds (defaults to sandbox.limits.timeout)
+            
+        Yields:
+            {"stream": "stdout" | "stderr", "data": text} for each output chunk,
+            then {"result": ...} in the execute_code format, whose output and
+            error hold only the tail kept by the sandbox.stream config
+        """
+        try:
+            limits = get_limits({"timeout": timeout})
+            for event in stream_snippet(code, language, limits):
+                if "result" in event:
+                    yield {"result": ProgrammingTools._format_execution(event["result"], limits)}
+                else:
+                    yield event
+        except Exception as e:
+            yield {"result": {"success": False, "output": "", "error": str(e)}}
+    
     @staticmethod
     def search_code(query: str, language: Optional[str] = None) -> Dict[str, Any]:
         """
-        Search for code examples (simulated)
+        Search for code examples
+        
+        Searches the local code index over the code_search.paths directories;
+        without configured paths, built-in examples are returned.
         
         Args:
             query: The search query
@@ -106,9 +285,29 @@ class ProgrammingTools:
         Returns:
             Dictionary with search results
         """
-        # In a real implementation, this would search GitHub or other code repositories
-        # For now, we'll return simulated results
+        if get_config("code_search.paths"):
+            logger.info(f"Searching the code index for {query} in {language or 'all languages'}")
+            
+            try:
+                index = get_code_index()
+                index.refresh_if_stale()
+                results = index.search(query, language)
+            except Exception as e:
+                logger.error(f"Error searching the code index: {e}")
+                return {
+                    "query": query,
+                    "language": language,
+                    "results": [],
+                    "error": str(e)
+                }
+            
+            return {
+                "query": query,
+                "language": language,
+                "results": results
+            }
         
+        # Without indexed directories, fall back to built-in examples
         results = []
         
         if language:
@@ -167,13 +366,52 @@ class ProgrammingTools:
         }
     
     @staticmethod
-    def analyze_code(code: str, language: str = "python") -> Dict[str, Any]:
+    def _run_pylint(code: str) -> List[str]:
+        """
+        Run pylint on a snippet in a private directory
+        
+        Args:
+            code: The Python code to check
+            
+        Returns:
+            The messages pylint reported
+        """
+        workdir = tempfile.mkdtemp(prefix="pocket_ai_lint_")
+        try:
+            with open(os.path.join(workdir, "main.py"), "w", encoding="utf-8") as f:
+                f.write(code)
+            
+            execution = run_command(
+                ["pylint", "--disable=all", "--enable=E,F", "--score=n", "main.py"],
+                workdir,
+                get_limits()
+            )
+        except OSError as e:
+            return [f"Deep analysis unavailable: {e}"]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        # Skip the "************* Module main" headers
+        return [line.strip() for line in execution["stdout"].split("\n")
+                if line.strip() and not line.startswith("*")]
+    
+    @staticmethod
+    def analyze_code(code: str,
+                     language: str = "python",
+                     deep: Optional[bool] = None,
+                     use_cache: Optional[bool] = None) -> Dict[str, Any]:
         """
         Analyze code for potential issues
         
+        Python is analyzed in-process (syntax errors, undefined names, unused
+        imports and cyclomatic complexity); deep mode also runs pylint.
+        Analysis does not run the code, so every result can be cached.
+        
         Args:
             code: The code to analyze
             language: The programming language
+            deep: Also run pylint (defaults to analysis.deep)
+            use_cache: Optional override of result_cache.enabled for this call
             
         Returns:
             Dictionary with analysis results
@@ -186,49 +424,28 @@ class ProgrammingTools:
         
         try:
             if language.lower() == "python":
-                # Create a temporary file
-                temp_file = "/tmp/pocket_ai_temp.py"
-                with open(temp_file, "w") as f:
-                    f.write(code)
+                if deep is None:
+                    deep = get_config("analysis.deep")
                 
-                # Run pylint for static analysis
-                process = subprocess.Popen(
-                    ["pylint", "--disable=all", "--enable=E,F", temp_file],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
+                cache_key = ProgrammingTools._result_cache_key(
+                    "analyze", code, language, {"deep": bool(deep)}, use_cache, check_determinism=False
                 )
+                if cache_key is not None:
+                    cached = get_result_cache().get(cache_key)
+                    if cached is not None:
+                        return cached
                 
-                stdout, stderr = process.communicate()
-                
-                # Parse pylint output
-                if stdout:
-                    for line in stdout.split("\n"):
-                        if line.strip():
-                            result["issues"].append(line.strip())
+                result = analyze_python(code)
+                if deep:
+                    result["issues"].extend(ProgrammingTools._run_pylint(code))
                 
-                # Clean up
-                os.remove(temp_file)
-                
-                # Add some simulated suggestions
-                result["suggestions"] = [
-                    "Consider adding docstrings to functions",
-                    "Use type hints for better code readability",
-                    "Follow PEP 8 style guidelines"
-                ]
+                if cache_key is not None:
+                    get_result_cache().set(cache_key, result)
                 
             elif language.lower() == "javascript":
-                # Create a temporary file
-                temp_file = "/tmp/pocket_ai_temp.js"
-                with open(temp_file, "w") as f:
-                    f.write(code)
-                
                 # In a real implementation, you would use ESLint or similar
                 # For now, we'll return simulated results
                 
-                # Clean up
-                os.remove(temp_file)
-                
                 # Add some simulated issues and suggestions
                 result["issues"] = [
                     "Missing semicolons",
@@ -0,0 +1,300 @@
+"""
+Result Cache - Reuses execute_code and analyze_code results for identical code
+
+The agent often re-runs byte-identical snippets, for example to re-verify a
+function it already ran. Results are keyed by the kind of call, the
+language, the interpreter version, a hash of the code and the options that
+affect the result, and kept in an in-memory LRU. Code that may read the
+clock, random numbers, the environment, files or the network, or that builds
+sets whose order follows the hash seed, is detected by a static check and
+never cached.
+"""
+
+import ast
+import hashlib
+import json
+import re
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Python modules whose results depend only on their inputs
+DETERMINISTIC_PYTHON_MODULES = {
+    "__future__", "abc", "array", "ast", "base64", "binascii", "bisect", "cmath", "collections",
+    "colorsys", "copy", "csv", "dataclasses", "decimal", "difflib", "dis", "enum", "fractions",
+    "functools", "graphlib", "hashlib", "heapq", "html", "itertools", "json", "keyword", "math",
+    "numbers", "operator", "pprint", "re", "statistics", "string", "struct", "sys", "textwrap",
+    "typing", "unicodedata", "zlib",
+}
+
+# Python builtins that read outside state or vary between processes (the
+# iteration order of sets of strings depends on the per-process hash seed)
+NONDETERMINISTIC_PYTHON_NAMES = {
+    "open", "input", "hash", "id", "exec", "eval", "compile", "__import__", "breakpoint",
+    "set", "frozenset",
+}
+
+# Node.js modules whose results depend only on their inputs
+DETERMINISTIC_NODE_MODULES = {
+    "assert", "buffer", "events", "path", "querystring", "string_decoder", "url", "util",
+}
+
+# JavaScript globals that read outside state
+NONDETERMINISTIC_JS_PATTERN = re.compile(
+    r"\b(?:Date|Math\s*\.\s*random|performance|hrtime|crypto|fetch|XMLHttpRequest|WebSocket"
+    r"|process\s*\.\s*(?:env|memoryUsage|cpuUsage|uptime|pid)|eval|Function|import)\b"
+)
+JS_REQUIRE_PATTERN = re.compile(r"\brequire\s*\(\s*(['\"`])([^'\"`]+)\1\s*\)|\brequire\b")
+
+
+def _python_is_deterministic(code: str) -> bool:
+    """Check Python code for imports and builtins that read outside state"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # The run fails the same way every time
+        return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(alias.name.split(".")[0] not in DETERMINISTIC_PYTHON_MODULES for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or (node.module or "").split(".")[0] not in DETERMINISTIC_PYTHON_MODULES:
+                return False
+        elif isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_PYTHON_NAMES:
+            return False
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            return False
+        elif isinstance(node, ast.Attribute) and node.attr in ("stdin", "argv", "modules"):
+            return False
+
+    return True
+
+
+def _javascript_is_deterministic(code: str) -> bool:
+    """Check JavaScript code for globals and modules that read outside state"""
+    if NONDETERMINISTIC_JS_PATTERN.search(code):
+        return False
+
+    for match in JS_REQUIRE_PATTERN.finditer(code):
+        module = match.group(2)
+        if module is None or module.replace("node:", "") not in DETERMINISTIC_NODE_MODULES:
+            return False
+
+    return True
+
+
+def is_deterministic(code: str, language: str) -> bool:
+    """
+    Statically check whether running the code always gives the same result
+
+    The check is conservative: code that imports anything not known to be
+    pure, touches the clock, randomness, files, the environment or the
+    network, or builds a set (whose order can change between runs), is
+    treated as nondeterministic. Pass use_cache=False to the
+    ProgrammingTools call for code the check misses.
+
+    Args:
+        code: The source code
+        language: The programming language
+
+    Returns:
+        True if the result may be cached
+    """
+    language = language.lower()
+    if language == "python":
+        return _python_is_deterministic(code)
+    if language == "javascript":
+        return _javascript_is_deterministic(code)
+    return False
+
+
+# Interpreter versions by language, looked up once per process
+_versions: Dict[str, Optional[str]] = {}
+_versions_lock = threading.Lock()
+
+def interpreter_version(language: str) -> Optional[str]:
+    """
+    Get the version of the interpreter that runs snippets in a language
+
+    Args:
+        language: The programming language
+
+    Returns:
+        The version string, or None if the interpreter is unavailable
+    """
+    language = language.lower()
+
+    with _versions_lock:
+        if language not in _versions:
+            version = None
+            if language == "python":
+                version = sys.version
+            elif language == "javascript":
+                try:
+                    version = subprocess.run(
+                        ["node", "--version"], capture_output=True, text=True, timeout=10
+                    ).stdout.strip() or None
+                except (OSError, subprocess.SubprocessError) as e:
+                    logger.warning(f"Could not determine the Node.js version: {e}")
+            _versions[language] = version
+        return _versions[language]
+
+
+def make_result_key(kind: str, language: str, code: str, options: Dict[str, Any]) -> Optional[str]:
+    """
+    Build the cache key for a result
+
+    Args:
+        kind: The call that produced the result ("execute" or "analyze")
+        language: The programming language
+        code: The source code
+        options: Other inputs that affect the result, such as limits
+
+    Returns:
+        Hex digest identifying the result, or None if the interpreter
+        version is unknown
+    """
+    version = interpreter_version(language)
+    if version is None:
+        return None
+
+    canonical = json.dumps({
+        "kind": kind,
+        "language": language.lower(),
+        "version": version,
+        "code": hashlib.sha256(code.encode("utf-8")).hexdigest(),
+        "options": options,
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    A size-bounded in-memory LRU of execution and analysis results
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_result_bytes: Optional[int] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of results kept
+            max_result_bytes: Largest serialized result that is stored
+        """
+        self.max_entries = max_entries or get_config("result_cache.max_entries")
+        self.max_result_bytes = max_result_bytes or get_config("result_cache.max_result_bytes")
+
+        # Results are stored serialized, so callers never share a mutable copy
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "skipped": 0,
+            "too_large": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result
+
+        Args:
+            key: The result key
+
+        Returns:
+            A copy of the cached result, or None on a miss
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.memory.move_to_end(key)
+            self.counters["hits"] += 1
+        return json.loads(entry)
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a result
+
+        Args:
+            key: The result key
+            result: The result to store
+        """
+        entry = json.dumps(result, ensure_ascii=False, default=str)
+
+        with self.lock:
+            if len(entry) > self.max_result_bytes:
+                self.counters["too_large"] += 1
+                return
+
+            previous = self.memory.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.memory[key] = entry
+            self.size += len(entry)
+            self.counters["stores"] += 1
+
+            while len(self.memory) > self.max_entries:
+                _, evicted = self.memory.popitem(last=False)
+                self.size -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def skip(self) -> None:
+        """Count a call that was not cached because its code is nondeterministic"""
+        with self.lock:
+            self.counters["skipped"] += 1
+
+    def clear(self) -> None:
+        """Remove all cached results"""
+        with self.lock:
+            self.memory.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with cache size and hit/miss counters
+        """
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "entries": len(self.memory),
+                "max_entries": self.max_entries,
+                "bytes": self.size,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+                **self.counters,
+            }
+
+
+# Shared cache used by every ProgrammingTools call in the process
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """
+    Get the process-wide result cache, creating it on first use
+
+    Returns:
+        The shared ResultCache
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,337 @@
+"""
+Async Browser - Browser automation for the asyncio agents
+
+With Playwright, every event loop shares one browser process and each task
+gets its own isolated browser context, so hundreds of tasks can browse
+concurrently without a process each. Selenium has no async API; its calls
+run on worker threads.
+"""
+
+import asyncio
+import weakref
+from typing import Any, Optional
+
+from .browser_manager import BaseBrowser, SeleniumBrowser
+from ..config import get_config
+from ..core.tracing import traced
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _SharedPlaywright:
+    """The Playwright driver and browser process of one event loop"""
+
+    def __init__(self):
+        """Initialize an unstarted driver"""
+        self.lock = asyncio.Lock()
+        self.playwright = None
+        self.browser = None
+
+    async def get_browser(self, headless: bool) -> Any:
+        """
+        Get the loop's browser, launching it on first use or after a crash
+
+        Args:
+            headless: Whether to run in headless mode
+
+        Returns:
+            The async Playwright browser
+        """
+        async with self.lock:
+            if self.browser is not None and self.browser.is_connected():
+                return self.browser
+
+            if self.playwright is None:
+                from playwright.async_api import async_playwright
+
+                self.playwright = await async_playwright().start()
+
+            self.browser = await self.playwright.firefox.launch(headless=headless)
+            logger.info("Shared async Playwright browser launched")
+            return self.browser
+
+    async def close(self) -> None:
+        """Close the browser and stop the driver"""
+        async with self.lock:
+            try:
+                if self.browser is not None:
+                    await self.browser.close()
+                if self.playwright is not None:
+                    await self.playwright.stop()
+            except Exception as e:
+                logger.error(f"Error closing the shared Playwright browser: {e}")
+            self.browser = None
+            self.playwright = None
+
+
+# One Playwright driver per event loop (async Playwright objects are bound to their loop)
+_shared: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _SharedPlaywright]" = weakref.WeakKeyDictionary()
+
+def _get_shared_playwright() -> _SharedPlaywright:
+    """Get the Playwright driver of the running event loop"""
+    loop = asyncio.get_running_loop()
+    shared = _shared.get(loop)
+    if shared is None:
+        shared = _shared[loop] = _SharedPlaywright()
+    return shared
+
+
+async def close_shared_browser() -> None:
+    """Close the running event loop's shared Playwright browser, if it was started"""
+    shared = _shared.pop(asyncio.get_running_loop(), None)
+    if shared is not None:
+        await shared.close()
+
+
+class AsyncPlaywrightBrowser:
+    """One task's isolated context in the shared async Playwright browser"""
+
+    def __init__(self, context: Any, page: Any):
+        """
+        Initialize the browser (use AsyncPlaywrightBrowser.create)
+
+        Args:
+            context: The Playwright browser context
+            page: The context's page
+        """
+        self.context = context
+        self.page = page
+
+    @classmethod
+    async def create(cls, headless: bool = True) -> "AsyncPlaywrightBrowser":
+        """
+        Open a new context in the running loop's shared browser
+
+        Args:
+            headless: Whether to run in headless mode
+
+        Returns:
+            The browser
+        """
+        browser = await _get_shared_playwright().get_browser(headless)
+        context = await browser.new_context()
+        page = await context.new_page()
+        return cls(context, page)
+
+    @traced("browser.open")
+    async def open(self, url: str) -> None:
+        """
+        Open a URL in the browser
+
+        Args:
+            url: The URL to open
+        """
+        try:
+            await self.page.goto(url, timeout=get_config("browser.timeout"))
+            logger.info(f"Opened URL: {url}")
+        except Exception as e:
+            logger.error(f"Error opening URL {url}: {e}")
+            raise
+
+    async def close(self) -> None:
+        """Close the context, leaving the shared browser running"""
+        try:
+            await self.context.close()
+        except Exception as e:
+            logger.error(f"Error closing Playwright context: {e}")
+
+    @traced("browser.get_content")
+    async def get_content(self) -> str:
+        """
+        Get the current page content
+
+        Returns:
+            The HTML content of the current page
+        """
+        try:
+            return await self.page.content()
+        except Exception as e:
+            logger.error(f"Error getting page content: {e}")
+            return ""
+
+    @traced("browser.screenshot")
+    async def screenshot(self, path: str) -> None:
+        """
+        Take a screenshot of the current page
+
+        Args:
+            path: The path to save the screenshot
+        """
+        try:
+            await self.page.screenshot(path=path)
+            logger.info(f"Screenshot saved to {path}")
+        except Exception as e:
+            logger.error(f"Error taking screenshot: {e}")
+
+    @traced("browser.click")
+    async def click(self, selector: str) -> None:
+        """
+        Click on an element
+
+        Args:
+            selector: The CSS selector of the element to click
+        """
+        try:
+            await self.page.click(selector)
+            logger.info(f"Clicked on element: {selector}")
+        except Exception as e:
+            logger.error(f"Error clicking on element {selector}: {e}")
+            raise
+
+    @traced("browser.type")
+    async def type(self, selector: str, text: str) -> None:
+        """
+        Type text into an element
+
+        Args:
+            selector: The CSS selector of the element to type into
+            text: The text to type
+        """
+        try:
+            await self.page.fill(selector, text)
+            logger.info(f"Typed text into element: {selector}")
+        except Exception as e:
+            logger.error(f"Error typing into element {selector}: {e}")
+            raise
+
+    @traced("browser.evaluate")
+    async def evaluate(self, script: str) -> Any:
+        """
+        Evaluate JavaScript in the browser
+
+        Args:
+            script: The JavaScript to evaluate
+
+        Returns:
+            The result of the evaluation
+        """
+        try:
+            return await self.page.evaluate(script)
+        except Exception as e:
+            logger.error(f"Error evaluating script: {e}")
+            return None
+
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        try:
+            return self.page.url
+        except Exception:
+            return ""
+
+
+class ThreadedBrowser:
+    """Runs the calls of a blocking browser on worker threads"""
+
+    def __init__(self, browser: BaseBrowser):
+        """
+        Initialize the wrapper
+
+        Args:
+            browser: The blocking browser (must not be bound to one thread,
+                as Selenium is not but sync Playwright is)
+        """
+        self.browser = browser
+
+    async def open(self, url: str) -> None:
+        """Open a URL in the browser"""
+        await asyncio.to_thread(self.browser.open, url)
+
+    async def close(self) -> None:
+        """Close the browser"""
+        await asyncio.to_thread(self.browser.close)
+
+    async def get_content(self) -> str:
+        """Get the current page content"""
+        return await asyncio.to_thread(self.browser.get_content)
+
+    async def screenshot(self, path: str) -> None:
+        """Take a screenshot of the current page"""
+        await asyncio.to_thread(self.browser.screenshot, path)
+
+    async def click(self, selector: str) -> None:
+        """Click on an element"""
+        await asyncio.to_thread(self.browser.click, selector)
+
+    async def type(self, selector: str, text: str) -> None:
+        """Type text into an element"""
+        await asyncio.to_thread(self.browser.type, selector, text)
+
+    async def evaluate(self, script: str) -> Any:
+        """Evaluate JavaScript in the browser"""
+        return await asyncio.to_thread(self.browser.evaluate, script)
+
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        return self.browser.current_url
+
+
+class AsyncBrowserManager:
+    """
+    Manages the browser of one asyncio task
+
+    The browser is created on first use and kept until close_browser(), so
+    consecutive actions operate on the same page. Selenium browsers are
+    checked out of the shared pool when it is enabled; Playwright contexts
+    are cheap and always opened in the loop's shared browser.
+    """
+
+    def __init__(self, browser_type: Optional[str] = None, headless: Optional[bool] = None,
+                 use_pool: Optional[bool] = None):
+        """
+        Initialize the browser manager
+
+        Args:
+            browser_type: The type of browser to use ("playwright" or "selenium")
+            headless: Whether to run in headless mode
+            use_pool: Whether to check Selenium browsers out of the shared pool
+        """
+        self.browser_type = browser_type or get_config("browser.type")
+        self.headless = headless if headless is not None else get_config("browser.headless")
+        self.use_pool = use_pool if use_pool is not None else get_config("browser.pool.enabled")
+        self.browser = None
+
+    async def get_browser(self) -> Any:
+        """
+        Get the current browser or create a new one
+
+        Returns:
+            An AsyncPlaywrightBrowser or a ThreadedBrowser
+        """
+        if self.browser is None:
+            if self.browser_type == "playwright":
+                self.browser = await AsyncPlaywrightBrowser.create(self.headless)
+            elif self.browser_type == "selenium":
+                if self.use_pool:
+                    from .browser_pool import get_browser_pool
+
+                    browser = await asyncio.to_thread(get_browser_pool().checkout)
+                else:
+                    browser = await asyncio.to_thread(SeleniumBrowser, self.headless)
+                self.browser = ThreadedBrowser(browser)
+            else:
+                raise ValueError(f"Unsupported browser type: {self.browser_type}")
+
+        return self.browser
+
+    async def close_browser(self) -> None:
+        """Close the current browser if it exists (or return it to the pool)"""
+        browser, self.browser = self.browser, None
+        if browser is None:
+            return
+
+        if isinstance(browser, ThreadedBrowser) and self.use_pool:
+            from .browser_pool import get_browser_pool
+
+            await asyncio.to_thread(get_browser_pool().checkin, browser.browser)
+        else:
+            await browser.close()
+
+    async def __aenter__(self) -> Any:
+        """Context manager entry"""
+        return await self.get_browser()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Context manager exit (the browser stays open until the task ends)"""
@@ -7,6 +7,7 @@ from typing import Dict, Any, List, Optional, Union
 from abc import ABC, abstractmethod
 
 from ..config import get_config
+from ..core.tracing import traced
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -48,23 +49,46 @@ class BaseBrowser(ABC):
     def evaluate(self, script: str) -> Any:
         """Evaluate JavaScript in the browser"""
         pass
+    
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        return ""
+    
+    def is_healthy(self) -> bool:
+        """Check whether the browser is still usable"""
+        return True
+    
+    def reset(self) -> None:
+        """Clear per-task state so the browser can be reused by another task"""
+        pass
 
 
 class PlaywrightBrowser(BaseBrowser):
     """Browser automation using Playwright"""
     
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, browser: Any = None):
         """
         Initialize the Playwright browser
         
         Args:
             headless: Whether to run in headless mode
+            browser: Optional already-launched Playwright browser to open an
+                isolated context in. When given, closing this object only
+                closes the context and leaves the browser process running.
         """
         try:
-            from playwright.sync_api import sync_playwright
+            self.owns_browser = browser is None
             
-            self.playwright = sync_playwright().start()
-            self.browser = self.playwright.firefox.launch(headless=headless)
+            if self.owns_browser:
+                from playwright.sync_api import sync_playwright
+                
+                self.playwright = sync_playwright().start()
+                self.browser = self.playwright.firefox.launch(headless=headless)
+            else:
+                self.playwright = None
+                self.browser = browser
+                
             self.context = self.browser.new_context()
             self.page = self.context.new_page()
             self.headless = headless
@@ -75,6 +99,7 @@ class PlaywrightBrowser(BaseBrowser):
             logger.error(f"Error initializing Playwright browser: {e}")
             raise
     
+    @traced("browser.open")
     def open(self, url: str) -> None:
         """
         Open a URL in the browser
@@ -93,12 +118,14 @@ class PlaywrightBrowser(BaseBrowser):
         """Close the browser"""
         try:
             self.context.close()
-            self.browser.close()
-            self.playwright.stop()
+            if self.owns_browser:
+                self.browser.close()
+                self.playwright.stop()
             logger.info("Playwright browser closed")
         except Exception as e:
             logger.error(f"Error closing Playwright browser: {e}")
     
+    @traced("browser.get_content")
     def get_content(self) -> str:
         """
         Get the current page content
@@ -112,6 +139,7 @@ class PlaywrightBrowser(BaseBrowser):
             logger.error(f"Error getting page content: {e}")
             return ""
     
+    @traced("browser.screenshot")
     def screenshot(self, path: str) -> None:
         """
         Take a screenshot of the current page
@@ -125,6 +153,7 @@ class PlaywrightBrowser(BaseBrowser):
         except Exception as e:
             logger.error(f"Error taking screenshot: {e}")
     
+    @traced("browser.click")
     def click(self, selector: str) -> None:
         """
         Click on an element
@@ -139,6 +168,7 @@ class PlaywrightBrowser(BaseBrowser):
             logger.error(f"Error clicking on element {selector}: {e}")
             raise
     
+    @traced("browser.type")
     def type(self, selector: str, text: str) -> None:
         """
         Type text into an element
@@ -154,6 +184,7 @@ class PlaywrightBrowser(BaseBrowser):
             logger.error(f"Error typing into element {selector}: {e}")
             raise
     
+    @traced("browser.evaluate")
     def evaluate(self, script: str) -> Any:
         """
         Evaluate JavaScript in the browser
@@ -169,6 +200,21 @@ class PlaywrightBrowser(BaseBrowser):
         except Exception as e:
             logger.error(f"Error evaluating script: {e}")
             return None
+    
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        try:
+            return self.page.url
+        except Exception:
+            return ""
+    
+    def is_healthy(self) -> bool:
+        """Check whether the browser is still connected"""
+        try:
+            return self.browser.is_connected() and not self.page.is_closed()
+        except Exception:
+            return False
 
 
 class SeleniumBrowser(BaseBrowser):
@@ -198,6 +244,7 @@ class SeleniumBrowser(BaseBrowser):
             logger.error(f"Error initializing Selenium browser: {e}")
             raise
     
+    @traced("browser.open")
     def open(self, url: str) -> None:
         """
         Open a URL in the browser
@@ -220,6 +267,7 @@ class SeleniumBrowser(BaseBrowser):
         except Exception as e:
             logger.error(f"Error closing Selenium browser: {e}")
     
+    @traced("browser.get_content")
     def get_content(self) -> str:
         """
         Get the current page content
@@ -233,6 +281,7 @@ class SeleniumBrowser(BaseBrowser):
             logger.error(f"Error getting page content: {e}")
             return ""
     
+    @traced("browser.screenshot")
     def screenshot(self, path: str) -> None:
         """
         Take a screenshot of the current page
@@ -246,6 +295,7 @@ class SeleniumBrowser(BaseBrowser):
         except Exception as e:
             logger.error(f"Error taking screenshot: {e}")
     
+    @traced("browser.click")
     def click(self, selector: str) -> None:
         """
         Click on an element
@@ -263,6 +313,7 @@ class SeleniumBrowser(BaseBrowser):
             logger.error(f"Error clicking on element {selector}: {e}")
             raise
     
+    @traced("browser.type")
     def type(self, selector: str, text: str) -> None:
         """
         Type text into an element
@@ -282,6 +333,7 @@ class SeleniumBrowser(BaseBrowser):
             logger.error(f"Error typing into element {selector}: {e}")
             raise
     
+    @traced("browser.evaluate")
     def evaluate(self, script: str) -> Any:
         """
         Evaluate JavaScript in the browser
@@ -297,23 +349,55 @@ class SeleniumBrowser(BaseBrowser):
         except Exception as e:
             logger.error(f"Error evaluating script: {e}")
             return None
+    
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        try:
+            return self.driver.current_url
+        except Exception:
+            return ""
+    
+    def is_healthy(self) -> bool:
+        """Check whether the WebDriver session is still alive"""
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+    
+    def reset(self) -> None:
+        """Clear cookies and navigate away so the next task starts clean"""
+        try:
+            self.driver.delete_all_cookies()
+            self.driver.get("about:blank")
+        except Exception as e:
+            logger.error(f"Error resetting Selenium browser: {e}")
 
 
 class BrowserManager:
     """
     Manages browser automation using either Playwright or Selenium
+    
+    When the browser pool is enabled, the browser is checked out from the
+    shared pool on first use and kept for the rest of the task, so
+    consecutive actions (open, click, type) operate on the same page.
+    Call close_browser() when the task is finished to return it.
     """
     
-    def __init__(self, browser_type: Optional[str] = None, headless: Optional[bool] = None):
+    def __init__(self, browser_type: Optional[str] = None, headless: Optional[bool] = None,
+                 use_pool: Optional[bool] = None):
         """
         Initialize the browser manager
         
         Args:
             browser_type: The type of browser to use ("playwright" or "selenium")
             headless: Whether to run in headless mode
+            use_pool: Whether to check browsers out of the shared pool
         """
         self.browser_type = browser_type or get_config("browser.type")
         self.headless = headless if headless is not None else get_config("browser.headless")
+        self.use_pool = use_pool if use_pool is not None else get_config("browser.pool.enabled")
         self.browser = None
         
     def create_browser(self) -> BaseBrowser:
@@ -330,6 +414,17 @@ class BrowserManager:
         else:
             raise ValueError(f"Unsupported browser type: {self.browser_type}")
     
+    def get_pool(self):
+        """
+        Get the shared browser pool
+        
+        Returns:
+            The process-wide BrowserPool
+        """
+        from .browser_pool import get_browser_pool
+        
+        return get_browser_pool()
+    
     def get_browser(self) -> BaseBrowser:
         """
         Get the current browser instance or create a new one
@@ -338,14 +433,20 @@ class BrowserManager:
             A browser instance
         """
         if self.browser is None:
-            self.browser = self.create_browser()
+            if self.use_pool:
+                self.browser = self.get_pool().checkout()
+            else:
+                self.browser = self.create_browser()
             
         return self.browser
     
     def close_browser(self) -> None:
-        """Close the current browser instance if it exists"""
+        """Close the current browser instance if it exists (or return it to the pool)"""
         if self.browser is not None:
-            self.browser.close()
+            if self.use_pool:
+                self.get_pool().checkin(self.browser)
+            else:
+                self.browser.close()
             self.browser = None
             
     def __enter__(self) -> BaseBrowser:
@@ -354,4 +455,6 @@ class BrowserManager:
     
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         """Context manager exit"""
-        self.close_browser()
\ No newline at end of file
+        # Pooled browsers stay checked out until the task ends
+        if not self.use_pool:
+            self.close_browser()
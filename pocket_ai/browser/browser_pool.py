@@ -0,0 +1,469 @@
+"""
+Browser Pool - Keeps browser processes alive between tasks
+
+Launching Playwright/Firefox costs seconds, so instead of starting a new
+browser for every action the pool keeps a bounded set of long-lived browser
+processes and hands out isolated sessions (a fresh browser context for
+Playwright, a reset driver for Selenium) that a task keeps until it is done.
+
+Playwright's sync API is bound to the thread that started it, so each
+Playwright process runs on its own owner thread: the pool launches, uses
+and closes it only there, and the sessions it hands out forward their calls
+to that thread. Any task thread can then use any pooled process.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional, Iterator
+
+from .browser_manager import BaseBrowser, PlaywrightBrowser, SeleniumBrowser
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BrowserPoolTimeout(Exception):
+    """Raised when no browser could be checked out before the timeout"""
+    pass
+
+
+class OwnerThreadBrowser(BaseBrowser):
+    """A pooled Playwright session whose calls run on its process's owner thread"""
+
+    def __init__(self, browser: BaseBrowser, process: "BrowserProcess"):
+        """
+        Initialize the wrapper
+
+        Args:
+            browser: The session, bound to the owner thread of process
+            process: The pooled process that owns the session
+        """
+        self.browser = browser
+        self.process = process
+
+    def open(self, url: str) -> None:
+        """Open a URL in the browser"""
+        self.process.call(self.browser.open, url)
+
+    def close(self) -> None:
+        """Close the browser"""
+        try:
+            self.process.call(self.browser.close)
+        except Exception as e:
+            logger.error(f"Error closing pooled browser session: {e}")
+
+    def get_content(self) -> str:
+        """Get the current page content"""
+        return self.process.call(self.browser.get_content)
+
+    def screenshot(self, path: str) -> None:
+        """Take a screenshot of the current page"""
+        self.process.call(self.browser.screenshot, path)
+
+    def click(self, selector: str) -> None:
+        """Click on an element"""
+        self.process.call(self.browser.click, selector)
+
+    def type(self, selector: str, text: str) -> None:
+        """Type text into an element"""
+        self.process.call(self.browser.type, selector, text)
+
+    def evaluate(self, script: str) -> Any:
+        """Evaluate JavaScript in the browser"""
+        return self.process.call(self.browser.evaluate, script)
+
+    @property
+    def current_url(self) -> str:
+        """The URL of the current page"""
+        return self.process.call(lambda: self.browser.current_url)
+
+    def is_healthy(self) -> bool:
+        """Check whether the browser is still usable"""
+        return self.process.call(self.browser.is_healthy)
+
+
+class BrowserProcess:
+    """A single long-lived browser process owned by the pool"""
+
+    def __init__(self, browser_type: str, headless: bool):
+        """
+        Launch the browser process
+
+        Args:
+            browser_type: The type of browser to launch ("playwright" or "selenium")
+            headless: Whether to run in headless mode
+        """
+        self.browser_type = browser_type
+        self.headless = headless
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.in_use = False
+        self.session: Optional[BaseBrowser] = None
+        # Thread that runs every Playwright call on this process (None for Selenium)
+        self.owner: Optional[ThreadPoolExecutor] = None
+
+        if browser_type == "playwright":
+            self.owner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pocket-ai-browser")
+            try:
+                self.playwright, self.browser = self.call(self._launch_playwright)
+            except Exception:
+                self.owner.shutdown(wait=False)
+                raise
+        elif browser_type == "selenium":
+            self.playwright = None
+            self.browser = SeleniumBrowser(headless=headless)
+        else:
+            raise ValueError(f"Unsupported browser type: {browser_type}")
+
+    def _launch_playwright(self) -> tuple:
+        """Start Playwright and launch Firefox (runs on the owner thread)"""
+        from playwright.sync_api import sync_playwright
+
+        playwright = sync_playwright().start()
+        try:
+            return playwright, playwright.firefox.launch(headless=self.headless)
+        except Exception:
+            playwright.stop()
+            raise
+
+    def call(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call a function on the process's owner thread and wait for its result
+
+        The function runs in the caller's context, so its spans are traced
+        for the caller's task.
+
+        Args:
+            function: The function to call
+            *args: Arguments for the function
+
+        Returns:
+            The function's return value
+        """
+        if self.owner is None:
+            return function(*args)
+        return self.owner.submit(contextvars.copy_context().run, function, *args).result()
+
+    def open_session(self) -> BaseBrowser:
+        """
+        Open an isolated browser session on this process
+
+        Returns:
+            A browser instance for one task
+        """
+        if self.browser_type == "playwright":
+            browser = self.call(lambda: PlaywrightBrowser(headless=self.headless, browser=self.browser))
+            self.session = OwnerThreadBrowser(browser, self)
+        else:
+            self.session = self.browser
+
+        self.uses += 1
+        return self.session
+
+    def close_session(self) -> None:
+        """Close the current session and leave the process running"""
+        if self.session is not None:
+            if self.browser_type == "playwright":
+                self.session.close()
+            else:
+                self.session.reset()
+            self.session = None
+
+        self.last_used = time.time()
+
+    def is_healthy(self) -> bool:
+        """
+        Check whether the browser process is still usable
+
+        Returns:
+            True if the process can accept a new session
+        """
+        try:
+            if self.browser_type == "playwright":
+                return self.call(self.browser.is_connected)
+            return self.browser.is_healthy()
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        """Shut down the browser process"""
+        try:
+            if self.session is not None and self.browser_type == "playwright":
+                self.session.close()
+            self.session = None
+
+            if self.browser_type == "playwright":
+                self.call(self.browser.close)
+                self.call(self.playwright.stop)
+            else:
+                self.browser.close()
+        except Exception as e:
+            logger.error(f"Error closing pooled browser: {e}")
+        finally:
+            if self.owner is not None:
+                self.owner.shutdown(wait=False)
+
+
+class BrowserPool:
+    """
+    A bounded pool of long-lived browser processes
+
+    Processes are retired under the lock but closed after it is released,
+    so a slow browser shutdown does not hold up other checkouts.
+    """
+
+    def __init__(self,
+                 browser_type: Optional[str] = None,
+                 headless: Optional[bool] = None,
+                 max_size: Optional[int] = None,
+                 idle_timeout: Optional[float] = None,
+                 max_uses: Optional[int] = None):
+        """
+        Initialize the browser pool
+
+        Args:
+            browser_type: The type of browser to use ("playwright" or "selenium")
+            headless: Whether to run in headless mode
+            max_size: Maximum number of browser processes
+            idle_timeout: Seconds an idle process is kept before it is closed
+            max_uses: Number of sessions after which a process is recycled
+        """
+        self.browser_type = browser_type or get_config("browser.type")
+        self.headless = headless if headless is not None else get_config("browser.headless")
+        self.max_size = max_size or get_config("browser.pool.max_size")
+        self.idle_timeout = idle_timeout if idle_timeout is not None else get_config("browser.pool.idle_timeout")
+        self.max_uses = max_uses or get_config("browser.pool.max_uses")
+
+        self.processes: List[BrowserProcess] = []
+        self.launching = 0
+        self.lock = threading.Condition()
+        self.counters = {
+            "launched": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "recycled": 0,
+            "evicted": 0,
+            "health_failures": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    def _retire(self, process: BrowserProcess, reason: str) -> BrowserProcess:
+        """
+        Remove a process from the pool (lock must be held)
+
+        Returns:
+            The process, for the caller to close once the lock is released
+        """
+        if process in self.processes:
+            self.processes.remove(process)
+        self.counters[reason] += 1
+        logger.info(f"Closing pooled browser ({reason}) after {process.uses} uses")
+        self.lock.notify_all()
+        return process
+
+    @staticmethod
+    def _close(processes: List[BrowserProcess]) -> None:
+        """Close retired processes (lock must not be held)"""
+        for process in processes:
+            process.close()
+
+    def _reap(self) -> List[BrowserProcess]:
+        """Retire idle processes that exceeded the idle timeout (lock must be held)"""
+        now = time.time()
+        return [
+            self._retire(process, "evicted")
+            for process in list(self.processes)
+            if not process.in_use and now - process.last_used > self.idle_timeout
+        ]
+
+    def checkout(self, timeout: Optional[float] = None) -> BaseBrowser:
+        """
+        Check out an isolated browser session
+
+        Args:
+            timeout: Seconds to wait for a free slot (defaults to browser.pool.checkout_timeout)
+
+        Returns:
+            A browser instance reserved for the caller until checkin
+        """
+        timeout = timeout if timeout is not None else get_config("browser.pool.checkout_timeout")
+        deadline = time.time() + timeout
+        retired: List[BrowserProcess] = []
+        reused = None
+
+        try:
+            with self.lock:
+                while True:
+                    retired.extend(self._reap())
+
+                    # Prefer a healthy idle process
+                    for process in list(self.processes):
+                        if process.in_use:
+                            continue
+                        if not process.is_healthy():
+                            retired.append(self._retire(process, "health_failures"))
+                            continue
+                        process.in_use = True
+                        self.counters["checkouts"] += 1
+                        self.counters["reused"] += 1
+                        reused = process
+                        break
+
+                    if reused is not None or len(self.processes) + self.launching < self.max_size:
+                        break
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise BrowserPoolTimeout(f"No browser available after {timeout}s (pool size {self.max_size})")
+
+                    self.counters["waits"] += 1
+                    self.lock.wait(remaining)
+
+                # Reserve the slot, then launch outside the lock
+                if reused is None:
+                    self.launching += 1
+        finally:
+            self._close(retired)
+
+        if reused is not None:
+            try:
+                return reused.open_session()
+            except Exception:
+                with self.lock:
+                    self._retire(reused, "health_failures")
+                reused.close()
+                raise
+
+        process = None
+        session = None
+        try:
+            process = BrowserProcess(self.browser_type, self.headless)
+            process.in_use = True
+            session = process.open_session()
+        finally:
+            with self.lock:
+                self.launching -= 1
+                if session is not None:
+                    self.processes.append(process)
+                    self.counters["launched"] += 1
+                    self.counters["checkouts"] += 1
+                self.lock.notify_all()
+            if process is not None and session is None:
+                process.close()
+
+        return session
+
+    def checkin(self, browser: BaseBrowser, discard: bool = False) -> None:
+        """
+        Return a browser session to the pool
+
+        Args:
+            browser: The browser instance returned by checkout
+            discard: Close the underlying process instead of keeping it
+        """
+        with self.lock:
+            process = next((p for p in self.processes if p.session is browser), None)
+        if process is None:
+            logger.warning("Checked in a browser that does not belong to the pool")
+            browser.close()
+            return
+
+        # The process stays in use, so no other thread takes it meanwhile
+        try:
+            process.close_session()
+        except Exception as e:
+            logger.error(f"Error releasing pooled browser session: {e}")
+            discard = True
+
+        reason = None
+        if discard:
+            reason = "evicted"
+        elif process.uses >= self.max_uses:
+            reason = "recycled"
+        elif not process.is_healthy():
+            reason = "health_failures"
+
+        with self.lock:
+            process.in_use = False
+            if reason is not None:
+                self._retire(process, reason)
+            self.lock.notify_all()
+
+        if reason is not None:
+            process.close()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None) -> Iterator[BaseBrowser]:
+        """
+        Context manager that checks a session out and back in
+
+        Args:
+            timeout: Seconds to wait for a free slot
+
+        Yields:
+            A browser instance
+        """
+        browser = self.checkout(timeout)
+        try:
+            yield browser
+        finally:
+            self.checkin(browser)
+
+    def reap_idle(self) -> None:
+        """Close processes that have been idle longer than the idle timeout"""
+        with self.lock:
+            retired = self._reap()
+        self._close(retired)
+
+    def close_all(self) -> None:
+        """Close every process in the pool, including checked-out ones"""
+        with self.lock:
+            retired = [self._retire(process, "evicted") for process in list(self.processes)]
+        self._close(retired)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics
+
+        Returns:
+            Dictionary with pool size, usage and lifetime counters
+        """
+        with self.lock:
+            in_use = sum(1 for p in self.processes if p.in_use)
+            return {
+                "browser_type": self.browser_type,
+                "max_size": self.max_size,
+                "size": len(self.processes),
+                "in_use": in_use,
+                "launching": self.launching,
+                "idle": len(self.processes) - in_use,
+                "idle_timeout": self.idle_timeout,
+                "max_uses": self.max_uses,
+                **self.counters,
+            }
+
+
+# Shared pool used by every BrowserManager in the process
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Get the process-wide browser pool, creating it on first use
+
+    Returns:
+        The shared BrowserPool
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
@@ -12,7 +12,38 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "model": "claude-3-sonnet-20240229",
         "temperature": 0.7,
         "max_tokens": 2000,
+        "backend": {
+            "mode": "live",  # Options: "live", "record", "replay", "fake"
+            "cassette": "/tmp/pocket_ai_llm_cassette.jsonl",  # Recorded request/response pairs
+            "latency": "recorded",  # Replay delay in seconds, or "recorded" for the measured latency
+            "script": "",  # JSON file with scripted responses for "fake" mode
+        },
+        "tool_use": True,  # Choose actions with Messages API tool calls instead of free-form JSON
+        "streaming": False,  # Stream next-action JSON and dispatch before the reasoning finishes (overrides tool_use)
         "api_key": os.environ.get("ANTHROPIC_API_KEY", ""),
+        "base_url": os.environ.get("ANTHROPIC_BASE_URL", ""),  # Empty for the default API endpoint
+        "timeout": 120,  # seconds per request
+        "rate_limit": {
+            "requests_per_minute": 50,  # Shared by all agents in the process (0 for unlimited)
+            "tokens_per_minute": 40000,  # Estimated input + output tokens (0 for unlimited)
+        },
+        "retry": {
+            "max_retries": 4,  # Retries for 429/529/5xx responses and timeouts
+            "base_delay": 1.0,  # seconds, doubled on each retry
+            "max_delay": 60.0,  # seconds
+        },
+        "cache": {
+            "enabled": False,  # Reuse responses for identical requests
+            "cache_nonzero_temperature": False,  # Also cache requests with temperature > 0
+            "path": "/tmp/pocket_ai_llm_cache.sqlite",  # Empty string keeps the cache in memory only
+            "max_entries": 1000,  # Responses kept in memory
+            "max_disk_entries": 10000,  # Responses kept on disk
+            "ttl": 86400,  # seconds (0 for no expiry)
+        },
+        "context": {
+            "token_budget": 8000,  # Estimated tokens of context sent with each prompt
+            "field_token_limit": 2000,  # Estimated tokens per context field
+        },
     },
     
     # Browser settings
@@ -20,6 +51,13 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "type": "playwright",  # Options: "playwright", "selenium"
         "headless": True,
         "timeout": 30000,  # milliseconds
+        "pool": {
+            "enabled": True,  # Keep browser processes alive between actions and tasks
+            "max_size": 4,  # Maximum number of browser processes
+            "idle_timeout": 300,  # seconds before an idle browser is closed
+            "max_uses": 50,  # sessions before a browser process is recycled
+            "checkout_timeout": 30,  # seconds to wait for a free browser
+        },
     },
     
     # Agent settings
@@ -27,7 +65,111 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "name": "ポケットAI",
         "description": "A Doraemon-inspired AI assistant that helps with programming tasks",
         "max_iterations": 10,
-        "memory_size": 100,  # Number of messages to keep in memory
+        "memory_size": 100,  # Iteration snapshots kept in memory for the current task
+        "memory_max_bytes": 262144,  # Serialized size of all snapshots; the oldest are dropped beyond this
+        "memory_field_chars": 500,  # Longest string kept in full in a snapshot (HTML is reduced to text first)
+        "parallel": {
+            "max_workers": 8,  # Threads shared by all loops for independent observers/evaluators
+            "timeout": 10,  # Default seconds an independent callable may take before its result is dropped
+        },
+        # Per-task limits checked between phases (0 disables a limit); requests may tighten them
+        "budget": {
+            "deadline": 300,  # Wall-clock seconds from the start of the task
+            "tokens": 200000,  # LLM input and output tokens
+            "sandbox_cpu": 60,  # CPU seconds of sandboxed code runs
+        },
+    },
+    
+    # Crash-safe progress log written after every agent loop iteration
+    "checkpoints": {
+        "enabled": True,  # Save a checkpoint after each iteration so tasks can be resumed by id
+        "path": os.environ.get("POCKET_AI_CHECKPOINT_PATH", "/tmp/pocket_ai_checkpoints"),  # One directory per task
+        "blob_threshold": 4096,  # Strings at least this long (e.g. page HTML) are stored once per task by hash
+        "fsync": True,  # Flush each checkpoint to disk before the next iteration
+        "keep_completed": False,  # Keep the checkpoints of completed tasks
+        "ttl": 604800,  # seconds before an abandoned task's checkpoints are removed (0 keeps them)
+    },
+    
+    # Background job settings
+    "jobs": {
+        "max_workers": 4,  # Number of tasks run concurrently
+        "max_queue_depth": 100,  # Queued jobs beyond this are rejected
+        "result_ttl": 3600,  # seconds finished jobs are kept for polling
+    },
+    
+    # Timing spans for each agent loop phase and registered callable
+    "tracing": {
+        "enabled": True,  # Send spans to the in-memory aggregate (and the trace file)
+        "path": os.environ.get("POCKET_AI_TRACE_PATH", ""),  # JSON-lines trace file; empty disables it
+    },
+    
+    # Warm agent cache used by the server
+    "agent_cache": {
+        "max_keys": 32,  # Number of API keys with a cached LLM client
+        "max_idle_per_key": 4,  # Idle agents kept per API key
+        "ttl": 1800,  # seconds an unused API key entry is kept
+    },
+    
+    # Code execution sandbox
+    "sandbox": {
+        "pool": {
+            "enabled": True,  # Run Python snippets on warm pre-started workers
+            "size": 4,  # Maximum number of worker processes (batches wait for a free worker beyond this)
+            "max_runs": 100,  # runs before a worker is recycled
+            "max_memory_mb": 256,  # Worker resident memory before it is recycled
+        },
+        "node_pool": {
+            "enabled": True,  # Run JavaScript snippets on warm Node.js workers (each in a fresh vm context)
+            "size": 2,  # Maximum number of worker processes
+            "max_runs": 100,  # runs before a worker is recycled
+            "max_memory_mb": 384,  # Worker resident memory before it is recycled
+        },
+        "limits": {
+            "timeout": 30,  # Wall-clock seconds before the run's process group is killed
+            "cpu_seconds": 30,  # CPU time limit (RLIMIT_CPU)
+            "memory_mb": 512,  # Address space limit (V8 heap limit for JavaScript)
+            "max_file_mb": 64,  # Largest file a run may write (RLIMIT_FSIZE)
+            "max_output_bytes": 1000000,  # Per stream; the run is stopped beyond this
+        },
+        "batch": {
+            "parallelism": 4,  # Snippets of an execute_many call / /api/execute_batch run at once
+            "max_snippets": 64,  # Largest batch accepted by /api/execute_batch
+        },
+        "stream": {
+            "retained_chars": 65536,  # Trailing output kept per stream for the result of a streamed run
+            "max_pending_chunks": 256,  # Output chunks waiting for a slow consumer before the run is held back
+        },
+    },
+    
+    # Reuse of execute_code/analyze_code results for identical code
+    "result_cache": {
+        "enabled": False,  # Cache results of deterministic snippets by language, interpreter version and code hash
+        "max_entries": 512,  # Results kept in memory
+        "max_result_bytes": 262144,  # Larger results are not cached
+    },
+    
+    # Static analysis for analyze_code
+    "analysis": {
+        "cache_size": 256,  # Analysis results kept by code hash
+        "deep": False,  # Also run pylint on Python code (slow)
+    },
+    
+    # Local code search for search_code
+    "code_search": {
+        # Directories to index (empty keeps the built-in examples)
+        "paths": [p for p in os.environ.get("POCKET_AI_CODE_PATHS", "").split(os.pathsep) if p],
+        "index_dir": "/tmp/pocket_ai_code_index",  # Manifest and memory-mapped segment files
+        "exclude_dirs": ["node_modules", "__pycache__", "venv", "build", "dist"],  # Hidden directories are always skipped
+        "max_file_bytes": 262144,  # Larger files are not indexed
+        "refresh_interval": 60,  # seconds before a search triggers a background re-scan
+        "max_segments": 8,  # Segments are merged when there are more than this
+        "max_candidates": 200,  # Files read to rank a query
+        "max_results": 10,
+    },
+    
+    # Prometheus-style /metrics endpoint
+    "metrics": {
+        "enabled": True,  # Record request metrics and serve /metrics
     },
     
     # Server settings
@@ -0,0 +1,290 @@
+"""
+Action Parser - Incremental parsing of streamed action JSON
+
+The LLM answers with a JSON object holding "action", "parameters" and
+"reasoning". When the response is streamed, the action can be dispatched
+as soon as the first two fields are complete, while the (long) reasoning
+is still being generated.
+"""
+
+import contextvars
+import json
+import threading
+from typing import Dict, Any, Iterator, List, Optional
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Fields needed before an action can be dispatched
+REQUIRED_FIELDS = ("action", "parameters")
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalActionParser:
+    """
+    Parses the top-level fields of a JSON object as text arrives
+
+    Text before the opening brace (prose, code fences) is ignored. Each
+    top-level field is decoded as soon as its value is complete. A brace
+    group that closes without a string "action" field (an example in the
+    prose, say) is dropped and scanning resumes after its opening brace.
+    """
+
+    def __init__(self):
+        """Initialize the parser"""
+        self.buffer = ""
+        self.position = 0
+        self.fields: Dict[str, Any] = {}
+        self.started = False
+        self.finished = False
+
+        # Scanner state
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.expect = "key"  # "key", "colon", "value" or "comma"
+        self.token_start = -1
+        self.current_key: Optional[str] = None
+
+    def feed(self, text: str) -> None:
+        """
+        Feed the next chunk of text
+
+        Args:
+            text: The text chunk
+        """
+        self.buffer += text
+        while self.position < len(self.buffer) and not self.finished:
+            self._step(self.buffer[self.position])
+            self.position += 1
+
+    def _complete_value(self, end: int) -> None:
+        """Decode the value ending at the given index (exclusive)"""
+        raw = self.buffer[self.token_start:end].strip()
+        try:
+            self.fields[self.current_key] = json.loads(raw)
+        except ValueError:
+            logger.debug(f"Could not decode streamed field {self.current_key}: {raw[:80]}")
+        self.current_key = None
+        self.token_start = -1
+        self.expect = "comma"
+
+    def _restart(self) -> None:
+        """Drop the current brace group and rescan from just after its opening brace"""
+        logger.debug(f"Skipping brace group without an action: {self.buffer[self.start:self.position + 1][:80]}")
+        # feed() advances the position past the opening brace
+        self.position = self.start
+        self.fields = {}
+        self.started = False
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.expect = "key"
+        self.token_start = -1
+        self.current_key = None
+
+    def _step(self, char: str) -> None:
+        """Advance the scanner by one character"""
+        index = self.position
+
+        if not self.started:
+            if char == "{":
+                self.started = True
+                self.start = index
+                self.depth = 1
+            return
+
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                self.in_string = False
+                if self.depth == 1:
+                    if self.expect == "key":
+                        self.current_key = json.loads(self.buffer[self.token_start:index + 1])
+                        self.token_start = -1
+                        self.expect = "colon"
+                    elif self.expect == "value":
+                        self._complete_value(index + 1)
+            return
+
+        if self.depth == 1 and self.expect == "value" and self.token_start >= 0 and char in ",}":
+            # End of a literal value (number, true, false, null)
+            self._complete_value(index)
+
+        if char == '"':
+            self.in_string = True
+            if self.depth == 1 and self.expect in ("key", "value") and self.token_start < 0:
+                self.token_start = index
+        elif char in "{[":
+            if self.depth == 1 and self.expect == "value" and self.token_start < 0:
+                self.token_start = index
+            self.depth += 1
+        elif char in "}]":
+            self.depth -= 1
+            if self.depth == 1 and self.expect == "value" and self.token_start >= 0:
+                self._complete_value(index + 1)
+            elif self.depth == 0:
+                if isinstance(self.fields.get("action"), str):
+                    self.finished = True
+                else:
+                    self._restart()
+        elif self.depth == 1:
+            if char == ":" and self.expect == "colon":
+                self.expect = "value"
+            elif char == "," and self.expect == "comma":
+                self.expect = "key"
+            elif self.expect == "value" and self.token_start < 0 and char not in _WHITESPACE:
+                self.token_start = index
+
+    def action_ready(self) -> bool:
+        """Check whether the action and its parameters have been parsed"""
+        return all(field in self.fields for field in REQUIRED_FIELDS)
+
+    def get_action(self) -> Dict[str, Any]:
+        """
+        Get the parsed action
+
+        Returns:
+            Dictionary with action, parameters and reasoning (possibly still empty)
+        """
+        return {
+            "action": self.fields.get("action", "unknown"),
+            "parameters": self.fields.get("parameters") or {},
+            "reasoning": self.fields.get("reasoning", ""),
+        }
+
+
+def extract_action(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract an action from a free-text response
+
+    Tolerates prose and code fences around the JSON object and an object
+    that was cut off after its action and parameters.
+
+    Args:
+        text: The response text
+
+    Returns:
+        The parsed action, or None if no action could be found
+    """
+    parser = IncrementalActionParser()
+    parser.feed(text)
+    if "action" not in parser.fields or not isinstance(parser.fields["action"], str):
+        return None
+
+    action = parser.get_action()
+    if not isinstance(action["parameters"], dict):
+        action["parameters"] = {}
+    return action
+
+
+def action_from_message(content: List[Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build an action from Messages API content blocks
+
+    Args:
+        content: The response content blocks (text and tool_use)
+
+    Returns:
+        The action from the first tool call, or from JSON in the text
+        blocks if the model did not call a tool; None if neither is found
+    """
+    texts = []
+    for block in content:
+        block_type = getattr(block, "type", None)
+        if block_type == "tool_use":
+            parameters = dict(block.input or {})
+            reasoning = parameters.pop("reasoning", "")
+            return {
+                "action": block.name,
+                "parameters": parameters,
+                "reasoning": reasoning or "\n".join(texts).strip(),
+            }
+        if block_type == "text":
+            texts.append(block.text)
+
+    return extract_action("\n".join(texts))
+
+
+class StreamingActionResponse:
+    """
+    A streamed next-action response
+
+    The caller reads until the action is ready, dispatches it, and lets the
+    rest of the response (the reasoning) be read in the background.
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        """
+        Initialize the response
+
+        Args:
+            chunks: Iterator over the streamed text chunks
+        """
+        self.chunks = chunks
+        self.parser = IncrementalActionParser()
+        self.text = ""
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+        self.drain_thread: Optional[threading.Thread] = None
+
+    def _consume(self, until_ready: bool) -> None:
+        """Read chunks until the action is ready (or the stream ends)"""
+        try:
+            for chunk in self.chunks:
+                self.text += chunk
+                self.parser.feed(chunk)
+                if until_ready and self.parser.action_ready():
+                    return
+        except Exception as e:
+            logger.error(f"Error reading streamed response: {e}")
+            self.error = e
+        self.done.set()
+
+    def wait_for_action(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the stream until the action and parameters are complete
+
+        Returns:
+            The parsed action, or None if the stream ended without one
+
+        Raises:
+            Exception: The streaming error, if the stream failed before the action arrived
+        """
+        self._consume(until_ready=True)
+        if self.error is not None and not self.parser.action_ready():
+            raise self.error
+        return self.parser.get_action() if self.parser.action_ready() else None
+
+    def drain_in_background(self) -> None:
+        """Read the rest of the stream on a background thread"""
+        if self.done.is_set() or self.drain_thread is not None:
+            return
+
+        # The stream charges its tokens to the budget of the task that started it
+        self.drain_thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._consume, False), daemon=True
+        )
+        self.drain_thread.start()
+
+    def finish(self, timeout: Optional[float] = None) -> str:
+        """
+        Wait for the rest of the stream
+
+        Args:
+            timeout: Optional seconds to wait for the background reader
+
+        Returns:
+            The full response text (so far, if the timeout expired)
+        """
+        if self.drain_thread is None and not self.done.is_set():
+            self._consume(until_ready=False)
+        self.done.wait(timeout)
+        return self.text
@@ -3,14 +3,85 @@ Agent Loop - The core of ポケットAI (Pocket AI)
 Implements the Observe-Judge-Act-Evaluate loop
 """
 
+import asyncio
+import contextvars
+import inspect
+import threading
 import time
-from typing import Dict, Any, List, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Callable, Union
 
+from .agent_memory import AgentMemory, thaw
+from .budgets import TaskBudget
+from .checkpoints import get_checkpoint_store, valid_task_id
+from .tracing import TraceSink, Tracer, default_trace_sinks
 from ..config import get_config
 from ..utils.logger import get_logger
+from ..utils.metrics import get_registry
 
 logger = get_logger(__name__)
 
+TASK_ITERATIONS = get_registry().histogram(
+    "pocket_ai_agent_iterations", "Agent loop iterations per task", buckets=(1, 2, 3, 5, 8, 10, 15, 20, 30, 50)
+)
+TASKS = get_registry().counter("pocket_ai_agent_tasks_total", "Agent tasks by outcome", ["outcome"])
+
+def _callable_name(function: Callable) -> str:
+    """Name a registered callable for its trace spans"""
+    return getattr(function, "__qualname__", None) or repr(function)
+
+async def _call_async(function: Callable, *args: Any) -> Any:
+    """Call a registered callable from a coroutine, awaiting its result if it is awaitable"""
+    result = function(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+class IndependentCallable:
+    """
+    An observer or evaluator that does not depend on the others
+    
+    It is called with a read-only view of the context and returns a
+    dictionary of updates; only its declared output keys are merged back.
+    """
+    
+    def __init__(self, function: Callable[[Mapping[str, Any]], Dict[str, Any]],
+                 outputs: Iterable[str], timeout: Optional[float] = None):
+        """
+        Initialize the registration
+        
+        Args:
+            function: The callable
+            outputs: Context keys the callable may set
+            timeout: Seconds after which its result is dropped (defaults to
+                agent.parallel.timeout)
+        """
+        self.function = function
+        self.outputs = tuple(outputs)
+        self.timeout = timeout
+
+# Threads shared by every AgentLoop for independent callables
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_callable_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide thread pool for independent callables, creating it on first use
+    
+    Returns:
+        The shared ThreadPoolExecutor
+    """
+    global _executor
+    
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config("agent.parallel.max_workers"),
+                thread_name_prefix="pocket-ai-callable"
+            )
+        return _executor
+
 class AgentLoop:
     """
     The core agent loop that implements the Observe-Judge-Act-Evaluate cycle
@@ -21,17 +92,34 @@ class AgentLoop:
         self.name = get_config("agent.name")
         self.description = get_config("agent.description")
         self.max_iterations = get_config("agent.max_iterations")
-        self.memory = []
-        self.memory_size = get_config("agent.memory_size")
+        self.memory = AgentMemory()
+        self.checkpoints = get_checkpoint_store() if get_config("checkpoints.enabled") else None
+        self.leased_task_id: Optional[str] = None
         self.current_task = None
         self.observers = []
         self.judges = []
         self.actors = []
         self.evaluators = []
+        self.listeners = []
+        self.trace_sinks: List[TraceSink] = default_trace_sinks()
+        self.tracer = Tracer(sinks=self.trace_sinks)
+        self.budget = TaskBudget()
+        
+    def register_observer(self, observer: Callable, independent: bool = False,
+                          outputs: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> None:
+        """
+        Register an observer function
         
-    def register_observer(self, observer: Callable) -> None:
-        """Register an observer function"""
-        self.observers.append(observer)
+        Independent observers registered next to each other run concurrently
+        (see IndependentCallable); the others run in registration order.
+        
+        Args:
+            observer: The observer
+            independent: Run it concurrently with neighbouring independent observers
+            outputs: Context keys an independent observer may set
+            timeout: Seconds an independent observer may take
+        """
+        self.observers.append(self._registration(observer, independent, outputs, timeout))
         
     def register_judge(self, judge: Callable) -> None:
         """Register a judge function"""
@@ -41,9 +129,68 @@ class AgentLoop:
         """Register an actor function"""
         self.actors.append(actor)
         
-    def register_evaluator(self, evaluator: Callable) -> None:
-        """Register an evaluator function"""
-        self.evaluators.append(evaluator)
+    def register_evaluator(self, evaluator: Callable, independent: bool = False,
+                           outputs: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> None:
+        """
+        Register an evaluator function
+        
+        Independent evaluators registered next to each other run concurrently
+        (see IndependentCallable); the others run in registration order.
+        
+        Args:
+            evaluator: The evaluator
+            independent: Run it concurrently with neighbouring independent evaluators
+            outputs: Context keys an independent evaluator may set
+            timeout: Seconds an independent evaluator may take
+        """
+        self.evaluators.append(self._registration(evaluator, independent, outputs, timeout))
+    
+    @staticmethod
+    def _registration(function: Callable, independent: bool, outputs: Optional[Iterable[str]],
+                      timeout: Optional[float]) -> Union[Callable, IndependentCallable]:
+        """Wrap an independent callable; sequential ones are stored as is"""
+        if not independent:
+            return function
+        if not outputs:
+            raise ValueError("Independent callables must declare their output keys")
+        return IndependentCallable(function, outputs, timeout)
+    
+    def register_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        Register a listener for loop events
+        
+        Listeners are called with the event name ("start", "observe", "judge",
+        "act", "evaluate", "end") and the current context after each phase.
+        """
+        self.listeners.append(listener)
+        
+    def unregister_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Unregister a previously registered listener"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def register_trace_sink(self, sink: TraceSink) -> None:
+        """Register a sink that receives this loop's timing spans"""
+        self.trace_sinks.append(sink)
+        
+    def unregister_trace_sink(self, sink: TraceSink) -> None:
+        """Unregister a previously registered trace sink"""
+        if sink in self.trace_sinks:
+            self.trace_sinks.remove(sink)
+    
+    def emit(self, event: str, context: Dict[str, Any]) -> None:
+        """
+        Notify all listeners of a loop event
+        
+        Args:
+            event: The event name
+            context: The current context
+        """
+        for listener in self.listeners:
+            try:
+                listener(event, context)
+            except Exception as e:
+                logger.error(f"Listener error: {e}")
     
     def observe(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -57,13 +204,7 @@ class AgentLoop:
         """
         logger.info("🔍 Observing environment...")
         
-        for observer in self.observers:
-            try:
-                context = observer(context)
-            except Exception as e:
-                logger.error(f"Observer error: {e}")
-                
-        return context
+        return self._run_callables(self.observers, context, "Observer")
     
     def judge(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -79,7 +220,8 @@ class AgentLoop:
         
         for judge in self.judges:
             try:
-                context = judge(context)
+                with self.tracer.span(_callable_name(judge), kind="callable"):
+                    context = judge(context)
             except Exception as e:
                 logger.error(f"Judge error: {e}")
                 
@@ -99,7 +241,8 @@ class AgentLoop:
         
         for actor in self.actors:
             try:
-                context = actor(context)
+                with self.tracer.span(_callable_name(actor), kind="callable"):
+                    context = actor(context)
             except Exception as e:
                 logger.error(f"Actor error: {e}")
                 
@@ -117,26 +260,217 @@ class AgentLoop:
         """
         logger.info("📊 Evaluating results...")
         
-        for evaluator in self.evaluators:
+        return self._run_callables(self.evaluators, context, "Evaluator")
+    
+    def _run_callables(self, callables: List[Union[Callable, IndependentCallable]],
+                       context: Dict[str, Any], label: str) -> Dict[str, Any]:
+        """
+        Run a phase's callables, each group of adjacent independent ones concurrently
+        
+        Args:
+            callables: The registered callables
+            context: The current context
+            label: Name used in log messages ("Observer" or "Evaluator")
+            
+        Returns:
+            Updated context
+        """
+        i = 0
+        while i < len(callables):
+            if isinstance(callables[i], IndependentCallable):
+                group = []
+                while i < len(callables) and isinstance(callables[i], IndependentCallable):
+                    group.append(callables[i])
+                    i += 1
+                context = self._run_independent(group, context, label)
+                continue
+            
+            function = callables[i]
+            i += 1
             try:
-                context = evaluator(context)
+                with self.tracer.span(_callable_name(function), kind="callable"):
+                    context = function(context)
             except Exception as e:
-                logger.error(f"Evaluator error: {e}")
+                logger.error(f"{label} error: {e}")
+        
+        return context
+    
+    def _run_independent(self, group: List[IndependentCallable],
+                         context: Dict[str, Any], label: str) -> Dict[str, Any]:
+        """
+        Run independent callables concurrently and merge their outputs
+        
+        Every callable sees the same read-only snapshot of the context.
+        Outputs are merged in registration order, so the result does not
+        depend on which callable finished first. A callable that overruns its
+        timeout keeps its thread until it returns, but its result is dropped.
+        
+        Args:
+            group: The independent callables
+            context: The current context
+            label: Name used in log messages
+            
+        Returns:
+            Updated context
+        """
+        snapshot = MappingProxyType(dict(context))
+        executor = get_callable_executor()
+        
+        def call(entry: IndependentCallable) -> Dict[str, Any]:
+            with self.tracer.span(_callable_name(entry.function), kind="callable"):
+                return entry.function(snapshot)
+        
+        # Each callable charges its LLM tokens and sandbox time to this task's budget and trace
+        started = time.monotonic()
+        futures = [executor.submit(contextvars.copy_context().run, call, entry) for entry in group]
+        
+        for entry, future in zip(group, futures):
+            name = _callable_name(entry.function)
+            timeout = entry.timeout if entry.timeout is not None else get_config("agent.parallel.timeout")
+            try:
+                updates = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+            except FutureTimeoutError:
+                logger.warning(f"{label} {name} timed out after {timeout}s")
+                continue
+            except Exception as e:
+                logger.error(f"{label} error: {e}")
+                continue
+            
+            self._merge_updates(entry, updates, context, label)
+        
+        return context
+    
+    @staticmethod
+    def _merge_updates(entry: IndependentCallable, updates: Any, context: Dict[str, Any], label: str) -> None:
+        """Merge the declared outputs of an independent callable into the context"""
+        name = _callable_name(entry.function)
+        if not isinstance(updates, dict):
+            if updates is not None:
+                logger.error(f"{label} {name} returned {type(updates).__name__}, expected a dict of updates")
+            return
+        
+        undeclared = set(updates) - set(entry.outputs)
+        if undeclared:
+            logger.warning(f"{label} {name} set undeclared keys: {', '.join(sorted(undeclared))}")
+        for key in entry.outputs:
+            if key in updates:
+                context[key] = updates[key]
+    
+    async def aobserve(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Observe the environment from a coroutine (see observe)"""
+        logger.info("🔍 Observing environment...")
+        
+        return await self._arun_callables(self.observers, context, "Observer")
+    
+    async def ajudge(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Judge what action to take from a coroutine (see judge)"""
+        logger.info("🤔 Making judgment...")
+        
+        for judge in self.judges:
+            try:
+                with self.tracer.span(_callable_name(judge), kind="callable"):
+                    context = await _call_async(judge, context)
+            except Exception as e:
+                logger.error(f"Judge error: {e}")
+                
+        return context
+    
+    async def aact(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Take action from a coroutine (see act)"""
+        logger.info("🚀 Taking action...")
+        
+        for actor in self.actors:
+            try:
+                with self.tracer.span(_callable_name(actor), kind="callable"):
+                    context = await _call_async(actor, context)
+            except Exception as e:
+                logger.error(f"Actor error: {e}")
                 
         return context
     
-    def add_to_memory(self, entry: Dict[str, Any]) -> None:
+    async def aevaluate(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate the results of the action from a coroutine (see evaluate)"""
+        logger.info("📊 Evaluating results...")
+        
+        return await self._arun_callables(self.evaluators, context, "Evaluator")
+    
+    async def _arun_callables(self, callables: List[Union[Callable, IndependentCallable]],
+                              context: Dict[str, Any], label: str) -> Dict[str, Any]:
+        """Run a phase's callables from a coroutine (see _run_callables)"""
+        i = 0
+        while i < len(callables):
+            if isinstance(callables[i], IndependentCallable):
+                group = []
+                while i < len(callables) and isinstance(callables[i], IndependentCallable):
+                    group.append(callables[i])
+                    i += 1
+                context = await self._arun_independent(group, context, label)
+                continue
+            
+            function = callables[i]
+            i += 1
+            try:
+                with self.tracer.span(_callable_name(function), kind="callable"):
+                    context = await _call_async(function, context)
+            except Exception as e:
+                logger.error(f"{label} error: {e}")
+        
+        return context
+    
+    async def _arun_independent(self, group: List[IndependentCallable],
+                                context: Dict[str, Any], label: str) -> Dict[str, Any]:
         """
-        Add an entry to the agent's memory
+        Run independent callables concurrently on the event loop and merge their outputs
+        
+        Coroutine functions run as tasks and are cancelled when they overrun
+        their timeout; plain functions run on worker threads, whose late
+        results are dropped as in _run_independent.
         
         Args:
-            entry: The memory entry to add
+            group: The independent callables
+            context: The current context
+            label: Name used in log messages
+            
+        Returns:
+            Updated context
         """
-        self.memory.append(entry)
+        snapshot = MappingProxyType(dict(context))
         
-        # Trim memory if it exceeds the maximum size
-        if len(self.memory) > self.memory_size:
-            self.memory = self.memory[-self.memory_size:]
+        async def call(entry: IndependentCallable) -> Any:
+            name = _callable_name(entry.function)
+            timeout = entry.timeout if entry.timeout is not None else get_config("agent.parallel.timeout")
+            
+            async def traced() -> Any:
+                with self.tracer.span(name, kind="callable"):
+                    if inspect.iscoroutinefunction(entry.function):
+                        return await entry.function(snapshot)
+                    return await asyncio.to_thread(entry.function, snapshot)
+            
+            try:
+                return await asyncio.wait_for(traced(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{label} {name} timed out after {timeout}s")
+            except Exception as e:
+                logger.error(f"{label} error: {e}")
+            return None
+        
+        results = await asyncio.gather(*(call(entry) for entry in group))
+        for entry, updates in zip(group, results):
+            self._merge_updates(entry, updates, context, label)
+        
+        return context
+    
+    def add_to_memory(self, context: Dict[str, Any]) -> Mapping[str, Any]:
+        """
+        Record a snapshot of the current iteration in the agent's memory
+        
+        Args:
+            context: The current context
+            
+        Returns:
+            The read-only snapshot (see AgentMemory.record)
+        """
+        return self.memory.record(context)
     
     def run_once(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -152,54 +486,399 @@ class AgentLoop:
         context["timestamp"] = time.time()
         
         # Run the observe-judge-act-evaluate loop
-        context = self.observe(context)
-        context = self.judge(context)
-        context = self.act(context)
-        context = self.evaluate(context)
-        
-        # Add to memory
-        self.add_to_memory({
-            "timestamp": context["timestamp"],
-            "task": self.current_task,
-            "context": context
-        })
+        phases = [
+            ("observe", self.observe),
+            ("judge", self.judge),
+            ("act", self.act),
+            ("evaluate", self.evaluate),
+        ]
+        for event, phase in phases:
+            self.tracer.phase = event
+            try:
+                with self.tracer.span(event, kind="phase"):
+                    context = phase(context)
+            finally:
+                self.tracer.phase = None
+            
+            if self._phase_done(event, context):
+                break
+        
+        return self._end_iteration(context)
+    
+    async def arun_once(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one iteration of the agent loop from a coroutine
+        
+        Args:
+            context: The initial context
+            
+        Returns:
+            Updated context after one iteration
+        """
+        context["timestamp"] = time.time()
+        
+        phases = [
+            ("observe", self.aobserve),
+            ("judge", self.ajudge),
+            ("act", self.aact),
+            ("evaluate", self.aevaluate),
+        ]
+        for event, phase in phases:
+            self.tracer.phase = event
+            try:
+                with self.tracer.span(event, kind="phase"):
+                    context = await phase(context)
+            finally:
+                self.tracer.phase = None
+            
+            if self._phase_done(event, context):
+                break
+        
+        return self._end_iteration(context)
+    
+    def _phase_done(self, event: str, context: Dict[str, Any]) -> bool:
+        """
+        Notify listeners that a phase finished and check whether the iteration should stop
+        
+        Args:
+            event: The phase name
+            context: The current context
+            
+        Returns:
+            True if a component ended the task
+        """
+        self.emit(event, context)
+        self._check_budget(context)
+        
+        # A component can end the task (e.g. the LLM is unreachable)
+        if context.get("stop_reason"):
+            logger.warning(f"🛑 Stopping after {event}: {context['stop_reason']}")
+            return True
+        return False
+    
+    def _check_budget(self, context: Dict[str, Any]) -> None:
+        """
+        Stop the task if it reached its deadline, token or sandbox CPU budget
+        
+        Args:
+            context: The current context
+        """
+        if context.get("complete", False) or context.get("stop_reason"):
+            return
+        
+        reason = self.budget.exceeded()
+        if reason:
+            context["stop_reason"] = reason
+    
+    def _end_iteration(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a finished iteration in memory and its budget usage in the context"""
+        context["budget"] = self.budget.summary()
+        self.add_to_memory(context)
         
         return context
     
-    def run(self, task: str, initial_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def run(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+            should_stop: Optional[Callable[[], bool]] = None,
+            resume_task_id: Optional[str] = None,
+            budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Run the agent loop for a given task
         
+        A checkpoint is saved after every iteration (see core.checkpoints),
+        so a task interrupted by a crash or restart can be resumed by its id.
+        
+        The task's deadline, LLM tokens and sandbox CPU time are checked
+        against its budget (see core.budgets) between phases; a task that
+        reaches a limit stops with its partial results and a stop_reason of
+        "deadline_exceeded", "token_budget_exceeded" or
+        "sandbox_cpu_budget_exceeded".
+        
         Args:
             task: The task to perform
             initial_context: Optional initial context
+            should_stop: Optional callable checked before each iteration; the
+                loop stops early (with context["cancelled"] set) when it returns True
+            resume_task_id: Optional id of a task to resume from its last
+                checkpoint (task and initial_context then only fill in what
+                the checkpoint lacks); without a checkpoint the task starts
+                over under this id
+            budget: Optional overrides of the agent.budget limits
+                ("deadline", "tokens", "sandbox_cpu")
             
         Returns:
-            Final context after completing the task
+            Final context after completing the task, with a per-phase timing
+            summary under "timing" and the budget usage under "budget"
+        """
+        context = self._start_task(task, initial_context, resume_task_id, budget)
+        
+        # Usage anywhere in this thread is charged to the task, and timed in its trace
+        token = self.budget.activate()
+        trace_token = self.tracer.activate()
+        try:
+            # Run the loop until the task is complete or max iterations is reached
+            while self._next_iteration(context, should_stop):
+                context = self.run_once(context)
+                self._save_checkpoint(context)
+                
+                if self._iteration_ended_task(context):
+                    break
+            
+            return self._finish_task(context)
+        finally:
+            self.tracer.deactivate(trace_token)
+            self.budget.deactivate(token)
+            self._release_lease()
+    
+    async def arun(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None,
+                   resume_task_id: Optional[str] = None,
+                   budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
+        Run the agent loop for a given task from a coroutine
+        
+        Registered callables may be coroutine functions, which are awaited,
+        or plain functions, which are called on the event loop and should
+        therefore not block. One loop runs one task at a time; create an
+        AgentLoop per concurrent task.
+        
+        Args:
+            task: The task to perform
+            initial_context: Optional initial context
+            should_stop: Optional callable checked before each iteration (see run)
+            resume_task_id: Optional id of a task to resume (see run)
+            budget: Optional overrides of the agent.budget limits (see run)
+            
+        Returns:
+            Final context after completing the task (see run)
+        """
+        context = self._start_task(task, initial_context, resume_task_id, budget)
+        
+        # Usage anywhere in this asyncio task (and threads it starts) is charged to the task,
+        # and timed in its trace
+        token = self.budget.activate()
+        trace_token = self.tracer.activate()
+        try:
+            while self._next_iteration(context, should_stop):
+                context = await self.arun_once(context)
+                await asyncio.to_thread(self._save_checkpoint, context)
+                
+                if self._iteration_ended_task(context):
+                    break
+            
+            return self._finish_task(context)
+        finally:
+            self.tracer.deactivate(trace_token)
+            self.budget.deactivate(token)
+            self._release_lease()
+    
+    def _start_task(self, task: str, initial_context: Optional[Dict[str, Any]],
+                    resume_task_id: Optional[str] = None,
+                    budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Set up the context, tracer and budget for a new or resumed task
+        
+        Args:
+            task: The task to perform
+            initial_context: Optional initial context
+            resume_task_id: Optional id of a task to resume from its last checkpoint
+            budget: Optional overrides of the agent.budget limits
+            
+        Returns:
+            The task's context
+            
+        Raises:
+            ValueError: If there is neither a checkpoint to resume nor a task
+            TaskBusy: If another run holds the task id (see CheckpointStore.acquire)
+        """
+        # A lease left behind by a run that failed to start
+        self._release_lease()
+        
+        checkpoint = None
+        if resume_task_id:
+            # Take the lease before reading the log, so no other run appends to it
+            self._take_lease(resume_task_id)
+            try:
+                if self.checkpoints is not None:
+                    checkpoint = self.checkpoints.load(resume_task_id)
+            except BaseException:
+                self._release_lease()
+                raise
+            if checkpoint is None:
+                logger.warning(f"No checkpoint for task {resume_task_id}, starting it from the beginning")
+        
+        if checkpoint is not None:
+            self.budget = TaskBudget(budget)
+            return self._resume_task(checkpoint, initial_context)
+        
+        if not task:
+            self._release_lease()
+            raise ValueError("No task provided")
+        
         self.current_task = task
+        self.budget = TaskBudget(budget)
         
         # Initialize context
-        context = initial_context or {}
+        context = initial_context if initial_context is not None else {}
         context["task"] = task
         context["iterations"] = 0
         context["complete"] = False
+        context.pop("stop_reason", None)
+        context.pop("budget", None)
+        if resume_task_id:
+            context["task_id"] = resume_task_id
+        
+        # Time every phase of this task under its own id
+        self.tracer = Tracer(context.get("task_id"), self.trace_sinks)
+        context["task_id"] = self.tracer.task_id
+        if self.leased_task_id is None:
+            self._take_lease(context["task_id"])
+        
+        # Snapshots of earlier tasks are not carried over
+        self.memory.start_task(context["task_id"])
         
         logger.info(f"🤖 Starting task: {task}")
+        self.emit("start", context)
         
-        # Run the loop until the task is complete or max iterations is reached
-        while not context.get("complete", False) and context["iterations"] < self.max_iterations:
-            context["iterations"] += 1
-            logger.info(f"Iteration {context['iterations']}/{self.max_iterations}")
+        return context
+    
+    def _resume_task(self, checkpoint: Dict[str, Any], initial_context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Set up the context, tracer and memory of a task from its last checkpoint
+        
+        Args:
+            checkpoint: The checkpoint (see CheckpointStore.load)
+            initial_context: Optional values that override the restored context
             
-            context = self.run_once(context)
+        Returns:
+            The task's context
+        """
+        context = checkpoint["context"]
+        context.update(initial_context or {})
+        
+        # Whatever stopped the task last time does not stop it now
+        for key in ("stop_reason", "cancelled", "error"):
+            context.pop(key, None)
+        context["task_id"] = checkpoint["task_id"]
+        context["resumed_from"] = checkpoint["iteration"]
+        
+        # Tokens and sandbox time spent before the interruption still count
+        self.budget.restore(context.pop("budget", None))
+        
+        self.current_task = context.get("task") or checkpoint["task"]
+        self.tracer = Tracer(checkpoint["task_id"], self.trace_sinks)
+        self.tracer.iteration = context.get("iterations", 0)
+        self.memory.restore(checkpoint["task_id"], checkpoint["snapshots"], context)
+        
+        logger.info(f"🔁 Resuming task {checkpoint['task_id']} after iteration {checkpoint['iteration']}: {self.current_task}")
+        self.emit("start", context)
+        
+        return context
+    
+    def _take_lease(self, task_id: str) -> None:
+        """
+        Make this loop the only run of a task id while it is checkpointed
+        
+        Ids that cannot be checkpointed are not leased.
+        
+        Args:
+            task_id: The task id
             
-            # Check if the task is complete
-            if context.get("complete", False):
-                logger.info(f"✅ Task completed in {context['iterations']} iterations")
-                break
-                
-        if not context.get("complete", False):
+        Raises:
+            TaskBusy: If another run holds the task id
+        """
+        if self.checkpoints is None or not valid_task_id(task_id):
+            return
+        
+        self.checkpoints.acquire(task_id)
+        self.leased_task_id = task_id
+    
+    def _release_lease(self) -> None:
+        """Give up the task id leased by _take_lease, if any"""
+        task_id, self.leased_task_id = self.leased_task_id, None
+        if task_id is not None:
+            self.checkpoints.release(task_id)
+    
+    def _save_checkpoint(self, context: Dict[str, Any]) -> None:
+        """
+        Append a checkpoint of the task after an iteration
+        
+        A failed write is logged; the task carries on without it.
+        
+        Args:
+            context: The current context
+        """
+        if self.checkpoints is None or not context.get("task_id"):
+            return
+        
+        try:
+            with self.tracer.span("checkpoint"):
+                self.checkpoints.save(context, thaw(self.memory.last()))
+        except Exception as e:
+            logger.error(f"Error saving checkpoint of task {context['task_id']}: {e}")
+    
+    def _next_iteration(self, context: Dict[str, Any], should_stop: Optional[Callable[[], bool]]) -> bool:
+        """
+        Check whether another iteration should run, and count it if so
+        
+        Args:
+            context: The current context
+            should_stop: Optional cancellation check
+            
+        Returns:
+            True if the loop should run another iteration
+        """
+        if context.get("complete", False) or context["iterations"] >= self.max_iterations:
+            return False
+        
+        # The last checkpoint may have used up the rest of the deadline
+        self._check_budget(context)
+        if context.get("stop_reason"):
+            logger.warning(f"🛑 Task stopped after {context['iterations']} iterations: {context['stop_reason']}")
+            return False
+        
+        if should_stop is not None and should_stop():
+            logger.info(f"🛑 Task stopped after {context['iterations']} iterations")
+            context["cancelled"] = True
+            context["stop_reason"] = "cancelled"
+            return False
+        
+        context["iterations"] += 1
+        self.tracer.iteration = context["iterations"]
+        logger.info(f"Iteration {context['iterations']}/{self.max_iterations}")
+        return True
+    
+    def _iteration_ended_task(self, context: Dict[str, Any]) -> bool:
+        """Check whether the last iteration completed or stopped the task"""
+        if context.get("complete", False):
+            logger.info(f"✅ Task completed in {context['iterations']} iterations")
+            return True
+        
+        return bool(context.get("stop_reason"))
+    
+    def _finish_task(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record the outcome of a task and notify listeners
+        
+        Args:
+            context: The final context
+            
+        Returns:
+            The final context, with the timing summary under "timing"
+        """
+        if not context.get("complete", False) and not context.get("stop_reason"):
             logger.warning(f"⚠️ Task not completed after {self.max_iterations} iterations")
+        
+        # A completed task has nothing left to resume
+        if self.checkpoints is not None and context.get("complete") and not get_config("checkpoints.keep_completed"):
+            try:
+                self.checkpoints.delete(context["task_id"])
+            except ValueError:
+                pass
+        
+        context["timing"] = self.tracer.summary()
+        context["budget"] = self.budget.summary()
+        TASK_ITERATIONS.observe(context["iterations"])
+        TASKS.inc("complete" if context.get("complete") else context.get("stop_reason") or "max_iterations")
+        self.emit("end", context)
             
         return context
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Agent Memory - Compact snapshots of a task's iterations
+
+Each iteration is recorded as a small immutable snapshot: the chosen action,
+the evaluation, and only the context fields that changed since the previous
+iteration, with long values (such as page HTML) reduced and shortened.
+Snapshots are kept in a ring buffer bounded both by count and by their
+serialized size, and the buffer is cleared when a new task starts.
+"""
+
+import hashlib
+import json
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Dict, Any, Deque, Iterator, List, Mapping, Optional, Tuple
+
+from .context_compactor import html_to_text, looks_like_html
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Context keys that are recorded as snapshot fields rather than diffed
+SUMMARY_KEYS = {"parsed_action", "evaluation", "complete", "stop_reason"}
+
+# Context keys that are never recorded (bookkeeping, or the raw LLM text of parsed_action)
+SKIPPED_KEYS = {"task", "task_id", "iterations", "timestamp", "timing", "next_action", "context_usage", "budget"}
+
+# Items kept from a long list or dictionary
+MAX_ITEMS = 20
+
+
+def compact_value(value: Any, max_chars: int) -> Any:
+    """
+    Reduce a context value to a small JSON-compatible copy
+
+    HTML is reduced to its text, long strings keep their beginning with an
+    omission marker, and long lists and dictionaries keep their first items.
+
+    Args:
+        value: The value to compact
+        max_chars: Longest string kept in full
+
+    Returns:
+        The compacted copy
+    """
+    if isinstance(value, str):
+        if len(value) > max_chars and looks_like_html(value):
+            value = html_to_text(value)
+        if len(value) > max_chars:
+            return f"{value[:max_chars]}... [{len(value) - max_chars} chars omitted]"
+        return value
+
+    if isinstance(value, Mapping):
+        items = list(value.items())
+        compacted = {str(key): compact_value(item, max_chars) for key, item in items[:MAX_ITEMS]}
+        if len(items) > MAX_ITEMS:
+            compacted["..."] = f"{len(items) - MAX_ITEMS} more keys"
+        return compacted
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        compacted = [compact_value(item, max_chars) for item in items[:MAX_ITEMS]]
+        if len(items) > MAX_ITEMS:
+            compacted.append(f"... {len(items) - MAX_ITEMS} more items")
+        return compacted
+
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+
+    return compact_value(str(value), max_chars)
+
+
+def _freeze(value: Any) -> Any:
+    """Make a compacted value read-only (dictionaries become mapping proxies, lists tuples)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """
+    Copy a snapshot (or part of one) into plain dictionaries and lists
+
+    Args:
+        value: A snapshot or snapshot value
+
+    Returns:
+        A mutable, JSON-serializable copy
+    """
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _fingerprint(value: Any) -> str:
+    """Hash a context value to detect changes between iterations"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class AgentMemory:
+    """
+    A ring buffer of compact, read-only iteration snapshots for one task
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_field_chars: Optional[int] = None):
+        """
+        Initialize the memory
+
+        Args:
+            max_entries: Maximum number of snapshots kept
+            max_bytes: Maximum serialized size of all snapshots
+            max_field_chars: Longest string kept in full in a snapshot
+        """
+        self.max_entries = max_entries or get_config("agent.memory_size")
+        self.max_bytes = max_bytes or get_config("agent.memory_max_bytes")
+        self.max_field_chars = max_field_chars or get_config("agent.memory_field_chars")
+
+        self.task_id: Optional[str] = None
+        self.entries: Deque[Tuple[Mapping[str, Any], int]] = deque()
+        self.size = 0
+        self.fingerprints: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.counters = {
+            "recorded": 0,
+            "evictions": 0,
+        }
+
+    def start_task(self, task_id: Optional[str]) -> None:
+        """
+        Forget the previous task's snapshots
+
+        Args:
+            task_id: Identifier of the new task
+        """
+        with self.lock:
+            self.task_id = task_id
+            self.entries.clear()
+            self.size = 0
+            self.fingerprints = {}
+
+    def restore(self, task_id: Optional[str], snapshots: List[Dict[str, Any]], context: Dict[str, Any]) -> None:
+        """
+        Restore a resumed task's snapshots
+
+        Args:
+            task_id: Identifier of the task
+            snapshots: The task's snapshots, oldest first
+            context: The restored context (the baseline for the next diff)
+        """
+        self.start_task(task_id)
+
+        with self.lock:
+            for snapshot in snapshots[-self.max_entries:]:
+                size = len(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+                self.entries.append((_freeze(snapshot), size))
+                self.size += size
+            while len(self.entries) > 1 and self.size > self.max_bytes:
+                _, evicted_size = self.entries.popleft()
+                self.size -= evicted_size
+
+            self.fingerprints = {key: _fingerprint(value) for key, value in context.items()
+                                 if key not in SUMMARY_KEYS and key not in SKIPPED_KEYS}
+
+    def record(self, context: Dict[str, Any]) -> Mapping[str, Any]:
+        """
+        Record a snapshot of the context after an iteration
+
+        Args:
+            context: The current context
+
+        Returns:
+            The read-only snapshot
+        """
+        limit = self.max_field_chars
+        action = context.get("parsed_action") or {}
+        evaluation = context.get("evaluation") or {}
+
+        fingerprints = {}
+        changed = {}
+        for key, value in context.items():
+            if key in SUMMARY_KEYS or key in SKIPPED_KEYS:
+                continue
+            fingerprints[key] = _fingerprint(value)
+            if self.fingerprints.get(key) != fingerprints[key]:
+                changed[key] = compact_value(value, limit)
+
+        snapshot = {
+            "task_id": self.task_id,
+            "iteration": context.get("iterations", 0),
+            "timestamp": context.get("timestamp"),
+            "action": action.get("action"),
+            "parameters": compact_value(action.get("parameters") or {}, limit),
+            "success": evaluation.get("success"),
+            "feedback": compact_value(evaluation.get("feedback", ""), limit),
+            "complete": bool(context.get("complete", False)),
+            "stop_reason": context.get("stop_reason"),
+            "changed": changed,
+            "removed": sorted(set(self.fingerprints) - set(fingerprints)),
+        }
+        size = len(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+        frozen = _freeze(snapshot)
+
+        with self.lock:
+            self.fingerprints = fingerprints
+            self.entries.append((frozen, size))
+            self.size += size
+            self.counters["recorded"] += 1
+
+            # Always keep the newest snapshot, even if it alone exceeds the budget
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, evicted_size = self.entries.popleft()
+                self.size -= evicted_size
+                self.counters["evictions"] += 1
+
+        return frozen
+
+    def recent(self, count: int = 5, action: Optional[str] = None) -> List[Mapping[str, Any]]:
+        """
+        Get the most recent snapshots
+
+        Args:
+            count: Maximum number of snapshots to return
+            action: Only return snapshots of this action
+
+        Returns:
+            The snapshots, oldest first
+        """
+        result = []
+        with self.lock:
+            for snapshot, _ in reversed(self.entries):
+                if len(result) >= count:
+                    break
+                if action is None or snapshot["action"] == action:
+                    result.append(snapshot)
+        result.reverse()
+        return result
+
+    def last(self) -> Optional[Mapping[str, Any]]:
+        """
+        Get the newest snapshot
+
+        Returns:
+            The snapshot, or None if nothing was recorded for this task
+        """
+        with self.lock:
+            return self.entries[-1][0] if self.entries else None
+
+    def clear(self) -> None:
+        """Forget all snapshots"""
+        self.start_task(self.task_id)
+
+    def __len__(self) -> int:
+        """Number of snapshots kept"""
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        """Iterate over the kept snapshots, oldest first"""
+        with self.lock:
+            snapshots = [snapshot for snapshot, _ in self.entries]
+        return iter(snapshots)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get memory statistics
+
+        Returns:
+            Dictionary with the task id, number and size of snapshots, and counters
+        """
+        with self.lock:
+            return {
+                "task_id": self.task_id,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                **self.counters,
+            }
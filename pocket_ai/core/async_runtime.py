@@ -0,0 +1,88 @@
+"""
+Async Runtime - The event loop shared by the asyncio agents
+
+The async Anthropic client and async Playwright are bound to the event loop
+they were first used on. Synchronous callers therefore do not start a new
+loop per call; they submit coroutines to one long-lived loop running in a
+daemon thread, on which any number of tasks can be in flight at once.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional, TypeVar
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Loop shared by every synchronous wrapper in the process
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the process-wide event loop, starting its thread on first use
+
+    Returns:
+        The running shared event loop
+    """
+    global _loop, _thread
+
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="pocket-ai-event-loop", daemon=True)
+            _thread.start()
+            logger.info("Started the shared event loop")
+        return _loop
+
+
+def in_event_loop_thread() -> bool:
+    """Check whether the caller is running on the shared event loop's thread"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def run_sync(coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared event loop and wait for its result
+
+    Args:
+        coroutine: The coroutine to run
+        timeout: Optional seconds to wait before the coroutine is cancelled
+
+    Returns:
+        The coroutine's result
+
+    Raises:
+        RuntimeError: If called from the shared loop's own thread (await
+            the coroutine there instead)
+        TimeoutError: If the timeout expired
+    """
+    if in_event_loop_thread():
+        if asyncio.iscoroutine(coroutine):
+            coroutine.close()
+        raise RuntimeError("run_sync() cannot be called from the shared event loop; await the coroutine instead")
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def submit(coroutine: Awaitable[Any]) -> Future:
+    """
+    Schedule a coroutine on the shared event loop without waiting for it
+
+    Args:
+        coroutine: The coroutine to run
+
+    Returns:
+        A concurrent.futures.Future for its result
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
@@ -0,0 +1,199 @@
+"""
+Budgets - Per-task limits on wall-clock time, LLM tokens and sandbox CPU time
+
+The agent loop gives every task a TaskBudget and makes it the current budget
+of the task's thread (or asyncio task) through a context variable. The LLM
+manager and the sandbox charge what they use to the current budget, so
+usage is attributed to the right task even when many tasks share one
+LLMManager. The loop checks the budget between phases and ends the task
+with a stop reason as soon as a limit is reached.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Limits accepted by get_budget_limits, defaulting to the agent.budget config (0 disables a limit)
+LIMIT_KEYS = ("deadline", "tokens", "sandbox_cpu")
+
+# Stop reason of a task that reached each limit
+STOP_REASONS = {
+    "deadline": "deadline_exceeded",
+    "tokens": "token_budget_exceeded",
+    "sandbox_cpu": "sandbox_cpu_budget_exceeded",
+}
+
+_current_budget: contextvars.ContextVar[Optional["TaskBudget"]] = contextvars.ContextVar(
+    "pocket_ai_task_budget", default=None
+)
+
+
+def get_budget_limits(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Get the budget limits for a task
+
+    Args:
+        overrides: Optional limits that replace the configured ones (0
+            disables a limit); values that are not numbers of at least 0
+            are ignored
+
+    Returns:
+        Dictionary with deadline (seconds), tokens and sandbox_cpu (seconds)
+    """
+    limits = {key: get_config(f"agent.budget.{key}") for key in LIMIT_KEYS}
+    for key, value in (overrides or {}).items():
+        if key not in LIMIT_KEYS or value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            logger.warning(f"Ignoring invalid budget limit {key}={value!r}")
+            continue
+        limits[key] = value
+    return limits
+
+
+class TaskBudget:
+    """
+    Usage of one task, checked against its limits
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the budget; the deadline counts from now
+
+        Args:
+            limits: Optional overrides for the configured limits
+        """
+        self.limits = get_budget_limits(limits)
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.sandbox_cpu = 0.0
+        # Independent callables may charge from worker threads
+        self.lock = threading.Lock()
+
+    def charge_tokens(self, tokens: int) -> None:
+        """
+        Charge LLM tokens to the task
+
+        Args:
+            tokens: Input and output tokens reported by the API
+        """
+        with self.lock:
+            self.tokens += tokens
+
+    def charge_sandbox_cpu(self, seconds: float) -> None:
+        """
+        Charge sandbox CPU time to the task
+
+        Args:
+            seconds: User and system CPU time of a sandboxed run
+        """
+        with self.lock:
+            self.sandbox_cpu += seconds
+
+    def elapsed(self) -> float:
+        """Seconds since the budget was created"""
+        return time.monotonic() - self.started
+
+    def exceeded(self) -> Optional[str]:
+        """
+        Check whether a limit has been reached
+
+        Returns:
+            The stop reason of the first limit reached, or None
+        """
+        used = self.used()
+        for key in LIMIT_KEYS:
+            if self.limits[key] and used[key] >= self.limits[key]:
+                return STOP_REASONS[key]
+        return None
+
+    def used(self) -> Dict[str, Any]:
+        """Get the usage counted against each limit"""
+        with self.lock:
+            return {
+                "deadline": self.elapsed(),
+                "tokens": self.tokens,
+                "sandbox_cpu": self.sandbox_cpu,
+            }
+
+    def restore(self, usage: Optional[Dict[str, Any]]) -> None:
+        """
+        Carry over the tokens and sandbox CPU time a resumed task already used
+
+        The deadline is not carried over; it counts from the resumed run's start.
+
+        Args:
+            usage: A previous run's summary (see summary)
+        """
+        used = (usage or {}).get("used") or {}
+        with self.lock:
+            self.tokens += int(used.get("tokens") or 0)
+            self.sandbox_cpu += float(used.get("sandbox_cpu") or 0.0)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Get the task's limits and usage
+
+        Returns:
+            Dictionary with limits, used and the stop reason of an exceeded limit
+        """
+        used = self.used()
+        return {
+            "limits": dict(self.limits),
+            "used": {
+                "deadline": round(used["deadline"], 4),
+                "tokens": used["tokens"],
+                "sandbox_cpu": round(used["sandbox_cpu"], 4),
+            },
+            "exceeded": self.exceeded(),
+        }
+
+    def activate(self) -> contextvars.Token:
+        """
+        Make this the current budget of the calling thread or asyncio task
+
+        Returns:
+            Token to pass to deactivate
+        """
+        return _current_budget.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token) -> None:
+        """Restore the budget that was current before activate"""
+        _current_budget.reset(token)
+
+
+def current_budget() -> Optional[TaskBudget]:
+    """Get the budget of the task running in the caller's context, if any"""
+    return _current_budget.get()
+
+
+def charge_tokens(tokens: int) -> None:
+    """
+    Charge LLM tokens to the current task, if there is one
+
+    Args:
+        tokens: Input and output tokens reported by the API
+    """
+    budget = _current_budget.get()
+    if budget is not None and tokens:
+        budget.charge_tokens(tokens)
+
+
+def charge_sandbox_cpu(seconds: float) -> None:
+    """
+    Charge sandbox CPU time to the current task, if there is one
+
+    Args:
+        seconds: User and system CPU time of a sandboxed run
+    """
+    budget = _current_budget.get()
+    if budget is not None and seconds:
+        budget.charge_sandbox_cpu(seconds)
@@ -0,0 +1,469 @@
+"""
+Checkpoints - Crash-safe progress log for agent tasks
+
+After every iteration the agent loop appends a checkpoint to the task's
+log: the context, with large strings (such as page HTML) moved to
+content-addressed blob files, plus the iteration's memory snapshot. A blob
+is written once per task however many iterations refer to it, so a
+checkpoint stays small even when the page does not change. Appending
+never rewrites earlier checkpoints, and a line torn by a crash is skipped
+on load, so a task can always be resumed from its last complete iteration.
+
+A run holds a lease on its task id (an flock on a lock file, released by
+the kernel if the process dies), so two runs can never append to the same
+log, whether they are in one process or several sharing the directory.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Context keys that are recomputed on resume and not worth saving
+UNSAVED_KEYS = {"timing", "context_usage"}
+
+# Marker of a string stored as a blob
+BLOB_KEY = "$blob"
+
+LOG_FILENAME = "checkpoints.jsonl"
+
+# Lock files live here, apart from the task directories removed on completion
+LOCK_DIRNAME = ".locks"
+
+# Context key identifying the caller a task belongs to (see server.request_owner)
+OWNER_KEY = "owner"
+
+# Plain names only; the first character excludes "." and ".."
+_TASK_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+
+def valid_task_id(task_id: Any) -> bool:
+    """Check whether a value can be used as a task id"""
+    return isinstance(task_id, str) and bool(_TASK_ID_RE.match(task_id))
+
+
+class TaskBusy(Exception):
+    """Raised when a task id is already being run"""
+    pass
+
+
+class CheckpointStore:
+    """
+    Append-only checkpoint logs, one directory per task
+    """
+
+    def __init__(self, directory: Optional[str] = None, blob_threshold: Optional[int] = None,
+                 fsync: Optional[bool] = None):
+        """
+        Initialize the store
+
+        Args:
+            directory: Directory holding the task directories
+            blob_threshold: Strings at least this many characters long are stored as blobs
+            fsync: Whether each checkpoint is flushed to disk before the loop continues
+        """
+        self.directory = directory or get_config("checkpoints.path")
+        self.blob_threshold = blob_threshold or get_config("checkpoints.blob_threshold")
+        self.fsync = fsync if fsync is not None else get_config("checkpoints.fsync")
+        self.lock = threading.Lock()
+        # Logs checked for a line torn by a crash since the process started
+        self.checked_logs = set()
+        # Lock file descriptors of the tasks this process is running
+        self.leases: Dict[str, int] = {}
+        self.counters = {
+            "saved": 0,
+            "bytes": 0,
+            "blobs_written": 0,
+            "blobs_reused": 0,
+            "loaded": 0,
+        }
+
+    def _task_dir(self, task_id: str) -> str:
+        """Get a task's directory, rejecting ids that are not plain names"""
+        if not valid_task_id(task_id):
+            raise ValueError(f"Invalid task id: {task_id!r}")
+        return os.path.join(self.directory, task_id)
+
+    def _lock_path(self, task_id: str) -> str:
+        """Get a task's lock file path, rejecting ids that are not plain names"""
+        if not valid_task_id(task_id):
+            raise ValueError(f"Invalid task id: {task_id!r}")
+        return os.path.join(self.directory, LOCK_DIRNAME, task_id)
+
+    def acquire(self, task_id: str) -> None:
+        """
+        Take the lease on a task id for a run
+
+        Args:
+            task_id: The task id
+
+        Raises:
+            TaskBusy: If another run (in any process) holds the lease
+            ValueError: If the task id is not a plain name
+        """
+        path = self._lock_path(task_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                raise TaskBusy(f"Task {task_id} is already running")
+            except BaseException:
+                os.close(fd)
+                raise
+
+            # prune may have removed the file before it was locked; lock the new one instead
+            try:
+                if os.path.samestat(os.fstat(fd), os.stat(path)):
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+        with self.lock:
+            self.leases[task_id] = fd
+
+    def release(self, task_id: str) -> None:
+        """
+        Give up the lease on a task id
+
+        Args:
+            task_id: The task id
+        """
+        with self.lock:
+            fd = self.leases.pop(task_id, None)
+        if fd is not None:
+            # Closing the descriptor drops the flock
+            os.close(fd)
+
+    def is_running(self, task_id: str) -> bool:
+        """
+        Check whether a run (in any process) holds the lease on a task id
+
+        Args:
+            task_id: The task id
+
+        Returns:
+            True if the task is being run
+        """
+        with self.lock:
+            if task_id in self.leases:
+                return True
+
+        try:
+            fd = os.open(self._lock_path(task_id), os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+
+    def _store_blobs(self, value: Any, blob_dir: str, counts: Dict[str, int]) -> Any:
+        """Replace long strings with blob references, writing blobs that do not exist yet"""
+        if isinstance(value, str):
+            if len(value) < self.blob_threshold:
+                return value
+
+            data = value.encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+            path = os.path.join(blob_dir, digest)
+            if os.path.exists(path):
+                counts["blobs_reused"] += 1
+            else:
+                os.makedirs(blob_dir, exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                os.replace(temp_path, path)
+                counts["blobs_written"] += 1
+            return {BLOB_KEY: digest}
+
+        if isinstance(value, dict):
+            return {str(key): self._store_blobs(item, blob_dir, counts) for key, item in value.items()}
+
+        if isinstance(value, (list, tuple)):
+            return [self._store_blobs(item, blob_dir, counts) for item in value]
+
+        return value
+
+    def _load_blobs(self, value: Any, blob_dir: str) -> Any:
+        """Replace blob references with the stored strings"""
+        if isinstance(value, dict):
+            if len(value) == 1 and BLOB_KEY in value:
+                with open(os.path.join(blob_dir, value[BLOB_KEY]), "rb") as f:
+                    return f.read().decode("utf-8")
+            return {key: self._load_blobs(item, blob_dir) for key, item in value.items()}
+
+        if isinstance(value, list):
+            return [self._load_blobs(item, blob_dir) for item in value]
+
+        return value
+
+    def save(self, context: Dict[str, Any], snapshot: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Append a checkpoint of a task after an iteration
+
+        Only the task's own loop writes to its directory, so tasks save
+        their checkpoints concurrently.
+
+        Args:
+            context: The task's context (must contain task_id)
+            snapshot: Optional memory snapshot of the iteration
+
+        Returns:
+            Size of the appended checkpoint line in bytes
+        """
+        task_dir = self._task_dir(context["task_id"])
+        counts = {"blobs_written": 0, "blobs_reused": 0}
+
+        state = {key: value for key, value in context.items() if key not in UNSAVED_KEYS}
+        record = {
+            "task_id": context["task_id"],
+            "task": context.get("task"),
+            "iteration": context.get("iterations", 0),
+            "saved_at": time.time(),
+            "context": self._store_blobs(state, os.path.join(task_dir, "blobs"), counts),
+            "snapshot": snapshot,
+        }
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+        os.makedirs(task_dir, exist_ok=True)
+        log_path = os.path.join(task_dir, LOG_FILENAME)
+        if log_path not in self.checked_logs:
+            line = self._terminate_torn_line(log_path) + line
+            with self.lock:
+                self.checked_logs.add(log_path)
+
+        with open(log_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+        with self.lock:
+            self.counters["saved"] += 1
+            self.counters["bytes"] += len(line)
+            for key, count in counts.items():
+                self.counters[key] += count
+
+        return len(line)
+
+    @staticmethod
+    def _terminate_torn_line(log_path: str) -> bytes:
+        """Get the newline needed to end a line torn by a crash, so the next checkpoint starts on its own line"""
+        try:
+            with open(log_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return b""
+                f.seek(-1, os.SEEK_END)
+                return b"" if f.read(1) == b"\n" else b"\n"
+        except FileNotFoundError:
+            return b""
+
+    def _read_log(self, task_id: str) -> List[Dict[str, Any]]:
+        """Read the complete checkpoints of a task, skipping a line torn by a crash"""
+        path = os.path.join(self._task_dir(task_id), LOG_FILENAME)
+        records = []
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping incomplete checkpoint in {path}")
+        except FileNotFoundError:
+            pass
+        return records
+
+    def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the last checkpoint of a task
+
+        Args:
+            task_id: The task id
+
+        Returns:
+            Dictionary with task_id, task, iteration, saved_at, the restored
+            context and the memory snapshots of all checkpointed iterations,
+            or None if the task has no checkpoint
+        """
+        records = self._read_log(task_id)
+        if not records:
+            return None
+
+        last = records[-1]
+        context = self._load_blobs(last["context"], os.path.join(self._task_dir(task_id), "blobs"))
+        with self.lock:
+            self.counters["loaded"] += 1
+
+        return {
+            "task_id": task_id,
+            "task": last.get("task"),
+            "iteration": last.get("iteration", 0),
+            "saved_at": last.get("saved_at"),
+            "context": context,
+            "snapshots": [record["snapshot"] for record in records if record.get("snapshot")],
+        }
+
+    def delete(self, task_id: str) -> None:
+        """
+        Remove a task's checkpoints
+
+        Args:
+            task_id: The task id
+        """
+        shutil.rmtree(self._task_dir(task_id), ignore_errors=True)
+
+    def owner(self, task_id: str) -> Optional[str]:
+        """
+        Get the owner recorded in a task's last checkpoint
+
+        Args:
+            task_id: The task id
+
+        Returns:
+            The owner ("" for a checkpoint saved without one), or None if
+            the task has no checkpoint
+        """
+        records = self._read_log(task_id)
+        return records[-1]["context"].get(OWNER_KEY) or "" if records else None
+
+    def list_tasks(self, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List the tasks that can be resumed
+
+        Args:
+            owner: Only list the tasks of this owner (None lists every task)
+
+        Returns:
+            One entry per task with task_id, task, iteration, saved_at and
+            whether it is running, most recently saved first
+        """
+        tasks = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return tasks
+
+        for name in names:
+            if not valid_task_id(name):
+                continue
+            records = self._read_log(name)
+            if records and (owner is None or records[-1]["context"].get(OWNER_KEY) == owner):
+                last = records[-1]
+                tasks.append({
+                    "task_id": name,
+                    "task": last.get("task"),
+                    "iteration": last.get("iteration", 0),
+                    "saved_at": last.get("saved_at"),
+                    "running": self.is_running(name),
+                })
+
+        tasks.sort(key=lambda entry: entry["saved_at"] or 0, reverse=True)
+        return tasks
+
+    def prune(self, max_age: Optional[float] = None) -> int:
+        """
+        Remove checkpoints of tasks not saved for a while
+
+        Args:
+            max_age: Seconds since the last checkpoint (defaults to checkpoints.ttl)
+
+        Returns:
+            Number of tasks removed
+        """
+        max_age = max_age if max_age is not None else get_config("checkpoints.ttl")
+        if not max_age:
+            return 0
+
+        removed = 0
+        cutoff = time.time() - max_age
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+
+        for name in names:
+            log_path = os.path.join(self.directory, name, LOG_FILENAME)
+            try:
+                if valid_task_id(name) and os.path.getmtime(log_path) < cutoff and not self.is_running(name):
+                    self.delete(name)
+                    removed += 1
+            except OSError:
+                continue
+
+        # Lock files of tasks that are long gone
+        lock_dir = os.path.join(self.directory, LOCK_DIRNAME)
+        try:
+            lock_names = os.listdir(lock_dir)
+        except FileNotFoundError:
+            lock_names = []
+        for name in lock_names:
+            try:
+                if (valid_task_id(name) and os.path.getmtime(os.path.join(lock_dir, name)) < cutoff
+                        and not os.path.exists(os.path.join(self.directory, name)) and not self.is_running(name)):
+                    os.remove(os.path.join(lock_dir, name))
+            except OSError:
+                continue
+
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get store statistics
+
+        Returns:
+            Dictionary with the directory and counters
+        """
+        with self.lock:
+            return {
+                "path": self.directory,
+                **self.counters,
+            }
+
+
+# Store shared by every AgentLoop in the process
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Get the process-wide checkpoint store, creating it (and pruning old tasks) on first use
+
+    Returns:
+        The shared CheckpointStore
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+            try:
+                removed = _store.prune()
+                if removed:
+                    logger.info(f"Removed checkpoints of {removed} stale tasks")
+            except OSError as e:
+                logger.error(f"Error pruning checkpoints: {e}")
+        return _store
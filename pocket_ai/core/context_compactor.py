@@ -0,0 +1,248 @@
+"""
+Context Compactor - Fits agent context into a token budget for LLM prompts
+
+Observations can contain whole HTML pages, so dumping the context into the
+prompt makes requests slow, expensive and occasionally too large for the
+model. The compactor renders the context section by section, reduces HTML
+to text, shortens long fields and trims the least important sections first
+until the prompt fits the configured budget.
+"""
+
+import html
+import json
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..config import get_config
+
+# Sections in order of importance; unknown keys come after these
+SECTION_PRIORITY = ["task", "parsed_action", "evaluation", "action_results", "observations"]
+
+# Context keys that are never sent to the LLM
+EXCLUDED_KEYS = {"timestamp", "next_action", "context_usage"}
+
+# Large fields that are superseded by a fresh observation of the same thing
+BLOB_KEYS = {"browser_content"}
+
+# Run measurements that differ on every run; sending them would make identical
+# steps look like different requests to the LLM cache and replay cassettes
+MEASUREMENT_KEYS = {"duration", "wall_time", "cpu_time", "peak_rss_kb"}
+
+# Sections are dropped rather than truncated below this many tokens
+MIN_SECTION_TOKENS = 32
+
+_SCRIPT_RE = re.compile(r"<(script|style|noscript|svg)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"[ \t\r\f\v]+")
+_NEWLINES_RE = re.compile(r"\n\s*\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text
+
+    Roughly four ASCII characters per token, one token per non-ASCII
+    character (Japanese text tokenizes much more densely than English).
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        Estimated token count
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def html_to_text(content: str) -> str:
+    """
+    Reduce an HTML document to its visible text
+
+    Args:
+        content: The HTML content
+
+    Returns:
+        Plain text with collapsed whitespace
+    """
+    text = _SCRIPT_RE.sub(" ", content)
+    text = _COMMENT_RE.sub(" ", text)
+    text = _TAG_RE.sub("\n", text)
+    text = html.unescape(text)
+    text = _SPACE_RE.sub(" ", text)
+    text = _NEWLINES_RE.sub("\n", text)
+    return text.strip()
+
+
+def looks_like_html(text: str) -> bool:
+    """Check whether a string looks like an HTML document or fragment"""
+    head = text[:1000].lower()
+    return "<html" in head or "<!doctype" in head or "<body" in head or "<div" in head
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shorten a text to a token budget, keeping its beginning and end
+
+    Args:
+        text: The text to shorten
+        max_tokens: The token budget
+
+    Returns:
+        The text, or its head and tail with an omission marker
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Scale the character budget by this text's own chars-per-token ratio
+    ratio = len(text) / max(estimate_tokens(text), 1)
+    keep = max(int(max_tokens * ratio) - 40, 0)
+    head = text[:keep * 2 // 3]
+    tail = text[len(text) - keep // 3:] if keep // 3 else ""
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n... [{omitted} chars omitted] ...\n{tail}"
+
+
+class ContextCompactor:
+    """
+    Renders an agent context into prompt text within a token budget
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, field_token_limit: Optional[int] = None):
+        """
+        Initialize the compactor
+
+        Args:
+            token_budget: Maximum tokens for the whole rendered context
+            field_token_limit: Maximum tokens for any single field
+        """
+        self.token_budget = token_budget or get_config("llm.context.token_budget")
+        self.field_token_limit = field_token_limit or get_config("llm.context.field_token_limit")
+
+    def render_value(self, value: Any) -> str:
+        """
+        Render a single field as prompt text
+
+        Args:
+            value: The field value
+
+        Returns:
+            Text no longer than the per-field token limit
+        """
+        if isinstance(value, str):
+            text = html_to_text(value) if looks_like_html(value) else value
+        else:
+            try:
+                text = json.dumps(value, ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                text = str(value)
+
+        return truncate_to_tokens(text, self.field_token_limit)
+
+    def render_section(self, value: Any) -> str:
+        """
+        Render a context section, field by field for dictionaries
+
+        Args:
+            value: The section value
+
+        Returns:
+            The section text
+        """
+        if isinstance(value, dict):
+            return "\n".join(f"{key}: {self.render_value(item)}" for key, item in value.items())
+        return self.render_value(value)
+
+    def drop_stale_blobs(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drop large fields from the previous iteration's results
+
+        The previous action's page content is superseded by the current
+        observations, so only keep it when nothing newer was observed.
+
+        Args:
+            context: The agent context
+
+        Returns:
+            A shallow copy of the context without stale blobs
+        """
+        context = dict(context)
+        observations = context.get("observations") or {}
+        results = context.get("action_results")
+
+        if isinstance(results, dict):
+            stale = [key for key in BLOB_KEYS if key in results and key in observations]
+            if stale:
+                context["action_results"] = {key: value for key, value in results.items() if key not in stale}
+
+        return context
+
+    def drop_measurements(self, value: Any) -> Any:
+        """
+        Drop run measurements from a context value, at any depth
+
+        Args:
+            value: The context value
+
+        Returns:
+            The value, copied where measurements were removed
+        """
+        if isinstance(value, dict):
+            return {key: self.drop_measurements(item) for key, item in value.items()
+                    if key not in MEASUREMENT_KEYS}
+        if isinstance(value, list):
+            return [self.drop_measurements(item) for item in value]
+        return value
+
+    def compact(self, context: Dict[str, Any], keys: Optional[List[str]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Render the context into prompt text within the token budget
+
+        Args:
+            context: The agent context
+            keys: Optional list of context keys to include (defaults to all)
+
+        Returns:
+            The rendered text and a usage report with tokens per section
+        """
+        context = self.drop_stale_blobs(context)
+        keys = keys if keys is not None else [key for key in context if key not in EXCLUDED_KEYS]
+
+        def priority(key: str) -> int:
+            return SECTION_PRIORITY.index(key) if key in SECTION_PRIORITY else len(SECTION_PRIORITY)
+
+        ordered = sorted((key for key in keys if context.get(key) not in (None, "", {}, [])), key=priority)
+
+        sections = []
+        for key in ordered:
+            text = self.render_section(self.drop_measurements(context[key]))
+            sections.append([key, text, estimate_tokens(text)])
+
+        usage: Dict[str, Any] = {
+            "budget": self.token_budget,
+            "sections": {key: {"tokens": tokens, "original_tokens": tokens, "truncated": False}
+                         for key, _, tokens in sections},
+        }
+
+        # Trim the least important sections first until the context fits
+        total = sum(tokens for _, _, tokens in sections)
+        for section in reversed(sections):
+            if total <= self.token_budget:
+                break
+
+            key, text, tokens = section
+            allowed = tokens - (total - self.token_budget)
+            if allowed < MIN_SECTION_TOKENS:
+                section[1], section[2] = "", 0
+            else:
+                section[1] = truncate_to_tokens(text, allowed)
+                section[2] = estimate_tokens(section[1])
+
+            total += section[2] - tokens
+            usage["sections"][key]["tokens"] = section[2]
+            usage["sections"][key]["truncated"] = True
+
+        usage["total_tokens"] = total
+        rendered = "\n\n".join(f"## {key}\n{text}" for key, text, _ in sections if text)
+
+        return rendered, usage
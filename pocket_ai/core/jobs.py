@@ -0,0 +1,328 @@
+"""
+Job Manager - Runs agent tasks on a bounded pool of background workers
+
+Jobs are queued and picked up by worker threads so that HTTP handlers can
+return a job id immediately and let clients poll for status and partial
+results instead of holding the connection open for the whole task.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Callable
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Context keys reported while a job is still running
+PARTIAL_RESULT_KEYS = ["iterations", "complete", "parsed_action", "action_results", "evaluation"]
+
+# Context keys included in each agent loop event
+EVENT_KEYS = {
+    "start": ["task"],
+    "observe": [],
+    "judge": ["parsed_action"],
+    "act": ["action_results", "complete"],
+    "evaluate": ["evaluation", "complete"],
+    "end": ["complete", "cancelled"],
+}
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit"""
+    pass
+
+
+class Job:
+    """A single agent task submitted for background execution"""
+
+    def __init__(self, task: str, context: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the job
+
+        Args:
+            task: The task to perform
+            context: Optional initial context for the agent loop
+            options: Optional runner-specific options (e.g. the API key)
+        """
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.context = context if context is not None else {}
+        self.options = options or {}
+        self.status = QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.events: List[Dict[str, Any]] = []
+        self.events_changed = threading.Condition()
+
+    def publish(self, event: str, context: Dict[str, Any]) -> None:
+        """
+        Record an agent loop event (usable as an AgentLoop listener)
+
+        Args:
+            event: The event name
+            context: The current context
+        """
+        data = {key: context.get(key) for key in EVENT_KEYS.get(event, []) if key in context}
+        data["iteration"] = context.get("iterations", 0)
+
+        if event == "observe":
+            # Report which observations were made, not the page contents
+            data["observations"] = sorted(context.get("observations", {}).keys())
+
+        self._append_event(event, data)
+
+    def _append_event(self, event: str, data: Dict[str, Any]) -> None:
+        """Append an event and wake up waiting readers"""
+        with self.events_changed:
+            self.events.append({"id": len(self.events), "event": event, "data": data})
+            self.events_changed.notify_all()
+
+    def finish(self) -> None:
+        """Publish the final job state and wake up waiting readers"""
+        if not self.is_done():
+            self._append_event("done", self.to_dict())
+
+    def wait_for_events(self, start: int, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Wait for events after a given position
+
+        Args:
+            start: Index of the first event to return
+            timeout: Seconds to wait if no new events are available
+
+        Returns:
+            The events from start onwards (empty on timeout)
+        """
+        with self.events_changed:
+            if len(self.events) <= start and not self.is_done():
+                self.events_changed.wait(timeout)
+            return self.events[start:]
+
+    def is_done(self) -> bool:
+        """Check whether the job has finished and published its final event"""
+        return bool(self.events) and self.events[-1]["event"] == "done"
+
+    def is_cancelled(self) -> bool:
+        """Check whether cancellation has been requested"""
+        return self.cancel_event.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get a JSON-serializable view of the job
+
+        Returns:
+            Dictionary with the job status and either the final or partial result
+        """
+        data = {
+            "id": self.id,
+            "task": self.task,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+        if self.status in FINISHED_STATES:
+            data["result"] = self.result
+            data["error"] = self.error
+        elif self.status == RUNNING:
+            # The agent loop updates the context in place as it runs
+            data["partial_result"] = {key: self.context.get(key) for key in PARTIAL_RESULT_KEYS if key in self.context}
+
+        return data
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed number of worker threads with a bounded queue
+    """
+
+    def __init__(self,
+                 runner: Callable[[Job], Dict[str, Any]],
+                 max_workers: Optional[int] = None,
+                 max_queue_depth: Optional[int] = None,
+                 result_ttl: Optional[float] = None):
+        """
+        Initialize the job manager
+
+        Args:
+            runner: Callable that executes a job and returns the final context
+            max_workers: Number of worker threads
+            max_queue_depth: Maximum number of jobs waiting to run
+            result_ttl: Seconds finished jobs are kept before being purged
+        """
+        self.runner = runner
+        self.max_workers = max_workers or get_config("jobs.max_workers")
+        self.max_queue_depth = max_queue_depth or get_config("jobs.max_queue_depth")
+        self.result_ttl = result_ttl if result_ttl is not None else get_config("jobs.result_ttl")
+
+        self.jobs: Dict[str, Job] = {}
+        self.queue: "queue.Queue[Job]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers: List[threading.Thread] = []
+
+    def _start_workers(self) -> None:
+        """Start the worker threads on first use (lock must be held)"""
+        if self.workers:
+            return
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f"pocket-ai-job-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker(self) -> None:
+        """Worker thread main loop"""
+        while True:
+            job = self.queue.get()
+            try:
+                self._run_job(job)
+            finally:
+                self.queue.task_done()
+
+    def _run_job(self, job: Job) -> None:
+        """
+        Run a single job and record its outcome
+
+        Args:
+            job: The job to run
+        """
+        if job.is_cancelled():
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        logger.info(f"Job {job.id} started: {job.task}")
+
+        try:
+            job.result = self.runner(job)
+            job.status = CANCELLED if job.is_cancelled() else COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job.finish()
+
+        logger.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def _purge(self) -> None:
+        """Drop finished jobs older than the result TTL (lock must be held)"""
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def queue_depth(self) -> int:
+        """Get the number of jobs waiting for a worker"""
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def submit(self, task: str, context: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Submit a task for background execution
+
+        Args:
+            task: The task to perform
+            context: Optional initial context
+            options: Optional runner-specific options
+
+        Returns:
+            The queued job
+        """
+        with self.lock:
+            self._purge()
+
+            depth = sum(1 for job in self.jobs.values() if job.status == QUEUED)
+            if depth >= self.max_queue_depth:
+                raise JobQueueFull(f"Job queue is full ({depth} jobs waiting)")
+
+            job = Job(task, context, options)
+            self.jobs[job.id] = job
+            self._start_workers()
+
+        self.queue.put(job)
+        return job
+
+    def active_jobs(self) -> List[Job]:
+        """Get the jobs that are queued or running"""
+        with self.lock:
+            return [job for job in self.jobs.values() if job.status in (QUEUED, RUNNING)]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Get a job by id
+
+        Args:
+            job_id: The job id
+
+        Returns:
+            The job, or None if it does not exist or has been purged
+        """
+        with self.lock:
+            self._purge()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Request cancellation of a job
+
+        Queued jobs are cancelled immediately; running jobs stop before
+        their next agent loop iteration.
+
+        Args:
+            job_id: The job id
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job.finish()
+
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get job statistics
+
+        Returns:
+            Dictionary with worker count, queue depth and jobs per state
+        """
+        with self.lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "queue_depth": counts[QUEUED],
+                "jobs": counts,
+            }
@@ -2,15 +2,48 @@
 LLM Module - Handles interactions with Claude 3.7
 """
 
+import asyncio
 import os
-from typing import Dict, Any, List, Optional
+import json
+import time
+from typing import Dict, Any, List, Optional, Iterator, Callable, Awaitable
 
 import anthropic
-from ..config import get_config, update_config
+from .action_parser import StreamingActionResponse, action_from_message
+from .budgets import charge_tokens
+from .context_compactor import ContextCompactor, estimate_tokens
+from .llm_backends import create_backend
+from .llm_cache import get_llm_cache, make_cache_key
+from .rate_limiter import get_rate_limiter, is_retryable_error, retry_after_seconds, backoff_delay
+from .tracing import trace_span
+from ..config import get_config
 from ..utils.logger import get_logger
+from ..utils.metrics import get_registry
 
 logger = get_logger(__name__)
 
+LLM_SECONDS = get_registry().histogram(
+    "pocket_ai_llm_request_duration_seconds", "Claude request latency including retries", ["call"]
+)
+LLM_TOKENS = get_registry().counter("pocket_ai_llm_tokens_total", "Tokens reported by the API", ["type"])
+LLM_ERRORS = get_registry().counter("pocket_ai_llm_errors_total", "Claude requests that failed after all retries")
+
+class LLMError(Exception):
+    """Raised when an LLM request fails, after any retries"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, attempts: int = 0):
+        """
+        Initialize the error
+        
+        Args:
+            message: The error message
+            status_code: HTTP status code of the last failure, if any
+            attempts: Number of attempts made
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.attempts = attempts
+
 class LLMManager:
     """
     Manages interactions with the LLM (Claude 3.7)
@@ -23,27 +56,48 @@ class LLMManager:
         Args:
             api_key: Optional API key (will use config or environment variable if not provided)
         """
-        # Use provided API key, or get from config, or get from environment
+        # Use provided API key, or get from config, or get from environment. A
+        # provided key is never written back to the config: managers for
+        # different callers' keys live side by side (see AgentCache), and the
+        # default key must not become whichever key was used last.
         self.api_key = api_key or get_config("llm.api_key") or os.environ.get("ANTHROPIC_API_KEY")
         
         if not self.api_key:
-            logger.warning("No API key provided for Claude. LLM functionality will be limited.")
             self.client = None
+            self.async_client = None
         else:
-            # Update config with the API key
-            update_config("llm.api_key", self.api_key)
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+            # Retries are handled by _call_with_retries with the shared rate limiter
+            self.client = anthropic.Anthropic(
+                api_key=self.api_key,
+                base_url=get_config("llm.base_url") or None,
+                timeout=get_config("llm.timeout"),
+                max_retries=0
+            )
+            # Used by the a* methods; bound to the event loop it is first used on
+            self.async_client = anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                base_url=get_config("llm.base_url") or None,
+                timeout=get_config("llm.timeout"),
+                max_retries=0
+            )
             
+        # Live API, record/replay cassette or scripted responses
+        self.backend = create_backend(self.client, self.async_client)
+        if self.backend is None:
+            logger.warning("No API key provided for Claude. LLM functionality will be limited.")
+        
         # Get model configuration
         self.model = "claude-3-sonnet-20240229"  # Use Claude 3 Sonnet as a fallback
         self.temperature = get_config("llm.temperature")
         self.max_tokens = get_config("llm.max_tokens")
+        self.compactor = ContextCompactor()
         
     def generate(self, 
                  messages: List[Dict[str, str]], 
                  system_prompt: Optional[str] = None,
                  temperature: Optional[float] = None,
-                 max_tokens: Optional[int] = None) -> str:
+                 max_tokens: Optional[int] = None,
+                 use_cache: Optional[bool] = None) -> str:
         """
         Generate a response from the LLM
         
@@ -52,29 +106,405 @@ class LLMManager:
             system_prompt: Optional system prompt
             temperature: Optional temperature override
             max_tokens: Optional max tokens override
+            use_cache: Optional override of llm.cache.enabled for this call
             
         Returns:
             Generated text response
+            
+        Raises:
+            LLMError: If no client is available or the request failed after all retries
         """
-        if not self.client:
+        if not self.backend:
             logger.error("Cannot generate response: No Claude API client available")
-            return "Error: Claude API client not available. Please provide a valid API key."
-        
-        try:
-            # Generate response with system parameter for Claude 3.7
-            response = self.client.messages.create(
-                model=self.model,
-                system=system_prompt if system_prompt else "",
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or self.max_tokens
-            )
+            raise LLMError("Claude API client not available. Please provide a valid API key.")
+        
+        request = self._build_request(messages, system_prompt, temperature, max_tokens)
+        
+        cache_key = None
+        if self._should_cache(request["temperature"], use_cache):
+            cache_key = make_cache_key(request)
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Generate response with system parameter for Claude 3.7
+        response = self._send(request)
+        text = response.content[0].text
+        
+        if cache_key is not None:
+            get_llm_cache().set(cache_key, text)
+        
+        return text
+    
+    async def agenerate(self,
+                        messages: List[Dict[str, str]],
+                        system_prompt: Optional[str] = None,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        use_cache: Optional[bool] = None) -> str:
+        """
+        Generate a response from the LLM without blocking the event loop
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            system_prompt: Optional system prompt
+            temperature: Optional temperature override
+            max_tokens: Optional max tokens override
+            use_cache: Optional override of llm.cache.enabled for this call
             
-            return response.content[0].text
+        Returns:
+            Generated text response
             
-        except Exception as e:
-            logger.error(f"Error generating response from Claude: {e}")
-            return f"Error generating response: {str(e)}"
+        Raises:
+            LLMError: If no client is available or the request failed after all retries
+        """
+        if not self.backend:
+            logger.error("Cannot generate response: No Claude API client available")
+            raise LLMError("Claude API client not available. Please provide a valid API key.")
+        
+        request = self._build_request(messages, system_prompt, temperature, max_tokens)
+        
+        cache_key = None
+        if self._should_cache(request["temperature"], use_cache):
+            cache_key = make_cache_key(request)
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = await self._asend(request)
+        text = response.content[0].text
+        
+        if cache_key is not None:
+            get_llm_cache().set(cache_key, text)
+        
+        return text
+    
+    def generate_action(self,
+                        messages: List[Dict[str, str]],
+                        tools: List[Dict[str, Any]],
+                        system_prompt: Optional[str] = None,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        use_cache: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Have the LLM choose an action by calling one of the given tools
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            tools: Messages API tool definitions, one per action
+            system_prompt: Optional system prompt
+            temperature: Optional temperature override
+            max_tokens: Optional max tokens override
+            use_cache: Optional override of llm.cache.enabled for this call
+            
+        Returns:
+            Dictionary with action, parameters and reasoning (action "unknown"
+            if the model neither called a tool nor wrote an action as JSON)
+            
+        Raises:
+            LLMError: If no client is available or the request failed after all retries
+        """
+        if not self.backend:
+            logger.error("Cannot generate response: No Claude API client available")
+            raise LLMError("Claude API client not available. Please provide a valid API key.")
+        
+        request = self._build_request(messages, system_prompt, temperature, max_tokens)
+        request["tools"] = tools
+        request["tool_choice"] = {"type": "any"}
+        
+        cache_key = None
+        if self._should_cache(request["temperature"], use_cache):
+            cache_key = make_cache_key(request)
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+        
+        response = self._send(request)
+        return self._action_from_response(response, cache_key)
+    
+    async def agenerate_action(self,
+                               messages: List[Dict[str, str]],
+                               tools: List[Dict[str, Any]],
+                               system_prompt: Optional[str] = None,
+                               temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None,
+                               use_cache: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Have the LLM choose an action by calling a tool, without blocking the event loop
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            tools: Messages API tool definitions, one per action
+            system_prompt: Optional system prompt
+            temperature: Optional temperature override
+            max_tokens: Optional max tokens override
+            use_cache: Optional override of llm.cache.enabled for this call
+            
+        Returns:
+            Dictionary with action, parameters and reasoning (see generate_action)
+            
+        Raises:
+            LLMError: If no client is available or the request failed after all retries
+        """
+        if not self.backend:
+            logger.error("Cannot generate response: No Claude API client available")
+            raise LLMError("Claude API client not available. Please provide a valid API key.")
+        
+        request = self._build_request(messages, system_prompt, temperature, max_tokens)
+        request["tools"] = tools
+        request["tool_choice"] = {"type": "any"}
+        
+        cache_key = None
+        if self._should_cache(request["temperature"], use_cache):
+            cache_key = make_cache_key(request)
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+        
+        response = await self._asend(request)
+        return self._action_from_response(response, cache_key)
+    
+    def _action_from_response(self, response: Any, cache_key: Optional[str]) -> Dict[str, Any]:
+        """Read the chosen action from a tool-use response and cache it"""
+        action = action_from_message(response.content)
+        
+        if action is None:
+            texts = [block.text for block in response.content if getattr(block, "type", None) == "text"]
+            return {"action": "unknown", "parameters": {}, "reasoning": "\n".join(texts)}
+        
+        if cache_key is not None:
+            get_llm_cache().set(cache_key, json.dumps(action, ensure_ascii=False))
+        
+        return action
+    
+    def generate_stream(self, 
+                        messages: List[Dict[str, str]], 
+                        system_prompt: Optional[str] = None,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        use_cache: Optional[bool] = None) -> Iterator[str]:
+        """
+        Generate a response from the LLM, yielding text as it arrives
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            system_prompt: Optional system prompt
+            temperature: Optional temperature override
+            max_tokens: Optional max tokens override
+            use_cache: Optional override of llm.cache.enabled for this call
+            
+        Yields:
+            Chunks of the generated text response
+            
+        Raises:
+            LLMError: If no client is available, the request failed after all
+                retries, or the stream broke off after it started
+        """
+        if not self.backend:
+            logger.error("Cannot generate response: No Claude API client available")
+            raise LLMError("Claude API client not available. Please provide a valid API key.")
+        
+        request = self._build_request(messages, system_prompt, temperature, max_tokens)
+        
+        cache_key = None
+        if self._should_cache(request["temperature"], use_cache):
+            cache_key = make_cache_key(request)
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        def open_stream():
+            manager = self.backend.stream(request)
+            return manager, manager.__enter__()
+        
+        # Only opening the stream is retried; text already yielded cannot be taken back
+        estimated_tokens = self._estimate_request_tokens(request)
+        started = time.monotonic()
+        with trace_span("llm.stream"):
+            manager, stream = self._call_with_retries(open_stream, estimated_tokens)
+            
+            chunks = []
+            try:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                self._record_usage(estimated_tokens, getattr(stream.get_final_message(), "usage", None))
+                LLM_SECONDS.observe(time.monotonic() - started, "stream")
+            except Exception as e:
+                LLM_ERRORS.inc()
+                logger.error(f"Error streaming response from Claude: {e}")
+                raise LLMError(f"Streaming response failed: {e}", getattr(e, "status_code", None), 1) from e
+            finally:
+                manager.__exit__(None, None, None)
+        
+        if cache_key is not None:
+            get_llm_cache().set(cache_key, "".join(chunks))
+    
+    def _send(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request under the rate limiter and retry policy"""
+        estimated_tokens = self._estimate_request_tokens(request)
+        started = time.monotonic()
+        with trace_span("llm.create"):
+            response = self._call_with_retries(lambda: self.backend.create(request), estimated_tokens)
+        LLM_SECONDS.observe(time.monotonic() - started, "create")
+        self._record_usage(estimated_tokens, getattr(response, "usage", None))
+        return response
+    
+    async def _asend(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request from a coroutine under the rate limiter and retry policy"""
+        estimated_tokens = self._estimate_request_tokens(request)
+        started = time.monotonic()
+        with trace_span("llm.create"):
+            response = await self._acall_with_retries(lambda: self.backend.acreate(request), estimated_tokens)
+        LLM_SECONDS.observe(time.monotonic() - started, "create")
+        self._record_usage(estimated_tokens, getattr(response, "usage", None))
+        return response
+    
+    def _estimate_request_tokens(self, request: Dict[str, Any]) -> int:
+        """Estimate the tokens a request may use (prompt plus the output limit)"""
+        prompt = request["system"] + json.dumps(request["messages"], ensure_ascii=False)
+        if request.get("tools"):
+            prompt += json.dumps(request["tools"], ensure_ascii=False)
+        return estimate_tokens(prompt) + request["max_tokens"]
+    
+    def _record_usage(self, estimated_tokens: int, usage: Any) -> None:
+        """Correct the shared rate limiter with the usage the API reported and charge it to the current task"""
+        if usage is not None:
+            input_tokens = getattr(usage, "input_tokens", 0) or 0
+            output_tokens = getattr(usage, "output_tokens", 0) or 0
+            LLM_TOKENS.inc("input", amount=input_tokens)
+            LLM_TOKENS.inc("output", amount=output_tokens)
+            get_rate_limiter().record_usage(estimated_tokens, input_tokens + output_tokens)
+            charge_tokens(input_tokens + output_tokens)
+    
+    def _call_with_retries(self, call: Callable[[], Any], estimated_tokens: int) -> Any:
+        """
+        Make an API call under the shared rate limiter, retrying transient errors
+        
+        Rate limits (429), overload (529), server errors and timeouts are
+        retried with jittered exponential backoff, honouring retry-after.
+        
+        Args:
+            call: The API call to make
+            estimated_tokens: Estimated tokens the call will use
+            
+        Returns:
+            The result of the call
+            
+        Raises:
+            LLMError: If the call failed with a non-retryable error or after
+                llm.retry.max_retries retries
+        """
+        limiter = get_rate_limiter()
+        attempt = 0
+        
+        while True:
+            limiter.acquire(estimated_tokens)
+            try:
+                return call()
+            except Exception as e:
+                attempt += 1
+                time.sleep(self._retry_delay(e, attempt, estimated_tokens))
+    
+    async def _acall_with_retries(self, call: Callable[[], Awaitable[Any]], estimated_tokens: int) -> Any:
+        """
+        Make an API call from a coroutine under the shared rate limiter, retrying transient errors
+        
+        Waiting for the limiter and backing off sleep on the event loop
+        instead of blocking a thread (see _call_with_retries).
+        
+        Args:
+            call: Function returning the awaitable API call
+            estimated_tokens: Estimated tokens the call will use
+            
+        Returns:
+            The result of the call
+            
+        Raises:
+            LLMError: If the call failed with a non-retryable error or after
+                llm.retry.max_retries retries
+        """
+        limiter = get_rate_limiter()
+        attempt = 0
+        
+        while True:
+            await limiter.acquire_async(estimated_tokens)
+            try:
+                return await call()
+            except asyncio.CancelledError:
+                limiter.record_usage(estimated_tokens, 0)
+                raise
+            except Exception as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, estimated_tokens))
+    
+    def _retry_delay(self, error: Exception, attempt: int, estimated_tokens: int) -> float:
+        """
+        Handle a failed attempt: count it and pick the backoff, or give up
+        
+        Args:
+            error: The exception raised by the call
+            attempt: Number of the retry that would follow (1 for the first)
+            estimated_tokens: Tokens reserved for the failed attempt
+            
+        Returns:
+            Seconds to wait before the retry
+            
+        Raises:
+            LLMError: If the error is not retryable or the retries are used up
+        """
+        limiter = get_rate_limiter()
+        max_retries = get_config("llm.retry.max_retries")
+        
+        # A failed request did not consume its token reservation
+        limiter.record_usage(estimated_tokens, 0)
+        status_code = getattr(error, "status_code", None)
+        
+        if not is_retryable_error(error) or attempt > max_retries:
+            limiter.record_failure()
+            LLM_ERRORS.inc()
+            logger.error(f"Error generating response from Claude after {attempt} attempts: {error}")
+            raise LLMError(f"Error generating response: {error}", status_code, attempt) from error
+        
+        limiter.record_retry()
+        delay = backoff_delay(attempt, retry_after_seconds(error))
+        logger.warning(f"Claude request failed ({status_code or type(error).__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+        return delay
+    
+    def _build_request(self,
+                       messages: List[Dict[str, str]],
+                       system_prompt: Optional[str],
+                       temperature: Optional[float],
+                       max_tokens: Optional[int]) -> Dict[str, Any]:
+        """Build the Messages API request parameters"""
+        return {
+            "model": self.model,
+            "system": system_prompt if system_prompt else "",
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+    
+    def _should_cache(self, temperature: float, use_cache: Optional[bool]) -> bool:
+        """
+        Decide whether a request may be served from the response cache
+        
+        Sampled (temperature > 0) responses are only cached when
+        llm.cache.cache_nonzero_temperature is set.
+        
+        Args:
+            temperature: The request temperature
+            use_cache: Per-call override of llm.cache.enabled
+            
+        Returns:
+            True if the cache should be used
+        """
+        enabled = use_cache if use_cache is not None else get_config("llm.cache.enabled")
+        if not enabled:
+            return False
+        
+        return temperature == 0 or bool(get_config("llm.cache.cache_nonzero_temperature"))
     
     def generate_with_context(self, 
                              prompt: str, 
@@ -91,30 +521,48 @@ class LLMManager:
         Returns:
             Generated text response
         """
+        # Fit the context into the prompt token budget
+        context_text, usage = self.compactor.compact(context)
+        logger.debug(f"Context tokens: {usage['total_tokens']}/{usage['budget']}")
+        
         # Create a message with the prompt and relevant context
         messages = [
             {
                 "role": "user",
-                "content": f"{prompt}\n\nContext: {str(context)}"
+                "content": f"{prompt}\n\nContext:\n{context_text}"
             }
         ]
         
         return self.generate(messages, system_prompt=system_prompt)
     
-    def get_next_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_action_prompt(self, context: Dict[str, Any], use_tools: bool = False) -> Dict[str, Any]:
         """
-        Determine the next action based on the current context
+        Build the messages and system prompt for choosing the next action
         
         Args:
             context: The current context
+            use_tools: Whether the action is chosen with a tool call instead of JSON text
             
         Returns:
-            Updated context with next action
+            Dictionary with "messages" and "system_prompt"
         """
         task = context.get("task", "")
-        observations = context.get("observations", {})
         
-        system_prompt = f"""
+        # Render the previous step and current observations within the token budget
+        observations, usage = self.compactor.compact(
+            context, keys=["parsed_action", "evaluation", "action_results", "observations"]
+        )
+        context["context_usage"] = usage
+        logger.debug(f"Context tokens: {usage['total_tokens']}/{usage['budget']}")
+        
+        if use_tools:
+            system_prompt = f"""
+        You are {get_config('agent.name')}, {get_config('agent.description')}.
+        Your task is to determine the next action to take based on the current context.
+        Call exactly one of the provided tools to take that action.
+        """
+        else:
+            system_prompt = f"""
         You are {get_config('agent.name')}, {get_config('agent.description')}.
         Your task is to determine the next action to take based on the current context.
         You should return a JSON object with the following structure:
@@ -126,6 +574,7 @@ class LLMManager:
             }},
             "reasoning": "Your reasoning for choosing this action"
         }}
+        Always write the fields in this order, with "reasoning" last.
         """
         
         user_message = f"""
@@ -145,11 +594,73 @@ class LLMManager:
             }
         ]
         
-        response = self.generate(messages, system_prompt=system_prompt)
+        return {"messages": messages, "system_prompt": system_prompt}
+    
+    def get_next_action(self, context: Dict[str, Any], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Determine the next action based on the current context
+        
+        Args:
+            context: The current context
+            tools: Optional tool definitions; when given, the action is chosen
+                with a tool call and stored in context["parsed_action"]
+            
+        Returns:
+            Updated context with next action
+        """
+        if tools:
+            prompt = self._build_action_prompt(context, use_tools=True)
+            action = self.generate_action(prompt["messages"], tools, system_prompt=prompt["system_prompt"])
+            context["next_action"] = json.dumps(action, ensure_ascii=False)
+            context["parsed_action"] = action
+            return context
+        
+        prompt = self._build_action_prompt(context)
+        response = self.generate(prompt["messages"], system_prompt=prompt["system_prompt"])
         
         # Extract the action from the response
         # In a real implementation, you would parse the JSON response
         # For simplicity, we'll just add the raw response to the context
         context["next_action"] = response
         
-        return context
\ No newline at end of file
+        return context
+    
+    async def aget_next_action(self, context: Dict[str, Any],
+                               tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Determine the next action without blocking the event loop
+        
+        Args:
+            context: The current context
+            tools: Optional tool definitions (see get_next_action)
+            
+        Returns:
+            Updated context with next action
+        """
+        if tools:
+            prompt = self._build_action_prompt(context, use_tools=True)
+            action = await self.agenerate_action(prompt["messages"], tools, system_prompt=prompt["system_prompt"])
+            context["next_action"] = json.dumps(action, ensure_ascii=False)
+            context["parsed_action"] = action
+            return context
+        
+        prompt = self._build_action_prompt(context)
+        context["next_action"] = await self.agenerate(prompt["messages"], system_prompt=prompt["system_prompt"])
+        
+        return context
+    
+    def stream_next_action(self, context: Dict[str, Any]) -> StreamingActionResponse:
+        """
+        Start streaming the next action for the current context
+        
+        Args:
+            context: The current context
+            
+        Returns:
+            A streaming response; call wait_for_action() to get the action
+            as soon as its name and parameters have arrived
+        """
+        prompt = self._build_action_prompt(context)
+        return StreamingActionResponse(
+            self.generate_stream(prompt["messages"], system_prompt=prompt["system_prompt"])
+        )
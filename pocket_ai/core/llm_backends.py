@@ -0,0 +1,394 @@
+"""
+LLM Backends - Pluggable transports behind LLMManager
+
+The live backend talks to the Anthropic API. The record backend does the
+same and appends every request/response pair to a cassette file, which the
+replay backend serves back by request hash with synthetic latency. The
+scripted backend returns canned responses. Replay and scripted backends
+need no network or API key, so the agent loop and server can be
+benchmarked offline and deterministically.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+import anthropic
+
+from .llm_cache import make_cache_key
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Characters per streamed chunk when replaying a response as a stream
+STREAM_CHUNK_SIZE = 16
+
+
+def message_from_dict(data: Dict[str, Any]) -> Any:
+    """
+    Build an SDK Message object from its dictionary form
+
+    Args:
+        data: The message as returned by model_dump()
+
+    Returns:
+        An anthropic.types.Message
+    """
+    return anthropic.types.Message.construct(**data)
+
+
+def message_text(message: Any) -> str:
+    """Concatenate the text blocks of a message"""
+    return "".join(block.text for block in message.content if getattr(block, "type", None) == "text")
+
+
+class _ReplayedStream:
+    """Mimics the SDK's MessageStream for a message that is already known"""
+
+    def __init__(self, message: Any, delay: float):
+        """
+        Initialize the stream
+
+        Args:
+            message: The full message to stream
+            delay: Total seconds to spread over the streamed chunks
+        """
+        self.message = message
+        self.delay = delay
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        """Yield the message text in chunks"""
+        text = message_text(self.message)
+        chunks = [text[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(text), STREAM_CHUNK_SIZE)] or [""]
+        for chunk in chunks:
+            if self.delay:
+                time.sleep(self.delay / len(chunks))
+            yield chunk
+
+    def get_final_message(self) -> Any:
+        """Get the full message"""
+        return self.message
+
+
+class LLMBackend(ABC):
+    """Base class for LLM backends"""
+
+    name = "base"
+
+    @abstractmethod
+    def create(self, request: Dict[str, Any]) -> Any:
+        """
+        Send a Messages API request
+
+        Args:
+            request: The request parameters
+
+        Returns:
+            The response message
+        """
+        pass
+
+    @contextmanager
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        """
+        Send a streaming Messages API request
+
+        The default implementation streams the result of create().
+
+        Args:
+            request: The request parameters
+
+        Yields:
+            A stream with text_stream and get_final_message()
+        """
+        yield _ReplayedStream(self.create(request), 0)
+
+    async def acreate(self, request: Dict[str, Any]) -> Any:
+        """
+        Send a Messages API request from a coroutine
+
+        The default implementation runs create() on a worker thread.
+
+        Args:
+            request: The request parameters
+
+        Returns:
+            The response message
+        """
+        return await asyncio.to_thread(self.create, request)
+
+
+class AnthropicBackend(LLMBackend):
+    """Sends requests to the Anthropic API"""
+
+    name = "live"
+
+    def __init__(self, client: Any, async_client: Any = None):
+        """
+        Initialize the backend
+
+        Args:
+            client: The anthropic.Anthropic client
+            async_client: Optional anthropic.AsyncAnthropic client used by acreate()
+        """
+        self.client = client
+        self.async_client = async_client
+
+    def create(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request"""
+        return self.client.messages.create(**request)
+
+    async def acreate(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request without blocking the event loop"""
+        if self.async_client is None:
+            return await super().acreate(request)
+        return await self.async_client.messages.create(**request)
+
+    @contextmanager
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        """Send a streaming Messages API request"""
+        with self.client.messages.stream(**request) as stream:
+            yield stream
+
+
+class RecordingBackend(LLMBackend):
+    """Sends requests to the Anthropic API and records them to a cassette"""
+
+    name = "record"
+
+    def __init__(self, client: Any, cassette: str, async_client: Any = None):
+        """
+        Initialize the backend
+
+        Args:
+            client: The anthropic.Anthropic client
+            cassette: Path of the JSON-lines cassette file to append to
+            async_client: Optional anthropic.AsyncAnthropic client used by acreate()
+        """
+        self.live = AnthropicBackend(client, async_client)
+        self.cassette = cassette
+        self.lock = threading.Lock()
+
+    def _record(self, request: Dict[str, Any], message: Any, elapsed: float) -> None:
+        """Append a request/response pair to the cassette"""
+        entry = {
+            "key": make_cache_key(request),
+            "request": request,
+            "response": message.model_dump(mode="json"),
+            "elapsed": elapsed,
+        }
+        with self.lock:
+            with open(self.cassette, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def create(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request and record it"""
+        started_at = time.time()
+        message = self.live.create(request)
+        self._record(request, message, time.time() - started_at)
+        return message
+
+    async def acreate(self, request: Dict[str, Any]) -> Any:
+        """Send a Messages API request from a coroutine and record it"""
+        started_at = time.time()
+        message = await self.live.acreate(request)
+        self._record(request, message, time.time() - started_at)
+        return message
+
+    @contextmanager
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        """Send a streaming Messages API request and record the final message"""
+        started_at = time.time()
+        with self.live.stream(request) as stream:
+            yield stream
+            self._record(request, stream.get_final_message(), time.time() - started_at)
+
+
+class ReplayBackend(LLMBackend):
+    """Serves recorded responses by request hash"""
+
+    name = "replay"
+
+    def __init__(self, cassette: str, latency: Any = "recorded"):
+        """
+        Initialize the backend
+
+        Args:
+            cassette: Path of the JSON-lines cassette file to replay
+            latency: Seconds to wait per response, or "recorded" to reproduce
+                the latency measured while recording
+        """
+        self.latency = latency
+        self.responses: Dict[str, List[Dict[str, Any]]] = {}
+        self.positions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        with open(cassette, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses.setdefault(entry["key"], []).append(entry)
+
+        logger.info(f"Loaded {sum(len(v) for v in self.responses.values())} recorded responses from {cassette}")
+
+    def _next_entry(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the next recorded entry for a request (repeats the last one when exhausted)"""
+        key = make_cache_key(request)
+        entries = self.responses.get(key)
+        if not entries:
+            raise LookupError(f"No recorded response for request {key[:12]}")
+
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+
+        return entries[min(position, len(entries) - 1)]
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        """Get the synthetic latency for an entry"""
+        if self.latency == "recorded":
+            return float(entry.get("elapsed", 0))
+        return float(self.latency or 0)
+
+    def create(self, request: Dict[str, Any]) -> Any:
+        """Replay the recorded response to a request"""
+        entry = self._next_entry(request)
+        time.sleep(self._delay(entry))
+        return message_from_dict(entry["response"])
+
+    async def acreate(self, request: Dict[str, Any]) -> Any:
+        """Replay the recorded response to a request without blocking the event loop"""
+        entry = self._next_entry(request)
+        await asyncio.sleep(self._delay(entry))
+        return message_from_dict(entry["response"])
+
+    @contextmanager
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        """Replay the recorded response to a request as a stream"""
+        entry = self._next_entry(request)
+        yield _ReplayedStream(message_from_dict(entry["response"]), self._delay(entry))
+
+
+class ScriptedBackend(LLMBackend):
+    """
+    Returns scripted responses in order, ignoring the request
+
+    Script items are either plain response text, an action
+    ({"action": ..., "parameters": ...}) or a full message dictionary.
+    Actions are returned as a tool call when the request offers tools and
+    as JSON text otherwise. The last item repeats once the script runs out.
+    """
+
+    name = "fake"
+
+    def __init__(self, script: Optional[List[Any]] = None, latency: float = 0.0):
+        """
+        Initialize the backend
+
+        Args:
+            script: The responses to return (defaults to a single complete action)
+            latency: Seconds to wait per response
+        """
+        self.script = script or [{"action": "complete", "parameters": {"summary": "Done (scripted response)"}}]
+        self.latency = latency
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def _build_message(self, item: Any, request: Dict[str, Any]) -> Any:
+        """Turn a script item into a message for the given request"""
+        if isinstance(item, dict) and item.get("type") == "message":
+            return message_from_dict(item)
+
+        if isinstance(item, dict) and "action" in item:
+            parameters = dict(item.get("parameters") or {})
+            if request.get("tools"):
+                if item.get("reasoning"):
+                    parameters["reasoning"] = item["reasoning"]
+                content = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:16]}",
+                            "name": item["action"], "input": parameters}]
+            else:
+                text = json.dumps({"action": item["action"], "parameters": parameters,
+                                   "reasoning": item.get("reasoning", "")}, ensure_ascii=False)
+                content = [{"type": "text", "text": text}]
+        else:
+            content = [{"type": "text", "text": str(item)}]
+
+        output_tokens = sum(len(json.dumps(block, ensure_ascii=False)) for block in content) // 4
+        return message_from_dict({
+            "id": f"msg_{uuid.uuid4().hex[:16]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", ""),
+            "content": content,
+            "stop_reason": "tool_use" if content[0]["type"] == "tool_use" else "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 0, "output_tokens": output_tokens},
+        })
+
+    def _next_item(self) -> Any:
+        """Take the next script item"""
+        with self.lock:
+            item = self.script[min(self.position, len(self.script) - 1)]
+            self.position += 1
+        return item
+
+    def create(self, request: Dict[str, Any]) -> Any:
+        """Return the next scripted response"""
+        item = self._next_item()
+        time.sleep(self.latency)
+        return self._build_message(item, request)
+
+    async def acreate(self, request: Dict[str, Any]) -> Any:
+        """Return the next scripted response without blocking the event loop"""
+        item = self._next_item()
+        await asyncio.sleep(self.latency)
+        return self._build_message(item, request)
+
+
+def create_backend(client: Any = None, async_client: Any = None) -> Optional[LLMBackend]:
+    """
+    Create the LLM backend selected by llm.backend.mode
+
+    Args:
+        client: The anthropic.Anthropic client (needed for "live" and "record")
+        async_client: Optional anthropic.AsyncAnthropic client used by acreate()
+
+    Returns:
+        The backend, or None if the selected mode needs a client and there is none
+    """
+    mode = get_config("llm.backend.mode") or "live"
+    cassette = get_config("llm.backend.cassette")
+    latency = get_config("llm.backend.latency")
+
+    if mode == "replay":
+        return ReplayBackend(cassette, latency if latency is not None else "recorded")
+
+    if mode == "fake":
+        script = None
+        script_path = get_config("llm.backend.script")
+        if script_path:
+            with open(script_path, encoding="utf-8") as f:
+                script = json.load(f)
+        return ScriptedBackend(script, float(latency or 0) if latency != "recorded" else 0.0)
+
+    if client is None:
+        return None
+
+    if mode == "record":
+        directory = os.path.dirname(cassette)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return RecordingBackend(client, cassette, async_client)
+
+    if mode != "live":
+        raise ValueError(f"Unsupported LLM backend: {mode}")
+
+    return AnthropicBackend(client, async_client)
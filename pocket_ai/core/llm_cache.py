@@ -0,0 +1,220 @@
+"""
+LLM Response Cache - Reuses responses for identical LLM requests
+
+Responses are keyed by a canonical hash of the request payload and kept in
+an in-memory LRU backed by a local SQLite file, so identical requests from
+retries, demo tasks and regression runs skip the round trip to Claude.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def make_cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Build a canonical hash of an LLM request
+
+    Args:
+        payload: The request parameters (model, system, messages, temperature, max_tokens)
+
+    Returns:
+        Hex digest identifying the request
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    An in-memory LRU of LLM responses with optional SQLite persistence
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 max_entries: Optional[int] = None,
+                 max_disk_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        Initialize the cache
+
+        Args:
+            path: SQLite file for persistence (empty string for memory only)
+            max_entries: Maximum number of responses kept in memory
+            max_disk_entries: Maximum number of responses kept on disk
+            ttl: Seconds a response stays valid (0 for no expiry)
+        """
+        self.path = path if path is not None else get_config("llm.cache.path")
+        self.max_entries = max_entries or get_config("llm.cache.max_entries")
+        self.max_disk_entries = max_disk_entries or get_config("llm.cache.max_disk_entries")
+        self.ttl = ttl if ttl is not None else get_config("llm.cache.ttl")
+
+        # Cache key -> (creation time, response text), least recently used first
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+        }
+
+        self.db = None
+        if self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self.db = sqlite3.connect(self.path, check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT NOT NULL)"
+                )
+                self.db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+                self.db.commit()
+            except Exception as e:
+                logger.error(f"Error opening LLM cache at {self.path}, using memory only: {e}")
+                self.db = None
+
+    def _expired(self, created_at: float) -> bool:
+        """Check whether an entry created at the given time has expired"""
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        """Store an entry in the in-memory LRU (lock must be held)"""
+        self.memory[key] = (created_at, response)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            key: The request hash
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self.memory.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return entry[1]
+                del self.memory[key]
+                self.counters["expired"] += 1
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT created_at, response FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    logger.error(f"Error reading LLM cache: {e}")
+                    row = None
+
+                if row is not None:
+                    if not self._expired(row[0]):
+                        self._remember(key, row[0], row[1])
+                        self.counters["hits"] += 1
+                        self.counters["disk_hits"] += 1
+                        return row[1]
+                    self.counters["expired"] += 1
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Store a response
+
+        Args:
+            key: The request hash
+            response: The response text
+        """
+        created_at = time.time()
+
+        with self.lock:
+            self._remember(key, created_at, response)
+            self.counters["stores"] += 1
+
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO responses (key, created_at, response) VALUES (?, ?, ?)",
+                        (key, created_at, response)
+                    )
+                    # Trimming scans the table, so only do it every so often
+                    if self.counters["stores"] % 100 == 1:
+                        self._trim_disk(created_at)
+                    self.db.commit()
+                except Exception as e:
+                    logger.error(f"Error writing LLM cache: {e}")
+
+    def _trim_disk(self, now: float) -> None:
+        """Delete expired rows and keep the newest max_disk_entries (lock must be held)"""
+        if self.ttl:
+            self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self.db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def clear(self) -> None:
+        """Remove all cached responses"""
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with cache size and hit/miss counters
+        """
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "entries": len(self.memory),
+                "max_entries": self.max_entries,
+                "persistent": self.db is not None,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+                **self.counters,
+            }
+
+
+# Shared cache used by every LLMManager in the process
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Get the process-wide LLM response cache, creating it on first use
+
+    Returns:
+        The shared LLMResponseCache
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
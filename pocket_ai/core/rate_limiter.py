@@ -0,0 +1,313 @@
+"""
+Rate Limiter - Client-side throttling and retry policy for Anthropic calls
+
+All LLMManagers in the process share one limiter, so concurrent agents stay
+under the account's requests-per-minute and tokens-per-minute limits instead
+of all running into 429s at once. Calls that still fail with a retryable
+error are retried with jittered exponential backoff.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import anthropic
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP status codes worth retrying (rate limited, overloaded, server errors)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at a per-minute rate
+    """
+
+    def __init__(self, per_minute: float):
+        """
+        Initialize the bucket
+
+        Args:
+            per_minute: Bucket capacity and refill rate per minute (0 disables the limit)
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Condition()
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update (lock must be held)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, blocking until enough are available
+
+        Args:
+            amount: Number of tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.capacity <= 0:
+            return 0.0
+
+        amount = min(amount, self.capacity)
+        started_at = time.monotonic()
+
+        with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return time.monotonic() - started_at
+
+                self.lock.wait((amount - self.tokens) / self.rate)
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """
+        Take tokens from the bucket if enough are available, without blocking
+
+        Args:
+            amount: Number of tokens to take (capped at the bucket capacity)
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until they
+            should be available
+        """
+        if self.capacity <= 0:
+            return 0.0
+
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    async def acquire_async(self, amount: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, sleeping on the event loop until enough are available
+
+        Args:
+            amount: Number of tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Seconds spent waiting
+        """
+        started_at = time.monotonic()
+        while True:
+            delay = self.try_acquire(amount)
+            if delay <= 0:
+                return time.monotonic() - started_at
+            await asyncio.sleep(delay)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Correct the bucket after the real cost of a call is known
+
+        Args:
+            amount: Tokens to give back (positive) or take additionally (negative)
+        """
+        if self.capacity <= 0:
+            return
+
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self.lock.notify_all()
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for LLM calls
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        Initialize the rate limiter
+
+        Args:
+            requests_per_minute: Maximum requests per minute (0 for unlimited)
+            tokens_per_minute: Maximum tokens per minute (0 for unlimited)
+        """
+        if requests_per_minute is None:
+            requests_per_minute = get_config("llm.rate_limit.requests_per_minute")
+        if tokens_per_minute is None:
+            tokens_per_minute = get_config("llm.rate_limit.tokens_per_minute")
+
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+        self.counters = {
+            "acquired": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+            "retries": 0,
+            "failures": 0,
+        }
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """
+        Wait until a request of the given size may be sent
+
+        Args:
+            estimated_tokens: Estimated tokens the request will use
+        """
+        waited = self.requests.acquire(1)
+        waited += self.tokens.acquire(estimated_tokens)
+        self._count_acquire(waited)
+
+    async def acquire_async(self, estimated_tokens: int) -> None:
+        """
+        Wait on the event loop until a request of the given size may be sent
+
+        Args:
+            estimated_tokens: Estimated tokens the request will use
+        """
+        waited = await self.requests.acquire_async(1)
+        waited += await self.tokens.acquire_async(estimated_tokens)
+        self._count_acquire(waited)
+
+    def _count_acquire(self, waited: float) -> None:
+        """Count an acquired request and any time spent throttled"""
+        with self.lock:
+            self.counters["acquired"] += 1
+            if waited > 0.001:
+                self.counters["throttled"] += 1
+                self.counters["wait_seconds"] += waited
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Correct the token bucket with the usage the API reported
+
+        Args:
+            estimated_tokens: Tokens taken when the request was sent
+            actual_tokens: Tokens the request actually used
+        """
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def record_retry(self) -> None:
+        """Count a retried call"""
+        with self.lock:
+            self.counters["retries"] += 1
+
+    def record_failure(self) -> None:
+        """Count a call that failed after all retries"""
+        with self.lock:
+            self.counters["failures"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get limiter statistics
+
+        Returns:
+            Dictionary with configured limits and counters
+        """
+        with self.lock:
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                **self.counters,
+            }
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether an Anthropic SDK error is worth retrying
+
+    Args:
+        error: The exception raised by the SDK
+
+    Returns:
+        True for rate limits, overload, timeouts, connection and server errors
+    """
+    if isinstance(error, (anthropic.APITimeoutError, anthropic.APIConnectionError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Read the server's requested delay from a retry-after header
+
+    Args:
+        error: The exception raised by the SDK
+
+    Returns:
+        Seconds to wait, or None if the server did not say
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Compute the delay before the next retry
+
+    Args:
+        attempt: Number of the retry (1 for the first retry)
+        retry_after: Optional delay requested by the server
+
+    Returns:
+        Seconds to wait: full-jitter exponential backoff capped at
+        llm.retry.max_delay, but never less than the server asked for (a
+        longer retry-after is honoured as is)
+    """
+    base = get_config("llm.retry.base_delay")
+    cap = get_config("llm.retry.max_delay")
+    delay = random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    return delay
+
+
+# Shared limiter used by every LLMManager in the process
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Get the process-wide rate limiter, creating it on first use
+
+    Returns:
+        The shared RateLimiter
+    """
+    global _limiter
+
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,326 @@
+"""
+Tracing - Timing spans for the agent loop
+
+Every phase of every iteration, and every observer, judge, actor and
+evaluator called in it, is timed as a span. Finished spans go to pluggable
+sinks: an in-memory aggregate and, when tracing.path is set, a JSON-lines
+trace file.
+
+The agent loop makes a task's tracer the current tracer of the task's
+thread (or asyncio task) through a context variable, as it does with the
+task's budget. Components time their own work as spans of the current
+tracer with trace_span or the traced decorator: LLM requests, browser
+operations and sandboxed snippets show up in the trace of the task that
+made them.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "pocket_ai_tracer", default=None
+)
+
+
+class TraceSink(ABC):
+    """Receives finished spans"""
+
+    @abstractmethod
+    def record(self, span: Dict[str, Any]) -> None:
+        """
+        Record a finished span
+
+        Args:
+            span: Dictionary with task_id, iteration, phase, name, kind,
+                start, duration and error
+        """
+        pass
+
+
+class JsonlTraceSink(TraceSink):
+    """Appends spans to a JSON-lines file"""
+
+    def __init__(self, path: str):
+        """
+        Initialize the sink
+
+        Args:
+            path: The trace file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def record(self, span: Dict[str, Any]) -> None:
+        """Append a span to the trace file"""
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            try:
+                if self.file is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self.file = open(self.path, "a", encoding="utf-8")
+                self.file.write(line)
+                self.file.flush()
+            except OSError as e:
+                logger.error(f"Error writing trace to {self.path}: {e}")
+
+    def close(self) -> None:
+        """Close the trace file"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class TraceAggregate(TraceSink):
+    """Keeps running count, total, min and max durations per phase, kind and name"""
+
+    def __init__(self):
+        """Initialize the aggregate"""
+        self.lock = threading.Lock()
+        self.entries: Dict[tuple, Dict[str, Any]] = {}
+
+    def record(self, span: Dict[str, Any]) -> None:
+        """Add a span to the aggregate"""
+        key = (span["phase"] or "", span["kind"], span["name"])
+        duration = span["duration"]
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {"count": 0, "total": 0.0, "min": duration, "max": duration, "errors": 0}
+            entry["count"] += 1
+            entry["total"] += duration
+            entry["min"] = min(entry["min"], duration)
+            entry["max"] = max(entry["max"], duration)
+            if span["error"]:
+                entry["errors"] += 1
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Get the aggregate
+
+        Returns:
+            One entry per phase, kind and name with count, total, mean, min,
+            max and errors
+        """
+        with self.lock:
+            return [
+                {"phase": phase, "kind": kind, "name": name, **entry, "mean": entry["total"] / entry["count"]}
+                for (phase, kind, name), entry in sorted(self.entries.items())
+            ]
+
+    def reset(self) -> None:
+        """Forget all recorded spans"""
+        with self.lock:
+            self.entries.clear()
+
+
+class Tracer:
+    """
+    Times spans for one task and sends them to the sinks
+
+    The loop sets the current iteration and phase; spans opened while they
+    are set are attributed to them.
+    """
+
+    def __init__(self, task_id: Optional[str] = None, sinks: Optional[List[TraceSink]] = None):
+        """
+        Initialize the tracer
+
+        Args:
+            task_id: Identifier of the task (a new one is generated if omitted)
+            sinks: Sinks that receive finished spans
+        """
+        self.task_id = task_id or uuid.uuid4().hex
+        self.sinks = sinks if sinks is not None else []
+        self.iteration = 0
+        self.phase: Optional[str] = None
+        self.lock = threading.Lock()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.callables: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def span(self, name: str, kind: str = "span") -> Iterator[None]:
+        """
+        Time the enclosed block
+
+        Args:
+            name: Name of the span
+            kind: "phase", "callable" or "span"
+        """
+        # Attribute the span to where it started, even if it finishes on
+        # another thread after the loop has moved on
+        iteration, phase = self.iteration, self.phase
+        start = time.time()
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self._finish({
+                "task_id": self.task_id,
+                "iteration": iteration,
+                "phase": phase,
+                "name": name,
+                "kind": kind,
+                "start": start,
+                "duration": time.perf_counter() - started,
+                "error": error,
+            })
+
+    def _finish(self, span: Dict[str, Any]) -> None:
+        """Update the task summary and pass a span to the sinks"""
+        if span["kind"] in ("phase", "callable"):
+            totals = self.phases if span["kind"] == "phase" else self.callables
+            with self.lock:
+                entry = totals.setdefault(span["name"], {"count": 0, "total": 0.0, "max": 0.0})
+                entry["count"] += 1
+                entry["total"] += span["duration"]
+                entry["max"] = max(entry["max"], span["duration"])
+
+        for sink in self.sinks:
+            try:
+                sink.record(span)
+            except Exception as e:
+                logger.error(f"Trace sink error: {e}")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Get the timing summary of the task
+
+        Returns:
+            Dictionary with task_id, total (seconds spent in phases), phases
+            and callables, each mapping a name to its count, total and max
+        """
+        with self.lock:
+            return {
+                "task_id": self.task_id,
+                "total": round(sum(entry["total"] for entry in self.phases.values()), 4),
+                "phases": {name: {key: round(value, 4) for key, value in entry.items()}
+                           for name, entry in self.phases.items()},
+                "callables": {name: {key: round(value, 4) for key, value in entry.items()}
+                              for name, entry in self.callables.items()},
+            }
+
+    def activate(self) -> contextvars.Token:
+        """
+        Make this the current tracer of the calling thread or asyncio task
+
+        Returns:
+            Token to pass to deactivate
+        """
+        return _current_tracer.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token) -> None:
+        """Restore the tracer that was current before activate"""
+        _current_tracer.reset(token)
+
+
+def current_tracer() -> Optional[Tracer]:
+    """Get the tracer of the task running in the caller's context, if any"""
+    return _current_tracer.get()
+
+
+@contextmanager
+def trace_span(name: str) -> Iterator[None]:
+    """
+    Time the enclosed block as a span of the current tracer, if there is one
+
+    Args:
+        name: Name of the span (e.g. "llm.create")
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+    else:
+        with tracer.span(name):
+            yield
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator that times every call of a function or coroutine function
+    as a span of the current tracer (see trace_span)
+
+    Args:
+        name: Name of the span
+    """
+    def decorate(function: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with trace_span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with trace_span(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+# Process-wide sinks shared by every AgentLoop
+_aggregate: Optional[TraceAggregate] = None
+_file_sink: Optional[JsonlTraceSink] = None
+_sinks_lock = threading.Lock()
+
+def get_trace_aggregate() -> TraceAggregate:
+    """
+    Get the process-wide span aggregate, creating it on first use
+
+    Returns:
+        The shared TraceAggregate
+    """
+    global _aggregate
+
+    with _sinks_lock:
+        if _aggregate is None:
+            _aggregate = TraceAggregate()
+        return _aggregate
+
+
+def default_trace_sinks() -> List[TraceSink]:
+    """
+    Get the sinks configured by the tracing config
+
+    Returns:
+        The shared aggregate, plus the JSON-lines sink when tracing.path is set
+    """
+    global _file_sink
+
+    if not get_config("tracing.enabled"):
+        return []
+
+    sinks: List[TraceSink] = [get_trace_aggregate()]
+
+    path = get_config("tracing.path")
+    if path:
+        with _sinks_lock:
+            if _file_sink is None or _file_sink.path != path:
+                _file_sink = JsonlTraceSink(path)
+            sinks.append(_file_sink)
+
+    return sinks
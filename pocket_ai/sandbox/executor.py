@@ -0,0 +1,593 @@
+"""
+Executor - Time- and memory-bounded code execution
+
+Every run gets a private working directory and its own process group. A
+wall-clock timeout kills the whole group, rlimits cap CPU time, memory and
+file size, and output beyond a size cap stops the run, so any number of
+executions can safely run side by side. Python and JavaScript snippets run
+on warm worker pools when they are available; everything else is spawned
+here. Output can also be streamed while the code runs, keeping only a
+bounded tail. arun_snippet is the asyncio variant, for callers that run
+many executions on one event loop.
+"""
+
+import asyncio
+import codecs
+import contextvars
+import math
+import os
+import queue
+import selectors
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Deque, Iterator, List, Optional, Tuple
+
+from .worker_pool import (
+    RunHandle, WorkerError, get_node_pool, get_python_pool, kill_group, node_available, pool_supported
+)
+from ..config import get_config
+from ..core.budgets import charge_sandbox_cpu
+from ..core.tracing import trace_span
+from ..utils.logger import get_logger
+from ..utils.metrics import get_registry
+
+logger = get_logger(__name__)
+
+EXECUTION_SECONDS = get_registry().histogram(
+    "pocket_ai_sandbox_execution_seconds", "Wall-clock time of sandboxed code runs", ["language"]
+)
+EXECUTIONS = get_registry().counter(
+    "pocket_ai_sandbox_executions_total", "Sandboxed code runs by outcome", ["language", "outcome"]
+)
+
+# Limits accepted by get_limits, defaulting to the sandbox.limits config
+LIMIT_KEYS = ("timeout", "cpu_seconds", "memory_mb", "max_file_mb", "max_output_bytes")
+
+# Source file name inside the private working directory, per language
+SNIPPET_FILENAMES = {
+    "python": "main.py",
+    "javascript": "main.js",
+}
+
+
+def get_limits(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Get the resource limits for a run
+
+    Args:
+        overrides: Optional limits that replace the configured ones; values
+            that are not positive numbers are ignored, so an override can
+            never turn a limit off
+
+    Returns:
+        Dictionary with timeout, cpu_seconds, memory_mb, max_file_mb and max_output_bytes
+    """
+    limits = {key: get_config(f"sandbox.limits.{key}") for key in LIMIT_KEYS}
+    for key, value in (overrides or {}).items():
+        if key not in LIMIT_KEYS or value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+            logger.warning(f"Ignoring invalid sandbox limit {key}={value!r}")
+            continue
+        limits[key] = value
+    return limits
+
+
+def _limit_resources(limits: Dict[str, Any], limit_address_space: bool):
+    """Build the preexec function that applies rlimits in the child"""
+    import resource
+
+    def apply() -> None:
+        if limits.get("cpu_seconds"):
+            cpu = int(limits["cpu_seconds"])
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        if limit_address_space and limits.get("memory_mb"):
+            memory = int(limits["memory_mb"] * 1024 * 1024)
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        if limits.get("max_file_mb"):
+            size = int(limits["max_file_mb"] * 1024 * 1024)
+            resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+
+    return apply
+
+
+def run_command(command: List[str],
+                cwd: str,
+                limits: Dict[str, Any],
+                limit_address_space: bool = True,
+                on_output: Optional[Callable[[str, str], None]] = None,
+                handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+    """
+    Run a command in its own process group with resource limits
+
+    Args:
+        command: The command to run
+        cwd: Working directory for the command
+        limits: Resource limits (see get_limits)
+        limit_address_space: Whether memory_mb is enforced with RLIMIT_AS
+            (runtimes that reserve large virtual ranges, like V8, need
+            their own heap flag instead)
+        on_output: Optional callback taking (stream name, text) for each
+            chunk as it arrives; streamed output is passed on instead of
+            collected, up to max_output_bytes like collected output
+        handle: Optional handle to kill the command's process group with
+
+    Returns:
+        Dictionary with returncode, stdout, stderr, timed_out,
+        output_limited, wall_time, cpu_time (seconds) and peak_rss_kb
+    """
+    timeout = limits.get("timeout")
+    max_output = limits.get("max_output_bytes") or 0
+    preexec_fn = _limit_resources(limits, limit_address_space) if os.name == "posix" else None
+
+    started_at = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=preexec_fn
+    )
+    if handle is not None:
+        handle.on_kill(lambda: kill_group(process.pid))
+
+    # Read both pipes until EOF without letting either one fill up
+    chunks = {process.stdout: [], process.stderr: []}
+    sizes = {process.stdout: 0, process.stderr: 0}
+    names = {process.stdout: "stdout", process.stderr: "stderr"}
+    decoders = {stream: codecs.getincrementaldecoder("utf-8")("replace") for stream in names}
+    timed_out = False
+    output_limited = False
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ)
+    selector.register(process.stderr, selectors.EVENT_READ)
+    try:
+        while selector.get_map():
+            remaining = None
+            if timeout:
+                remaining = started_at + timeout - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+
+            for key, _ in selector.select(remaining):
+                stream = key.fileobj
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(stream)
+                    if on_output is not None:
+                        text = decoders[stream].decode(b"", final=True)
+                        if text:
+                            on_output(names[stream], text)
+                    continue
+
+                if max_output and sizes[stream] + len(data) > max_output:
+                    data = data[:max_output - sizes[stream]]
+                    output_limited = True
+                sizes[stream] += len(data)
+
+                if on_output is not None:
+                    text = decoders[stream].decode(data, final=output_limited)
+                    if text:
+                        on_output(names[stream], text)
+                else:
+                    chunks[stream].append(data)
+
+            if output_limited:
+                break
+    finally:
+        if handle is not None:
+            handle.on_kill(None)
+        selector.close()
+        process.stdout.close()
+        process.stderr.close()
+
+        # Also takes down anything the command left running in the background
+        kill_group(process.pid)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        "returncode": process.returncode,
+        "stdout": b"".join(chunks[process.stdout]).decode("utf-8", "replace"),
+        "stderr": b"".join(chunks[process.stderr]).decode("utf-8", "replace"),
+        "timed_out": timed_out,
+        "output_limited": output_limited,
+        "wall_time": time.monotonic() - started_at,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kb": usage.ru_maxrss,
+    }
+
+
+async def arun_command(command: List[str],
+                       cwd: str,
+                       limits: Dict[str, Any],
+                       limit_address_space: bool = True) -> Dict[str, Any]:
+    """
+    Run a command like run_command without blocking the event loop
+
+    The pipes are read by the running event loop; only reaping the killed
+    process group happens on a worker thread.
+
+    Args:
+        command: The command to run
+        cwd: Working directory for the command
+        limits: Resource limits (see get_limits)
+        limit_address_space: Whether memory_mb is enforced with RLIMIT_AS
+
+    Returns:
+        The execution result (see run_command)
+    """
+    loop = asyncio.get_running_loop()
+    timeout = limits.get("timeout")
+    max_output = limits.get("max_output_bytes") or 0
+    preexec_fn = _limit_resources(limits, limit_address_space) if os.name == "posix" else None
+
+    started_at = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=preexec_fn
+    )
+
+    chunks: Dict[str, List[bytes]] = {"stdout": [], "stderr": []}
+    sizes = {"stdout": 0, "stderr": 0}
+    timed_out = False
+    output_limited = False
+    transports = []
+
+    async def pump(pipe: Any, name: str) -> None:
+        nonlocal output_limited
+        reader = asyncio.StreamReader(limit=65536)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        transports.append(transport)
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            if max_output and sizes[name] + len(data) > max_output:
+                data = data[:max_output - sizes[name]]
+                output_limited = True
+            chunks[name].append(data)
+            sizes[name] += len(data)
+            if output_limited:
+                return
+
+    pumps = [
+        asyncio.ensure_future(pump(process.stdout, "stdout")),
+        asyncio.ensure_future(pump(process.stderr, "stderr")),
+    ]
+    try:
+        pending = set(pumps)
+        while pending and not output_limited:
+            remaining = None
+            if timeout:
+                remaining = started_at + timeout - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+            _, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pumps:
+            task.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+        for transport in transports:
+            transport.close()
+        process.stdout.close()
+        process.stderr.close()
+
+        # Also takes down anything the command left running in the background
+        kill_group(process.pid)
+        _, status, usage = await asyncio.to_thread(os.wait4, process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        "returncode": process.returncode,
+        "stdout": b"".join(chunks["stdout"]).decode("utf-8", "replace"),
+        "stderr": b"".join(chunks["stderr"]).decode("utf-8", "replace"),
+        "timed_out": timed_out,
+        "output_limited": output_limited,
+        "wall_time": time.monotonic() - started_at,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kb": usage.ru_maxrss,
+    }
+
+
+def _snippet_command(code: str, language: str, limits: Dict[str, Any]) -> Tuple[str, List[str], bool]:
+    """
+    Write a snippet to a new private directory
+
+    Returns:
+        (working directory, command, whether RLIMIT_AS applies)
+    """
+    workdir = tempfile.mkdtemp(prefix="pocket_ai_run_")
+    filename = SNIPPET_FILENAMES[language]
+    with open(os.path.join(workdir, filename), "w", encoding="utf-8") as f:
+        f.write(code)
+
+    if language == "python":
+        return workdir, [sys.executable, filename], True
+
+    command = ["node"]
+    if limits.get("memory_mb"):
+        command.append(f"--max-old-space-size={int(limits['memory_mb'])}")
+    command.append(filename)
+    return workdir, command, False
+
+
+def _spawn_snippet(code: str,
+                   language: str,
+                   limits: Dict[str, Any],
+                   on_output: Optional[Callable[[str, str], None]] = None,
+                   handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+    """Write a snippet to a private directory and run it in a new process"""
+    workdir, command, limit_address_space = _snippet_command(code, language, limits)
+    try:
+        return run_command(command, workdir, limits, limit_address_space=limit_address_space,
+                           on_output=on_output, handle=handle)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _aspawn_snippet(code: str, language: str, limits: Dict[str, Any]) -> Dict[str, Any]:
+    """Write a snippet to a private directory and run it in a new process from a coroutine"""
+    workdir, command, limit_address_space = _snippet_command(code, language, limits)
+    try:
+        return await arun_command(command, workdir, limits, limit_address_space=limit_address_space)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_snippet(code: str,
+                language: str = "python",
+                limits: Optional[Dict[str, Any]] = None,
+                on_output: Optional[Callable[[str, str], None]] = None,
+                handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+    """
+    Run a code snippet with resource limits
+
+    Args:
+        code: The source code to run
+        language: "python" or "javascript"
+        limits: Optional overrides for the configured limits
+        on_output: Optional callback taking (stream name, text) for output
+            chunks as they are produced
+        handle: Optional handle to kill the run with from another thread
+
+    Returns:
+        The execution result (see run_command)
+
+    Raises:
+        ValueError: If the language is not supported
+    """
+    if language.lower() not in SNIPPET_FILENAMES:
+        raise ValueError(f"Unsupported language: {language}")
+
+    language = language.lower()
+    limits = get_limits(limits)
+
+    started = time.monotonic()
+    with trace_span(f"sandbox.{language}"):
+        result = _dispatch_snippet(code, language, limits, on_output, handle)
+    _record_execution(language, result, started)
+    return result
+
+
+async def arun_snippet(code: str,
+                       language: str = "python",
+                       limits: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Run a code snippet with resource limits from a coroutine
+
+    Snippets for the warm worker pools wait for a worker on a thread;
+    spawned runs are read by the event loop itself.
+
+    Args:
+        code: The source code to run
+        language: "python" or "javascript"
+        limits: Optional overrides for the configured limits
+
+    Returns:
+        The execution result (see run_command)
+
+    Raises:
+        ValueError: If the language is not supported
+    """
+    if language.lower() not in SNIPPET_FILENAMES:
+        raise ValueError(f"Unsupported language: {language}")
+
+    language = language.lower()
+    limits = get_limits(limits)
+
+    started = time.monotonic()
+    with trace_span(f"sandbox.{language}"):
+        if _uses_pool(language):
+            result = await asyncio.to_thread(_dispatch_snippet, code, language, limits, None)
+        else:
+            result = await _aspawn_snippet(code, language, limits)
+    _record_execution(language, result, started)
+    return result
+
+
+def _record_execution(language: str, result: Dict[str, Any], started: float) -> None:
+    """Record the duration and outcome of a run and charge its CPU time to the current task"""
+    EXECUTION_SECONDS.observe(time.monotonic() - started, language)
+    charge_sandbox_cpu(result.get("cpu_time") or 0.0)
+
+    if result["timed_out"]:
+        outcome = "timeout"
+    elif result["output_limited"]:
+        outcome = "output_limit"
+    elif result["returncode"] == 0:
+        outcome = "success"
+    else:
+        outcome = "error"
+    EXECUTIONS.inc(language, outcome)
+
+
+def _uses_pool(language: str) -> bool:
+    """Check whether snippets in a language run on a warm worker pool"""
+    if language == "python":
+        return bool(get_config("sandbox.pool.enabled")) and pool_supported()
+    if language == "javascript":
+        return bool(get_config("sandbox.node_pool.enabled")) and node_available()
+    return False
+
+
+def _dispatch_snippet(code: str,
+                      language: str,
+                      limits: Dict[str, Any],
+                      on_output: Optional[Callable[[str, str], None]],
+                      handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+    """Run a snippet on a worker pool or in a spawned process"""
+    if language == "python" and _uses_pool(language):
+        return get_python_pool().run(code, limits, on_output, handle)
+
+    if language == "javascript" and _uses_pool(language):
+        try:
+            return get_node_pool().run(code, limits, on_output, handle)
+        except WorkerError as e:
+            # A snippet that takes down its worker reports like a crashed process
+            logger.warning(f"Node.js sandbox worker failed: {e}")
+            return {
+                "returncode": -1,
+                "stdout": "",
+                "stderr": f"JavaScript worker crashed: {e}",
+                "timed_out": False,
+                "output_limited": False,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "peak_rss_kb": 0,
+            }
+
+    return _spawn_snippet(code, language, limits, on_output, handle)
+
+
+class OutputRingBuffer:
+    """Keeps only the most recent characters of an output stream"""
+
+    def __init__(self, max_chars: int):
+        """
+        Initialize the buffer
+
+        Args:
+            max_chars: Number of trailing characters to keep
+        """
+        self.max_chars = max_chars
+        self.chunks: Deque[str] = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, text: str) -> None:
+        """
+        Add a chunk, discarding the oldest text beyond the cap
+
+        Args:
+            text: The chunk to add
+        """
+        self.chunks.append(text)
+        self.size += len(text)
+
+        while self.size > self.max_chars:
+            excess = self.size - self.max_chars
+            oldest = self.chunks[0]
+            if len(oldest) <= excess:
+                self.chunks.popleft()
+                self.size -= len(oldest)
+                self.dropped += len(oldest)
+            else:
+                self.chunks[0] = oldest[excess:]
+                self.size -= excess
+                self.dropped += excess
+
+    def getvalue(self) -> str:
+        """Get the retained text"""
+        return "".join(self.chunks)
+
+
+def stream_snippet(code: str,
+                   language: str = "python",
+                   limits: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run a code snippet and yield its output as it is produced
+
+    Only the last sandbox.stream.retained_chars characters of each stream
+    are kept for the final result, so large outputs are never held in full.
+    At most sandbox.stream.max_pending_chunks chunks wait for the consumer;
+    beyond that the run is held back until it catches up. Closing the
+    generator early kills the run.
+
+    Args:
+        code: The source code to run
+        language: "python" or "javascript"
+        limits: Optional overrides for the configured limits
+
+    Yields:
+        {"stream": "stdout" | "stderr", "data": text} for each chunk, then
+        {"result": ...} with the execution result (see run_command), whose
+        stdout/stderr hold the retained tail and which adds
+        output_truncated and dropped_chars
+
+    Raises:
+        ValueError: If the language is not supported
+    """
+    if language.lower() not in SNIPPET_FILENAMES:
+        raise ValueError(f"Unsupported language: {language}")
+
+    retained = get_config("sandbox.stream.retained_chars")
+    buffers = {"stdout": OutputRingBuffer(retained), "stderr": OutputRingBuffer(retained)}
+    events: queue.Queue = queue.Queue(maxsize=get_config("sandbox.stream.max_pending_chunks"))
+    handle = RunHandle()
+
+    def put(event: Dict[str, Any]) -> None:
+        # Waits for room while the consumer is there, gives up once it is gone
+        while not handle.killed:
+            try:
+                events.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def on_output(stream: str, text: str) -> None:
+        buffers[stream].append(text)
+        put({"stream": stream, "data": text})
+
+    def run() -> None:
+        try:
+            put({"result": run_snippet(code, language, limits, on_output, handle)})
+        except Exception as e:
+            put({"error": e})
+
+    # The run is charged to the caller's task budget
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+
+    try:
+        while True:
+            event = events.get()
+            if "error" in event:
+                raise event["error"]
+
+            if "result" in event:
+                result = event["result"]
+                result["stdout"] = buffers["stdout"].getvalue()
+                result["stderr"] = buffers["stderr"].getvalue()
+                result["dropped_chars"] = buffers["stdout"].dropped + buffers["stderr"].dropped
+                result["output_truncated"] = result["dropped_chars"] > 0
+                yield {"result": result}
+                return
+
+            yield event
+    finally:
+        # A consumer that stopped reading (e.g. a disconnected client) ends the run
+        handle.kill()
@@ -0,0 +1,388 @@
+/**
+ * Node.js sandbox worker - a warm Node process that runs snippets in fresh vm contexts
+ *
+ * Started by WorkerPool. Reads one JSON request per line on stdin and
+ * writes one JSON response per line, using the same protocol as
+ * python_worker.py. Each snippet runs in a new vm context with its own
+ * console, timers and a private working directory, with module, exports,
+ * require, __filename and __dirname set up as for a spawned main.js.
+ * Synchronous code is interrupted by the vm timeout. While a snippet runs
+ * the worker unreferences its own stdin, so the event loop goes idle
+ * ('beforeExit') exactly when a spawned node would have exited: the run
+ * ends once every timer, I/O request, socket and thread-pool job it started
+ * has finished, or when the wall-clock timeout expires. A run cut short
+ * with resources still open asks the pool to retire the worker.
+ *
+ * Snippets require the worker's own built-in modules, so the worker binds
+ * the helpers it needs once at load time, and a run that changed a module
+ * it required or a shared built-in object also asks to retire the worker.
+ * The vm context keeps runs from seeing each other's globals; it is not a
+ * security boundary (the process-level limits are).
+ */
+
+'use strict';
+
+const fs = require('fs');
+const Module = require('module');
+const os = require('os');
+const path = require('path');
+const readline = require('readline');
+const util = require('util');
+const vm = require('vm');
+
+const SNIPPET_FILENAME = 'main.js';
+
+// The worker's own helpers, bound before any snippet can replace them
+const { mkdtempSync, rmSync, writeFileSync } = fs;
+const { createRequire } = Module;
+const { tmpdir } = os;
+const { join: joinPath } = path;
+const { format, inspect } = util;
+const { Script, createContext } = vm;
+const stringify = JSON.stringify;
+const { byteLength, from: bufferFrom } = Buffer;
+const { bigint: hrtimeBigint } = process.hrtime;
+const { chdir, cpuUsage, cwd, getActiveResourcesInfo, hrtime, memoryUsage, resourceUsage } = process;
+const addProcessListener = process.on.bind(process);
+const removeProcessListener = process.removeListener.bind(process);
+const writeStdout = process.stdout.write.bind(process.stdout);
+const refStdin = process.stdin.ref.bind(process.stdin);
+const unrefStdin = process.stdin.unref.bind(process.stdin);
+// rmSync loads its helpers on first use; load them before a snippet can replace fs functions
+rmSync(mkdtempSync(joinPath(tmpdir(), 'pocket_ai_run_')), { recursive: true, force: true });
+
+// Built-in objects shared by every run, checked for changes after each run
+const SHARED_OBJECTS = [
+    Object.prototype, Array.prototype, Function.prototype, String.prototype,
+    Promise.prototype, JSON, Buffer, Buffer.prototype,
+];
+
+// Thrown inside the snippet to stop it (process.exit or the output limit)
+class StopRun extends Error {}
+
+// Handles (sockets, servers, child processes, watchers) keeping the event loop alive
+function openHandles() {
+    return getActiveResourcesInfo().filter(type => !/Req|^Timeout$|^Immediate$/.test(type)).length;
+}
+
+// The own property values of an object, to tell whether a run changed it
+function ownProperties(object) {
+    const values = new Map();
+    for (const key of Reflect.ownKeys(object)) {
+        const descriptor = Reflect.getOwnPropertyDescriptor(object, key);
+        values.set(key, 'value' in descriptor ? descriptor.value : descriptor.get);
+    }
+    return values;
+}
+
+// Snapshots of shared objects and of the modules snippets have required, taken before first use
+const snapshots = new Map(SHARED_OBJECTS.map(object => [object, ownProperties(object)]));
+
+function changedSince(object) {
+    const before = snapshots.get(object);
+    const after = ownProperties(object);
+    if (after.size !== before.size) return true;
+    for (const [key, value] of after) {
+        if (!before.has(key) || before.get(key) !== value) return true;
+    }
+    return false;
+}
+
+function send(message) {
+    writeStdout(stringify(message) + '\n');
+}
+
+// Drop the worker's own frames from a snippet's stack trace
+function formatError(error) {
+    if (!error || !error.stack) return inspect(error);
+    const lines = error.stack.split('\n');
+    const end = lines.findIndex(line => line.includes('node:vm') || line.includes(__filename));
+    return (end === -1 ? lines : lines.slice(0, end)).join('\n');
+}
+
+function runSnippet(request) {
+    const limits = request.limits || {};
+    const timeoutMs = Number.isFinite(limits.timeout) && limits.timeout > 0 ? Math.ceil(limits.timeout * 1000) : 0;
+    const maxOutput = limits.max_output_bytes || 0;
+    const startedAt = hrtimeBigint();
+    const cpuStart = cpuUsage();
+    const maxRssStart = resourceUsage().maxRSS;
+    let rssPeak = memoryUsage().rss;
+    let finishRun = () => {};
+
+    const output = { stdout: [], stderr: [] };
+    const sizes = { stdout: 0, stderr: 0 };
+    const timers = new Set();
+    let returncode = 0;
+    let timedOut = false;
+    let outputLimited = false;
+    let finished = false;
+
+    // Streamed output is sent as it is written, up to the same limit as collected output
+    function emit(stream, text) {
+        if (request.stream) {
+            send({ id: request.id, stream: stream, data: text });
+        } else {
+            output[stream].push(text);
+        }
+    }
+
+    function write(stream, text) {
+        if (finished) return;
+        text = String(text);
+
+        const size = byteLength(text);
+        if (maxOutput && sizes[stream] + size > maxOutput) {
+            emit(stream, bufferFrom(text).subarray(0, maxOutput - sizes[stream]).toString());
+            sizes[stream] = maxOutput;
+            outputLimited = true;
+            setImmediate(() => finishRun());
+            throw new StopRun('output limit exceeded');
+        }
+        emit(stream, text);
+        sizes[stream] += size;
+    }
+
+    function reportError(error) {
+        if (error instanceof StopRun) return;
+        returncode = 1;
+        try {
+            write('stderr', formatError(error) + '\n');
+        } catch (e) {
+            // Output limit reached while reporting the error
+        }
+    }
+
+    const workdir = mkdtempSync(joinPath(tmpdir(), 'pocket_ai_run_'));
+    const filename = joinPath(workdir, SNIPPET_FILENAME);
+    const module = { id: '.', filename: filename, path: workdir, exports: {}, loaded: false, children: [] };
+    writeFileSync(filename, request.code);
+
+    // Modules are shared with later runs; remember what they looked like before this one
+    const loadModule = createRequire(filename);
+    const required = new Set();
+    const snippetRequire = id => {
+        const exports = loadModule(id);
+        if (exports !== null && (typeof exports === 'object' || typeof exports === 'function')) {
+            if (!snapshots.has(exports)) snapshots.set(exports, ownProperties(exports));
+            required.add(exports);
+        }
+        return exports;
+    };
+    snippetRequire.resolve = loadModule.resolve;
+    snippetRequire.cache = loadModule.cache;
+
+    const logTo = stream => (...args) => write(stream, format(...args) + '\n');
+    // No prototype from the worker's realm, so this.constructor is the context's own Object
+    const sandbox = Object.assign(Object.create(null), {
+        console: {
+            log: logTo('stdout'),
+            info: logTo('stdout'),
+            debug: logTo('stdout'),
+            error: logTo('stderr'),
+            warn: logTo('stderr'),
+            dir: (value, options) => write('stdout', inspect(value, options) + '\n'),
+        },
+        process: {
+            argv: [process.execPath, SNIPPET_FILENAME],
+            env: {},
+            platform: process.platform,
+            version: process.version,
+            versions: { ...process.versions },
+            cwd: () => cwd(),
+            hrtime: Object.assign(time => hrtime(time), { bigint: () => hrtimeBigint() }),
+            memoryUsage: () => memoryUsage(),
+            nextTick: (callback, ...args) => queueMicrotask(() => callback(...args)),
+            stdout: { write: text => { write('stdout', text); return true; } },
+            stderr: { write: text => { write('stderr', text); return true; } },
+            exit: code => {
+                returncode = code === undefined ? 0 : code;
+                throw new StopRun('exit');
+            },
+        },
+        setTimeout: (callback, delay, ...args) => {
+            const handle = setTimeout(() => {
+                timers.delete(handle);
+                try {
+                    callback(...args);
+                } catch (error) {
+                    reportError(error);
+                }
+            }, delay);
+            timers.add(handle);
+            return handle;
+        },
+        setInterval: (callback, delay, ...args) => {
+            const handle = setInterval(() => {
+                try {
+                    callback(...args);
+                } catch (error) {
+                    reportError(error);
+                }
+            }, delay);
+            timers.add(handle);
+            return handle;
+        },
+        setImmediate: (callback, ...args) => {
+            const handle = setImmediate(() => {
+                timers.delete(handle);
+                try {
+                    callback(...args);
+                } catch (error) {
+                    reportError(error);
+                }
+            });
+            timers.add(handle);
+            return handle;
+        },
+        clearTimeout: handle => { timers.delete(handle); clearTimeout(handle); },
+        clearInterval: handle => { timers.delete(handle); clearInterval(handle); },
+        clearImmediate: handle => { timers.delete(handle); clearImmediate(handle); },
+        queueMicrotask: queueMicrotask,
+        require: snippetRequire,
+        module: module,
+        exports: module.exports,
+        __filename: filename,
+        __dirname: workdir,
+        Buffer: Buffer,
+        URL: URL,
+        URLSearchParams: URLSearchParams,
+        TextEncoder: TextEncoder,
+        TextDecoder: TextDecoder,
+    });
+
+    sandbox.global = sandbox;
+    sandbox.globalThis = sandbox;
+
+    const previousCwd = cwd();
+    chdir(workdir);
+
+    const onRejection = error => reportError(error);
+    addProcessListener('unhandledRejection', onRejection);
+    // An error thrown from an I/O callback ends the run, as it would end a spawned node
+    const onException = error => {
+        reportError(error);
+        finishRun();
+    };
+    addProcessListener('uncaughtException', onException);
+
+    // Only the snippet's own work may keep the event loop alive during the run
+    unrefStdin();
+    const baseline = openHandles();
+
+    try {
+        const script = new Script(request.code, { filename: filename });
+        script.runInContext(createContext(sandbox), timeoutMs ? { timeout: timeoutMs } : {});
+        module.loaded = true;
+    } catch (error) {
+        if (error && error.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT') {
+            timedOut = true;
+            returncode = -9;
+        } else {
+            reportError(error);
+        }
+    }
+    rssPeak = Math.max(rssPeak, memoryUsage().rss);
+
+    return new Promise(resolve => {
+        let deadlineTimer = null;
+
+        function finish(idle) {
+            if (finished) return;
+            finished = true;
+            removeProcessListener('beforeExit', onIdle);
+            if (deadlineTimer) clearTimeout(deadlineTimer);
+            rssPeak = Math.max(rssPeak, memoryUsage().rss);
+
+            for (const handle of timers) {
+                clearTimeout(handle);
+                clearInterval(handle);
+                clearImmediate(handle);
+            }
+            // Sockets, servers or child processes the run left open cannot be
+            // closed from here, nor can changes it made to shared modules be
+            // undone; a fresh worker replaces this one
+            let retire = (!idle && openHandles() > baseline) ||
+                SHARED_OBJECTS.some(changedSince) || [...required].some(changedSince);
+
+            refStdin();
+            removeProcessListener('unhandledRejection', onRejection);
+            removeProcessListener('uncaughtException', onException);
+            try {
+                chdir(previousCwd);
+                rmSync(workdir, { recursive: true, force: true });
+            } catch (error) {
+                retire = true;
+            }
+
+            // The worker's lifetime peak only tells about this run if the run raised it
+            const maxRss = resourceUsage().maxRSS;
+            const cpu = cpuUsage(cpuStart);
+            resolve({
+                returncode: outputLimited && returncode === 0 ? -9 : returncode,
+                stdout: output.stdout.join(''),
+                stderr: output.stderr.join(''),
+                timed_out: timedOut,
+                output_limited: outputLimited,
+                wall_time: Number(hrtimeBigint() - startedAt) / 1e9,
+                cpu_time: (cpu.user + cpu.system) / 1e6,
+                peak_rss_kb: maxRss > maxRssStart ? maxRss : Math.floor(rssPeak / 1024),
+                retire: retire,
+            });
+        }
+
+        function onIdle() {
+            finish(true);
+        }
+
+        finishRun = () => finish(false);
+        if (timedOut || outputLimited) {
+            finish(false);
+            return;
+        }
+
+        addProcessListener('beforeExit', onIdle);
+        if (timeoutMs) {
+            const remaining = timeoutMs - Number(hrtimeBigint() - startedAt) / 1e6;
+            deadlineTimer = setTimeout(() => {
+                timedOut = true;
+                returncode = -9;
+                finish(false);
+            }, Math.max(0, remaining));
+            deadlineTimer.unref();
+        }
+    });
+}
+
+async function main() {
+    send({ ready: true, pid: process.pid });
+
+    const lines = readline.createInterface({ input: process.stdin });
+    for await (const line of lines) {
+        if (!line.trim()) continue;
+
+        const request = JSON.parse(line);
+        let response;
+        try {
+            response = await runSnippet(request);
+        } catch (error) {
+            response = {
+                returncode: -1,
+                stdout: '',
+                stderr: `Worker error: ${error}`,
+                timed_out: false,
+                output_limited: false,
+                wall_time: 0,
+                cpu_time: 0,
+                peak_rss_kb: 0,
+                worker_error: true,
+            };
+        }
+
+        response.id = request.id;
+        response.worker_rss_kb = Math.floor(memoryUsage().rss / 1024);
+        send(response);
+    }
+}
+
+main();
@@ -0,0 +1,295 @@
+"""
+Python sandbox worker - a warm interpreter that runs snippets in forked children
+
+Started by WorkerPool. Reads one JSON request per line on stdin, forks a
+child per request so every snippet gets a clean namespace (and the parent
+keeps its already-imported modules warm), and writes one JSON response per
+line with the child's output, exit status, timing and resource usage.
+
+This file is run as a script and must not import pocket_ai.
+"""
+
+import codecs
+import json
+import linecache
+import os
+import selectors
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+# Name shown for the snippet in tracebacks
+SNIPPET_FILENAME = "main.py"
+
+# Imported once by the worker so forked children get them for free
+PRELOAD_MODULES = (
+    "collections", "datetime", "functools", "itertools", "json",
+    "math", "random", "re", "string", "typing",
+)
+
+
+def current_rss_kb() -> int:
+    """Get this process's resident set size in kilobytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def apply_limits(limits: dict) -> None:
+    """
+    Apply resource limits to the current process
+
+    Args:
+        limits: Dictionary with cpu_seconds, memory_mb and max_file_mb
+    """
+    import resource
+
+    if limits.get("cpu_seconds"):
+        cpu = int(limits["cpu_seconds"])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    if limits.get("memory_mb"):
+        memory = int(limits["memory_mb"] * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if limits.get("max_file_mb"):
+        size = int(limits["max_file_mb"] * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+
+
+def run_child(code: str, stdout_fd: int, stderr_fd: int, workdir: str, limits: dict) -> None:
+    """
+    Run a snippet in the forked child and exit
+
+    Args:
+        code: The Python source to run
+        stdout_fd: Pipe to use as the child's stdout
+        stderr_fd: Pipe to use as the child's stderr
+        workdir: Private working directory for this run
+        limits: Resource limits to apply before running the snippet
+    """
+    status = 1
+    try:
+        # Own process group, so a timeout can kill anything the snippet starts
+        os.setsid()
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+
+        # The worker's stdin carries the next requests and its other
+        # descriptors include the protocol stream; the snippet gets neither
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        os.chdir(workdir)
+        apply_limits(limits)
+
+        sys.stdin = os.fdopen(0, "r", closefd=False)
+        sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+        sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+        sys.argv = [SNIPPET_FILENAME]
+
+        # Make tracebacks show the snippet's source lines
+        linecache.cache[SNIPPET_FILENAME] = (len(code), None, code.splitlines(True), SNIPPET_FILENAME)
+
+        status = 0
+        try:
+            compiled = compile(code, SNIPPET_FILENAME, "exec")
+            exec(compiled, {"__name__": "__main__", "__file__": SNIPPET_FILENAME, "__builtins__": __builtins__})
+        except SystemExit as e:
+            if e.code is None:
+                status = 0
+            elif isinstance(e.code, int):
+                status = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except BaseException as e:
+            # Hide this worker's frames, like running the file directly would
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != SNIPPET_FILENAME:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb)
+            status = 1
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status & 0xFF)
+
+
+def kill_group(pgid: int) -> None:
+    """Kill a process group, ignoring groups that are already gone"""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_snippet(code: str, limits: dict, on_output=None, on_start=None) -> dict:
+    """
+    Run a snippet in a forked child and collect its output
+
+    The child gets its own process group and a private working directory.
+    The whole group is killed when the wall-clock timeout expires or an
+    output stream exceeds max_output_bytes.
+
+    Args:
+        code: The Python source to run
+        limits: Dictionary with timeout, cpu_seconds, memory_mb,
+            max_file_mb and max_output_bytes
+        on_output: Optional callback taking (stream name, text) for each
+            chunk as it arrives; streamed output is passed on instead of
+            collected, up to max_output_bytes like collected output
+        on_start: Optional callback taking the child's pid (which is also
+            its process group) once it is forked
+
+    Returns:
+        Dictionary with returncode, stdout, stderr, timed_out,
+        output_limited, wall_time, cpu_time and peak_rss_kb
+    """
+    timeout = limits.get("timeout")
+    max_output = limits.get("max_output_bytes") or 0
+    workdir = tempfile.mkdtemp(prefix="pocket_ai_run_")
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+
+    started_at = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        os.close(stdout_r)
+        os.close(stderr_r)
+        run_child(code, stdout_w, stderr_w, workdir, limits)
+
+    os.close(stdout_w)
+    os.close(stderr_w)
+    if on_start is not None:
+        on_start(pid)
+
+    # Read both pipes until EOF without letting either one fill up
+    chunks = {stdout_r: [], stderr_r: []}
+    sizes = {stdout_r: 0, stderr_r: 0}
+    names = {stdout_r: "stdout", stderr_r: "stderr"}
+    decoders = {fd: codecs.getincrementaldecoder("utf-8")("replace") for fd in names}
+    timed_out = False
+    output_limited = False
+    selector = selectors.DefaultSelector()
+    selector.register(stdout_r, selectors.EVENT_READ)
+    selector.register(stderr_r, selectors.EVENT_READ)
+    try:
+        while selector.get_map():
+            remaining = None
+            if timeout:
+                remaining = started_at + timeout - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                    if on_output is not None:
+                        text = decoders[key.fd].decode(b"", final=True)
+                        if text:
+                            on_output(names[key.fd], text)
+                    continue
+
+                if max_output and sizes[key.fd] + len(data) > max_output:
+                    data = data[:max_output - sizes[key.fd]]
+                    output_limited = True
+                sizes[key.fd] += len(data)
+
+                if on_output is not None:
+                    text = decoders[key.fd].decode(data, final=output_limited)
+                    if text:
+                        on_output(names[key.fd], text)
+                else:
+                    chunks[key.fd].append(data)
+
+            if output_limited:
+                break
+    finally:
+        selector.close()
+        os.close(stdout_r)
+        os.close(stderr_r)
+
+        # Also takes down anything the snippet left running in the background
+        kill_group(pid)
+        _, status, usage = os.wait4(pid, 0)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stdout": b"".join(chunks[stdout_r]).decode("utf-8", "replace"),
+        "stderr": b"".join(chunks[stderr_r]).decode("utf-8", "replace"),
+        "timed_out": timed_out,
+        "output_limited": output_limited,
+        "wall_time": time.monotonic() - started_at,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kb": usage.ru_maxrss,
+    }
+
+
+def main() -> None:
+    """Serve requests until stdin is closed"""
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    # Keep the protocol stream private so stray prints cannot corrupt it
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    protocol.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        request = json.loads(line)
+        request_id = request.get("id")
+
+        on_output = None
+        on_start = None
+        if request.get("stream"):
+            def on_output(stream, text, request_id=request_id):
+                protocol.write(json.dumps({"id": request_id, "stream": stream, "data": text}) + "\n")
+
+            # Lets the pool stop a streamed run whose reader went away
+            def on_start(pid, request_id=request_id):
+                protocol.write(json.dumps({"id": request_id, "pgid": pid}) + "\n")
+
+        try:
+            response = run_snippet(request["code"], request.get("limits") or {}, on_output, on_start)
+        except Exception as e:
+            response = {
+                "returncode": -1,
+                "stdout": "",
+                "stderr": f"Worker error: {e}",
+                "timed_out": False,
+                "output_limited": False,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "peak_rss_kb": 0,
+                "worker_error": True,
+            }
+
+        response["id"] = request_id
+        response["worker_rss_kb"] = current_rss_kb()
+        protocol.write(json.dumps(response) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+Worker Pool - Warm interpreter processes for code execution
+
+Starting a fresh interpreter for every snippet costs tens of milliseconds of
+startup and import time. The pool keeps a few long-lived worker processes
+that receive code over a pipe and run each snippet in a clean namespace
+(a freshly forked child for Python, a new vm context for Node.js) without
+paying for interpreter startup. Workers are recycled after a number of runs
+or when they grow past a memory limit, and killed by a watchdog when they
+overrun a snippet's timeout.
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+from ..config import get_config
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PYTHON_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+NODE_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "node_worker.js")
+
+# Seconds past a snippet's timeout before the watchdog kills its worker
+WATCHDOG_GRACE = 2.0
+
+
+def kill_group(pgid: int) -> None:
+    """Kill a process group, ignoring groups that are already gone"""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class RunHandle:
+    """
+    Lets the caller of a run stop it from another thread
+
+    Whatever runs the snippet registers how to kill it while it is running;
+    kill() calls that right away, or as soon as it is registered.
+    """
+
+    def __init__(self):
+        """Initialize the handle"""
+        self.lock = threading.Lock()
+        self.killer: Optional[Callable[[], None]] = None
+        self.killed = False
+
+    def on_kill(self, killer: Optional[Callable[[], None]]) -> None:
+        """
+        Register how to kill the run
+
+        Args:
+            killer: Function that kills the run, or None once it has ended
+        """
+        with self.lock:
+            self.killer = killer
+            killed = self.killed
+        if killed and killer is not None:
+            killer()
+
+    def kill(self) -> None:
+        """Kill the run, now or as soon as it starts"""
+        with self.lock:
+            self.killed = True
+            killer = self.killer
+        if killer is not None:
+            killer()
+
+
+class WorkerError(Exception):
+    """Raised when a worker process dies or breaks the protocol"""
+    pass
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when the watchdog killed a worker that overran the snippet's timeout"""
+    pass
+
+
+class WorkerUnavailable(WorkerError):
+    """Raised when a request could not be sent to a worker, so its snippet never ran"""
+    pass
+
+
+class SandboxWorker:
+    """A single long-lived worker process speaking the JSON-lines protocol"""
+
+    def __init__(self, command: List[str]):
+        """
+        Start the worker process
+
+        Args:
+            command: The command that starts the worker
+        """
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.created_at = time.time()
+        self.ready = False
+        self.runs = 0
+        self.rss_kb = 0
+        self.next_id = 0
+        self.expired = False
+        self.cancelled = False
+        # Set when a run left the worker in a state it could not clean up
+        self.retire = False
+
+    def _expire(self) -> None:
+        """Kill the worker from the watchdog timer"""
+        self.expired = True
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def _cancel(self) -> None:
+        """Kill the worker because the caller gave up on its run"""
+        self.cancelled = True
+        self._expire()
+
+    def _read_message(self) -> Dict[str, Any]:
+        """Read one protocol message from the worker"""
+        line = self.process.stdout.readline()
+        if not line:
+            raise WorkerError(f"Worker {self.process.pid} exited with status {self.process.poll()}")
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise WorkerError(f"Invalid message from worker {self.process.pid}: {line[:200]!r}") from e
+
+    def run(self,
+            code: str,
+            limits: Optional[Dict[str, Any]] = None,
+            on_output: Optional[Callable[[str, str], None]] = None,
+            handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+        """
+        Run a snippet on this worker
+
+        Args:
+            code: The source code to run
+            limits: Resource limits for the run (see executor.get_limits)
+            on_output: Optional callback taking (stream name, text) for
+                output chunks as they are produced
+            handle: Optional handle to kill the run with; until the worker
+                reports the run's process group, killing it kills the worker
+
+        Returns:
+            The execution result (see executor.run_command)
+
+        Raises:
+            WorkerUnavailable: If the worker died before the request was sent
+            WorkerTimeout: If the worker was killed for overrunning the timeout
+            WorkerError: If the worker died or sent a malformed response
+        """
+        if not self.ready:
+            try:
+                self._read_message()
+            except WorkerError as e:
+                raise WorkerUnavailable(str(e)) from e
+            self.ready = True
+
+        # The worker enforces the timeout itself; the watchdog catches
+        # workers that are stuck (e.g. a busy loop in a Node.js timer)
+        timeout = (limits or {}).get("timeout") or get_config("sandbox.limits.timeout")
+        watchdog = None
+        if timeout:
+            watchdog = threading.Timer(timeout + WATCHDOG_GRACE, self._expire)
+            watchdog.daemon = True
+            watchdog.start()
+
+        if handle is not None:
+            handle.on_kill(self._cancel)
+        try:
+            response = self._send_and_receive(code, limits, on_output, handle)
+        except WorkerError as e:
+            if self.cancelled:
+                raise WorkerTimeout(f"Worker {self.process.pid} killed with its cancelled run") from e
+            if self.expired:
+                raise WorkerTimeout(f"Worker {self.process.pid} killed after {timeout}s") from e
+            raise
+        finally:
+            if handle is not None:
+                handle.on_kill(None)
+            if watchdog is not None:
+                watchdog.cancel()
+
+        self.runs += 1
+        self.rss_kb = response.pop("worker_rss_kb", 0)
+        self.retire = bool(response.pop("retire", False))
+        if response.pop("worker_error", False):
+            # The worker failed outside the snippet, so its own state may be broken
+            logger.warning(f"Retiring sandbox worker {self.process.pid} after a worker error: {response.get('stderr')}")
+            self.retire = True
+        response.pop("id", None)
+        return response
+
+    def _send_and_receive(self,
+                          code: str,
+                          limits: Optional[Dict[str, Any]],
+                          on_output: Optional[Callable[[str, str], None]],
+                          handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+        """Send one request and read messages up to its response"""
+
+        self.next_id += 1
+        try:
+            self.process.stdin.write(json.dumps({
+                "id": self.next_id,
+                "code": code,
+                "limits": limits or {},
+                "stream": on_output is not None
+            }) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerUnavailable(f"Could not send code to worker {self.process.pid}: {e}") from e
+
+        response = self._read_message()
+        while "stream" in response or "pgid" in response:
+            if "stream" in response:
+                on_output(response["stream"], response["data"])
+            elif handle is not None:
+                # Killing the run's process group leaves the worker running
+                pgid = response["pgid"]
+                handle.on_kill(lambda: kill_group(pgid))
+            response = self._read_message()
+        return response
+
+    def is_alive(self) -> bool:
+        """Check whether the worker process is still running"""
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        """Stop the worker process"""
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class WorkerPool:
+    """
+    A bounded pool of warm worker processes
+
+    Each run checks out an idle worker (starting one if the pool is below
+    its size, waiting otherwise), so a worker only ever runs one snippet at
+    a time.
+    """
+
+    def __init__(self,
+                 command: List[str],
+                 size: Optional[int] = None,
+                 max_runs: Optional[int] = None,
+                 max_memory_mb: Optional[float] = None,
+                 retry: bool = True):
+        """
+        Initialize the worker pool
+
+        Args:
+            command: The command that starts a worker
+            size: Maximum number of worker processes
+            max_runs: Number of runs after which a worker is recycled
+            max_memory_mb: Worker resident memory above which it is recycled
+            retry: Retry a snippet on a fresh worker when it could not be
+                sent to its worker
+        """
+        self.command = command
+        self.size = size or get_config("sandbox.pool.size")
+        self.max_runs = max_runs or get_config("sandbox.pool.max_runs")
+        self.max_memory_mb = max_memory_mb or get_config("sandbox.pool.max_memory_mb")
+        self.retry = retry
+
+        self.idle: List[SandboxWorker] = []
+        self.total = 0
+        self.lock = threading.Condition()
+        self.counters = {
+            "started": 0,
+            "runs": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "killed": 0,
+            "waits": 0,
+        }
+
+    def prestart(self) -> None:
+        """Start workers until the pool is full, so the first runs are warm too"""
+        with self.lock:
+            while self.total < self.size:
+                self.idle.append(self._start_worker())
+                self.total += 1
+
+    def _start_worker(self) -> SandboxWorker:
+        """Start a new worker process (lock must be held)"""
+        self.counters["started"] += 1
+        return SandboxWorker(self.command)
+
+    def _checkout(self) -> SandboxWorker:
+        """Take an idle worker, starting or waiting for one as needed"""
+        with self.lock:
+            while True:
+                while self.idle:
+                    worker = self.idle.pop()
+                    if worker.is_alive():
+                        return worker
+                    self.total -= 1
+                    self.counters["crashed"] += 1
+
+                if self.total < self.size:
+                    self.total += 1
+                    try:
+                        return self._start_worker()
+                    except Exception:
+                        self.total -= 1
+                        raise
+
+                self.counters["waits"] += 1
+                self.lock.wait()
+
+    def _checkin(self, worker: SandboxWorker, discard: bool = False, reason: Optional[str] = None) -> None:
+        """Return a worker to the pool, recycling it if it is worn out"""
+        if discard:
+            reason = reason or "crashed"
+        elif worker.runs >= self.max_runs or worker.retire:
+            reason = "recycled"
+        elif worker.rss_kb > self.max_memory_mb * 1024:
+            reason = "recycled"
+            logger.info(f"Recycling sandbox worker using {worker.rss_kb // 1024} MB")
+
+        if reason is not None:
+            worker.close()
+
+        with self.lock:
+            if reason is None:
+                self.idle.append(worker)
+            else:
+                self.total -= 1
+                self.counters[reason] += 1
+            self.lock.notify()
+
+    def run(self,
+            code: str,
+            limits: Optional[Dict[str, Any]] = None,
+            on_output: Optional[Callable[[str, str], None]] = None,
+            handle: Optional[RunHandle] = None) -> Dict[str, Any]:
+        """
+        Run a snippet on a warm worker
+
+        A failed worker is replaced. When retries are enabled and the
+        snippet never reached the failed worker, it is retried once on a
+        fresh one; a snippet that may have started is not run again, so its
+        side effects are not repeated. A worker killed by the watchdog is
+        replaced and the run reported as timed out.
+
+        Args:
+            code: The source code to run
+            limits: Resource limits for the run (see executor.get_limits)
+            on_output: Optional callback taking (stream name, text) for
+                output chunks as they are produced
+            handle: Optional handle to kill the run with (see RunHandle)
+
+        Returns:
+            The execution result (see executor.run_command)
+
+        Raises:
+            WorkerError: If the snippet could not be run
+        """
+        for attempt in range(2):
+            worker = self._checkout()
+            started = time.monotonic()
+            try:
+                response = worker.run(code, limits, on_output, handle)
+            except WorkerTimeout as e:
+                logger.warning(f"Sandbox worker killed: {e}")
+                self._checkin(worker, discard=True, reason="killed")
+                return {
+                    "returncode": -9,
+                    "stdout": "",
+                    "stderr": "",
+                    "timed_out": True,
+                    "output_limited": False,
+                    "wall_time": time.monotonic() - started,
+                    "cpu_time": 0.0,
+                    "peak_rss_kb": 0,
+                }
+            except WorkerError as e:
+                self._checkin(worker, discard=True)
+                if attempt == 0 and self.retry and isinstance(e, WorkerUnavailable):
+                    logger.warning(f"Sandbox worker failed, retrying on a new one: {e}")
+                    continue
+                raise
+            except BaseException:
+                # The worker may be mid-response; do not hand it out again
+                self._checkin(worker, discard=True)
+                raise
+
+            with self.lock:
+                self.counters["runs"] += 1
+            self._checkin(worker)
+            return response
+
+        raise WorkerError("No sandbox worker available")
+
+    def close_all(self) -> None:
+        """Stop every idle worker"""
+        with self.lock:
+            workers, self.idle = self.idle, []
+            self.total -= len(workers)
+
+        for worker in workers:
+            worker.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics
+
+        Returns:
+            Dictionary with pool size, usage and lifetime counters
+        """
+        with self.lock:
+            return {
+                "size": self.size,
+                "workers": self.total,
+                "idle": len(self.idle),
+                "in_use": self.total - len(self.idle),
+                "max_runs": self.max_runs,
+                "max_memory_mb": self.max_memory_mb,
+                **self.counters,
+            }
+
+
+def pool_supported() -> bool:
+    """Check whether forked sandbox workers are available on this platform"""
+    return hasattr(os, "fork")
+
+
+# Shared Python worker pool used by every ProgrammingTools call in the process
+_python_pool: Optional[WorkerPool] = None
+_python_pool_lock = threading.Lock()
+
+def get_python_pool() -> WorkerPool:
+    """
+    Get the process-wide Python worker pool, starting it on first use
+
+    Returns:
+        The shared WorkerPool
+    """
+    global _python_pool
+
+    with _python_pool_lock:
+        if _python_pool is None:
+            _python_pool = WorkerPool([sys.executable, PYTHON_WORKER_SCRIPT])
+            _python_pool.prestart()
+        return _python_pool
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get statistics of the worker pools that have been started
+
+    Returns:
+        Dictionary mapping "python" and "node" to their pool's stats
+    """
+    pools = {"python": _python_pool, "node": _node_pool}
+    return {name: pool.stats() for name, pool in pools.items() if pool is not None}
+
+
+def node_available() -> bool:
+    """Check whether the node executable is on the PATH"""
+    return shutil.which("node") is not None
+
+
+# Shared Node.js worker pool used for JavaScript snippets
+_node_pool: Optional[WorkerPool] = None
+_node_pool_lock = threading.Lock()
+
+def get_node_pool() -> WorkerPool:
+    """
+    Get the process-wide Node.js worker pool, starting it on first use
+
+    Snippets share their worker's heap, which is capped at the
+    sandbox.limits.memory_mb limit.
+
+    Returns:
+        The shared WorkerPool
+    """
+    global _node_pool
+
+    with _node_pool_lock:
+        if _node_pool is None:
+            _node_pool = WorkerPool(
+                ["node", f"--max-old-space-size={get_config('sandbox.limits.memory_mb')}", NODE_WORKER_SCRIPT],
+                size=get_config("sandbox.node_pool.size"),
+                max_runs=get_config("sandbox.node_pool.max_runs"),
+                max_memory_mb=get_config("sandbox.node_pool.max_memory_mb"),
+                retry=False
+            )
+            _node_pool.prestart()
+        return _node_pool
@@ -4,14 +4,25 @@ Web server for ポケットAI (Pocket AI)
 
 import os
 import json
-from typing import Dict, Any, List, Optional
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 
-from .agent.agent import PocketAI
+from .agent.agent_cache import AgentCache, hash_api_key
+from .agent.programming_tools import ProgrammingTools
+from .agent.result_cache import get_result_cache
+from .browser.browser_pool import get_browser_pool
+from .core.budgets import LIMIT_KEYS as BUDGET_KEYS
+from .core.checkpoints import OWNER_KEY, TaskBusy, get_checkpoint_store, valid_task_id
+from .core.jobs import Job, JobManager, JobQueueFull
+from .core.tracing import get_trace_aggregate
+from .sandbox.worker_pool import pool_stats
 from .config import get_config
 from .utils.logger import get_logger
+from .utils.metrics import get_registry, stats_families
 
 logger = get_logger(__name__)
 
@@ -19,8 +30,166 @@ logger = get_logger(__name__)
 app = Flask(__name__, template_folder="templates", static_folder="static")
 CORS(app)  # Enable CORS for all routes
 
-# Create ポケットAI instance
-pocket_ai = None
+# Warm ポケットAI instances, one per concurrent request
+agent_cache = AgentCache()
+
+# Programming tools for /api/execute_code
+programming_tools = ProgrammingTools()
+
+def run_job(job: Job) -> Dict[str, Any]:
+    """Run a background job on a ポケットAI instance checked out for it"""
+    with agent_cache.agent(job.options.get("api_key")) as agent:
+        agent.agent_loop.register_listener(job.publish)
+        try:
+            return agent.run(job.task, initial_context=job.context, should_stop=job.is_cancelled,
+                             resume_task_id=job.options.get("resume_task_id"),
+                             budget=job.options.get("budget"))
+        finally:
+            agent.agent_loop.unregister_listener(job.publish)
+
+# Background job manager for /api/jobs
+job_manager = JobManager(run_job)
+
+# Request metrics for /metrics
+REQUEST_SECONDS = get_registry().histogram(
+    "pocket_ai_http_request_duration_seconds", "HTTP request latency", ["endpoint", "method"]
+)
+REQUESTS = get_registry().counter(
+    "pocket_ai_http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "method", "status"]
+)
+
+def request_timeout(value: Any) -> Optional[float]:
+    """
+    Read a sandbox timeout from a request
+    
+    Clients may shorten the configured timeout but not extend or disable it.
+    
+    Raises:
+        ValueError: If the timeout is not a positive number
+    """
+    if value is None:
+        return None
+    
+    timeout = float(value)
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds")
+    return min(timeout, get_config("sandbox.limits.timeout"))
+
+def request_budget(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read a task's budget from a request
+    
+    Takes an optional "budget" object with "deadline" (seconds), "tokens"
+    and "sandbox_cpu" (seconds). Clients may tighten the configured limits
+    but not loosen them.
+    
+    Raises:
+        ValueError: If the budget is malformed
+    """
+    requested = data.get("budget") or {}
+    if not isinstance(requested, dict):
+        raise ValueError("budget must be an object")
+    
+    budget = {}
+    for key in BUDGET_KEYS:
+        if requested.get(key) is None:
+            continue
+        value = float(requested[key])
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f"budget.{key} must be a positive number")
+        maximum = get_config(f"agent.budget.{key}")
+        value = min(value, maximum) if maximum else value
+        budget[key] = int(value) if key == "tokens" else value
+    return budget
+
+def request_context(data: Dict[str, Any], owner: str) -> Dict[str, Any]:
+    """
+    Read a task's initial context from a request
+    
+    The task id comes only from resume_task_id (or is generated), and the
+    owner is always the caller, so a client cannot write into another
+    caller's task.
+    """
+    context = data.get("context") or {}
+    if not isinstance(context, dict):
+        raise ValueError("context must be an object")
+    
+    context = {key: value for key, value in context.items() if key != "task_id"}
+    context[OWNER_KEY] = owner
+    return context
+
+def resume_conflict(resume_task_id: Any, owner: str) -> Optional[Tuple[Any, int]]:
+    """
+    Check whether the caller may run a task under resume_task_id
+    
+    Returns:
+        An error response and status, or None if the task may be run
+    """
+    if resume_task_id is None:
+        return None
+    if not valid_task_id(resume_task_id):
+        return jsonify({"error": "Invalid resume_task_id"}), 400
+    
+    store = get_checkpoint_store()
+    checkpoint_owner = store.owner(resume_task_id)
+    if checkpoint_owner is not None and checkpoint_owner != owner:
+        return jsonify({"error": "Task belongs to another API key"}), 403
+    
+    running = store.is_running(resume_task_id) or any(
+        job.options.get("resume_task_id") == resume_task_id for job in job_manager.active_jobs()
+    )
+    if running:
+        return jsonify({"error": f"Task {resume_task_id} is already running"}), 409
+    return None
+
+def collect_component_metrics() -> List[Any]:
+    """Report job queue, pool and cache statistics at scrape time"""
+    jobs = job_manager.stats()
+    families = [
+        ("pocket_ai_job_queue_depth", "gauge", "Jobs waiting for a worker", [({}, jobs["queue_depth"])]),
+        ("pocket_ai_jobs", "gauge", "Jobs by state", [({"state": state}, count) for state, count in jobs["jobs"].items()]),
+    ]
+    families += stats_families(
+        "pocket_ai_browser_pool", get_browser_pool().stats(),
+        gauges=["size", "in_use", "idle", "launching"],
+        counters=["launched", "checkouts", "reused", "waits", "timeouts"]
+    )
+    for language, stats in pool_stats().items():
+        families += stats_families(
+            "pocket_ai_sandbox_pool", stats,
+            gauges=["workers", "idle", "in_use"],
+            counters=["started", "runs", "recycled", "crashed", "killed", "waits"],
+            labels={"language": language}
+        )
+    families += stats_families(
+        "pocket_ai_result_cache", get_result_cache().stats(),
+        gauges=["entries", "bytes", "hit_rate"],
+        counters=["hits", "misses", "skipped"]
+    )
+    families += stats_families(
+        "pocket_ai_agent_cache", agent_cache.stats(),
+        gauges=["idle_agents", "agents_in_use"],
+        counters=["hits", "misses"]
+    )
+    return families
+
+get_registry().register_collector(collect_component_metrics)
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started"""
+    g.request_started = time.monotonic()
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """Count the request and record its latency"""
+    started = g.pop("request_started", None)
+    if started is not None and get_config("metrics.enabled"):
+        # The route pattern keeps label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.monotonic() - started, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, response.status_code)
+    return response
 
 @app.route("/")
 def index():
@@ -30,30 +199,39 @@ def index():
 @app.route("/api/run", methods=["POST"])
 def run_agent():
     """Run the agent with a task"""
-    global pocket_ai
-    
     # Get request data
     data = request.json
     task = data.get("task", "")
-    context = data.get("context", {})
     api_key = data.get("api_key", "")
+    resume_task_id = data.get("resume_task_id")
+    owner = hash_api_key(api_key)
     
-    # Validate input
-    if not task:
+    # Validate input (a resumed task comes from its checkpoint)
+    if not task and not resume_task_id:
         return jsonify({"error": "No task provided"}), 400
-    
-    # Initialize ポケットAI if needed
-    if pocket_ai is None or api_key:
-        pocket_ai = PocketAI(api_key=api_key)
+    try:
+        budget = request_budget(data)
+        context = request_context(data, owner)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    conflict = resume_conflict(resume_task_id, owner)
+    if conflict is not None:
+        return conflict
     
     try:
-        # Run the agent
-        result = pocket_ai.run(task, initial_context=context)
+        # Run the agent on an instance reserved for this request
+        with agent_cache.agent(api_key) as agent:
+            result = agent.run(task, initial_context=context, resume_task_id=resume_task_id, budget=budget)
         
         return jsonify({
             "success": True,
             "result": result
         })
+    except TaskBusy as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 409
     except Exception as e:
         logger.error(f"Error running agent: {e}")
         return jsonify({
@@ -61,27 +239,146 @@ def run_agent():
             "error": str(e)
         }), 500
 
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """Submit a task to run in the background"""
+    # Get request data
+    data = request.json
+    task = data.get("task", "")
+    api_key = data.get("api_key", "")
+    resume_task_id = data.get("resume_task_id")
+    owner = hash_api_key(api_key)
+    
+    # Validate input (a resumed task comes from its checkpoint)
+    if not task and not resume_task_id:
+        return jsonify({"error": "No task provided"}), 400
+    try:
+        budget = request_budget(data)
+        context = request_context(data, owner)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    conflict = resume_conflict(resume_task_id, owner)
+    if conflict is not None:
+        return conflict
+    
+    try:
+        job = job_manager.submit(task, context, {
+            "api_key": api_key,
+            "resume_task_id": resume_task_id,
+            "budget": budget
+        })
+    except JobQueueFull as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 429
+    
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status
+    }), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    """Get the status and (partial) result of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job.to_dict()
+    })
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events(job_id: str):
+    """Stream a job's agent loop events as Server-Sent Events"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    # Resume after the last event the client saw when it reconnects
+    last_event_id = request.headers.get("Last-Event-ID")
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    
+    def generate():
+        position = start
+        while True:
+            events = job.wait_for_events(position, timeout=15)
+            if not events:
+                if job.is_done():
+                    return
+                # Keep the connection open through proxies
+                yield ": keepalive\n\n"
+                continue
+            
+            for event in events:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+            position += len(events)
+            
+            if job.is_done() and position >= len(job.events):
+                return
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job.to_dict()
+    })
+
 @app.route("/api/execute_code", methods=["POST"])
 def execute_code():
-    """Execute code"""
-    global pocket_ai
+    """
+    Execute code
     
+    With "stream": true the output is sent as Server-Sent Events while the
+    code runs: "stdout" and "stderr" events carry {"data": text} chunks and
+    a final "result" event carries the execution result. "cache" overrides
+    the result_cache.enabled config for the call.
+    """
     # Get request data
     data = request.json
     code = data.get("code", "")
     language = data.get("language", "python")
+    timeout = data.get("timeout")
+    stream = bool(data.get("stream", False))
+    use_cache = data.get("cache")
     
     # Validate input
     if not code:
         return jsonify({"error": "No code provided"}), 400
-    
-    # Initialize ポケットAI if needed
-    if pocket_ai is None:
-        pocket_ai = PocketAI()
+    try:
+        timeout = request_timeout(timeout)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid timeout: {e}"}), 400
     
     try:
+        if stream:
+            def generate():
+                for event in programming_tools.execute_code_stream(code, language, timeout=timeout):
+                    if "result" in event:
+                        yield f"event: result\ndata: {json.dumps(event['result'], default=str)}\n\n"
+                    else:
+                        yield f"event: {event['stream']}\ndata: {json.dumps({'data': event['data']})}\n\n"
+            
+            return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"
+            })
+        
         # Execute code
-        result = pocket_ai.programming_tools.execute_code(code, language)
+        result = programming_tools.execute_code(code, language, timeout=timeout, use_cache=use_cache)
         
         return jsonify({
             "success": True,
@@ -94,6 +391,100 @@ def execute_code():
             "error": str(e)
         }), 500
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Expose metrics in the Prometheus text format"""
+    if not get_config("metrics.enabled"):
+        return jsonify({"error": "Metrics are disabled"}), 404
+    
+    return Response(get_registry().render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/browser/pool", methods=["GET"])
+def browser_pool_stats():
+    """Get browser pool statistics"""
+    return jsonify(get_browser_pool().stats())
+
+@app.route("/api/execute_batch", methods=["POST"])
+def execute_batch():
+    """
+    Execute several snippets concurrently
+    
+    Takes {"snippets": [{"code", "language", "timeout"}, ...]} with optional
+    "parallelism" and "cache", and returns one result per snippet in input
+    order.
+    """
+    # Get request data
+    data = request.json
+    snippets = data.get("snippets")
+    parallelism = data.get("parallelism")
+    use_cache = data.get("cache")
+    
+    # Validate input
+    if not snippets or not isinstance(snippets, list):
+        return jsonify({"error": "No snippets provided"}), 400
+    
+    max_snippets = get_config("sandbox.batch.max_snippets")
+    if len(snippets) > max_snippets:
+        return jsonify({"error": f"Too many snippets (at most {max_snippets})"}), 400
+    if parallelism is not None and (
+        isinstance(parallelism, bool) or not isinstance(parallelism, int) or parallelism <= 0
+    ):
+        return jsonify({"error": "parallelism must be a positive integer"}), 400
+    
+    # Work on copies so the request's own snippet dicts are left as sent
+    checked = []
+    try:
+        for index, snippet in enumerate(snippets):
+            if isinstance(snippet, dict):
+                snippet = dict(snippet, timeout=request_timeout(snippet.get("timeout")))
+            checked.append(snippet)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid timeout in snippet {index}: {e}"}), 400
+    
+    try:
+        started = time.monotonic()
+        results = programming_tools.execute_many(
+            checked,
+            parallelism=parallelism,
+            use_cache=use_cache
+        )
+        
+        return jsonify({
+            "success": True,
+            "results": results,
+            "duration": round(time.monotonic() - started, 4)
+        })
+    except Exception as e:
+        logger.error(f"Error executing batch: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route("/api/traces/summary", methods=["GET"])
+def trace_summary():
+    """Get agent loop timing aggregated over all tasks"""
+    return jsonify(get_trace_aggregate().summary())
+
+@app.route("/api/checkpoints", methods=["GET"])
+def list_checkpoints():
+    """
+    List the caller's interrupted tasks that can be resumed with resume_task_id
+    
+    The caller is identified by the API key in the X-API-Key header (none
+    for tasks run with the server's default key), as tasks are by the
+    api_key they were submitted with.
+    """
+    store = get_checkpoint_store()
+    return jsonify({
+        "tasks": store.list_tasks(owner=hash_api_key(request.headers.get("X-API-Key", "")))
+    })
+
+@app.route("/api/sandbox/cache", methods=["GET"])
+def result_cache_stats():
+    """Get execute_code/analyze_code result cache statistics"""
+    return jsonify(get_result_cache().stats())
+
 def create_app():
     """Create and configure the Flask app"""
     return app
@@ -95,7 +95,7 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    function callAgent(task) {
+    function showLoadingMessage() {
         // Add a loading message
         const loadingDiv = document.createElement('div');
         loadingDiv.className = 'message system';
@@ -105,6 +105,7 @@ document.addEventListener('DOMContentLoaded', function() {
         loadingContent.className = 'message-content';
         
         const loadingText = document.createElement('p');
+        loadingText.id = 'loading-text';
         loadingText.textContent = '考え中...';
         
         loadingContent.appendChild(loadingText);
@@ -113,6 +114,54 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function updateLoadingMessage(text) {
+        const loadingText = document.getElementById('loading-text');
+        if (loadingText) {
+            loadingText.textContent = text;
+        }
+    }
+
+    function removeLoadingMessage() {
+        const loadingMessage = document.getElementById('loading-message');
+        if (loadingMessage) {
+            chatMessages.removeChild(loadingMessage);
+        }
+    }
+
+    function renderResult(result) {
+        // Get the final evaluation or action results
+        let responseMessage = '';
+        
+        if (result.stop_reason && result.error) {
+            responseMessage = `エラーが発生しました: ${result.error}`;
+        } else if (result.evaluation && result.evaluation.feedback) {
+            responseMessage = result.evaluation.feedback;
+        } else if (result.action_results) {
+            if (result.action_results.message) {
+                responseMessage = result.action_results.message;
+            } else if (result.action_results.output) {
+                responseMessage = result.action_results.output;
+            } else {
+                responseMessage = 'タスクを実行しました。';
+            }
+        } else {
+            responseMessage = 'タスクを受け取りました。';
+        }
+        
+        // Add response to chat
+        addMessageToChat(responseMessage, 'system');
+    }
+
+    function callAgent(task) {
+        showLoadingMessage();
+        
+        // Stream progress when the browser supports Server-Sent Events
+        if (window.EventSource) {
+            callAgentStreaming(task);
+            return;
+        }
         
         // Call the API
         fetch('/api/run', {
@@ -127,46 +176,17 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
-            // Remove loading message
-            const loadingMessage = document.getElementById('loading-message');
-            if (loadingMessage) {
-                chatMessages.removeChild(loadingMessage);
-            }
+            removeLoadingMessage();
             
             if (data.success) {
-                // Process the response
-                const result = data.result;
-                
-                // Get the final evaluation or action results
-                let responseMessage = '';
-                
-                if (result.evaluation && result.evaluation.feedback) {
-                    responseMessage = result.evaluation.feedback;
-                } else if (result.action_results) {
-                    if (result.action_results.message) {
-                        responseMessage = result.action_results.message;
-                    } else if (result.action_results.output) {
-                        responseMessage = result.action_results.output;
-                    } else {
-                        responseMessage = 'タスクを実行しました。';
-                    }
-                } else {
-                    responseMessage = 'タスクを受け取りました。';
-                }
-                
-                // Add response to chat
-                addMessageToChat(responseMessage, 'system');
+                renderResult(data.result);
             } else {
                 // Handle error
                 addMessageToChat(`エラーが発生しました: ${data.error}`, 'system');
             }
         })
         .catch(error => {
-            // Remove loading message
-            const loadingMessage = document.getElementById('loading-message');
-            if (loadingMessage) {
-                chatMessages.removeChild(loadingMessage);
-            }
+            removeLoadingMessage();
             
             // Handle error
             addMessageToChat(`通信エラーが発生しました: ${error.message}`, 'system');
@@ -177,6 +197,91 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    function callAgentStreaming(task) {
+        // Submit the task as a background job
+        fetch('/api/jobs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                task: task,
+                api_key: apiKey
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'ジョブを開始できませんでした');
+            }
+            
+            // Follow the job's progress
+            const events = new EventSource(`/api/jobs/${data.job_id}/events`);
+            
+            events.addEventListener('observe', function(e) {
+                const event = JSON.parse(e.data);
+                updateLoadingMessage(`🔍 観察中... (${event.iteration}回目)`);
+            });
+            
+            events.addEventListener('judge', function(e) {
+                const event = JSON.parse(e.data);
+                const action = event.parsed_action || {};
+                updateLoadingMessage(`🚀 実行中: ${action.action || 'unknown'} (${event.iteration}回目)`);
+                
+                if (action.reasoning) {
+                    addMessageToChat(`🤔 ${action.action}: ${action.reasoning}`, 'system');
+                }
+            });
+            
+            events.addEventListener('act', function(e) {
+                const event = JSON.parse(e.data);
+                const results = event.action_results || {};
+                
+                if (results.output) {
+                    addMessageToChat(results.output, 'system');
+                } else if (results.error) {
+                    addMessageToChat(`⚠️ ${results.error}`, 'system');
+                }
+                updateLoadingMessage(`📊 評価中... (${event.iteration}回目)`);
+            });
+            
+            events.addEventListener('done', function(e) {
+                const job = JSON.parse(e.data);
+                events.close();
+                removeLoadingMessage();
+                
+                if (job.status === 'completed' && job.result) {
+                    renderResult(job.result);
+                } else if (job.status === 'cancelled') {
+                    addMessageToChat('タスクはキャンセルされました。', 'system');
+                } else {
+                    addMessageToChat(`エラーが発生しました: ${job.error}`, 'system');
+                }
+                
+                // Reset waiting state
+                isWaitingForResponse = false;
+            });
+            
+            events.onerror = function() {
+                // EventSource reconnects on its own unless the stream is closed
+                if (events.readyState === EventSource.CLOSED) {
+                    removeLoadingMessage();
+                    addMessageToChat('通信エラーが発生しました', 'system');
+                    isWaitingForResponse = false;
+                }
+            };
+        })
+        .catch(error => {
+            removeLoadingMessage();
+            
+            // Handle error
+            addMessageToChat(`通信エラーが発生しました: ${error.message}`, 'system');
+            
+            // Reset waiting state
+            isWaitingForResponse = false;
+        });
+    }
+
     function executeCode() {
         const code = codeEditor.value.trim();
         const language = languageSelect.value;
@@ -185,8 +290,9 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Clear previous output
         outputContent.textContent = '実行中...';
+        outputContent.style.color = 'var(--text-color)';
         
-        // Call the API
+        // Call the API, streaming output as it is produced
         fetch('/api/execute_code', {
             method: 'POST',
             headers: {
@@ -194,31 +300,75 @@ document.addEventListener('DOMContentLoaded', function() {
             },
             body: JSON.stringify({
                 code: code,
-                language: language
+                language: language,
+                stream: true
             })
         })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                const result = data.result;
-                
-                if (result.success) {
-                    outputContent.textContent = result.output || '出力なし';
-                    outputContent.style.color = 'var(--text-color)';
-                } else {
-                    outputContent.textContent = result.error || 'エラーが発生しました';
-                    outputContent.style.color = 'var(--error-color)';
-                }
-            } else {
-                outputContent.textContent = data.error || 'エラーが発生しました';
-                outputContent.style.color = 'var(--error-color)';
+        .then(response => {
+            if (!response.ok || !response.body) {
+                return response.json().then(data => {
+                    throw new Error(data.error || 'エラーが発生しました');
+                });
             }
+            return readExecutionStream(response.body.getReader());
         })
         .catch(error => {
             outputContent.textContent = `通信エラーが発生しました: ${error.message}`;
             outputContent.style.color = 'var(--error-color)';
         });
     }
+    
+    function readExecutionStream(reader) {
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = '';
+        
+        function handleEvent(name, data) {
+            if (name === 'stdout' || name === 'stderr') {
+                streamed += data.data;
+                outputContent.textContent = streamed;
+                return;
+            }
+            
+            if (name === 'result') {
+                if (data.success) {
+                    outputContent.textContent = streamed || data.output || '出力なし';
+                    outputContent.style.color = 'var(--text-color)';
+                } else {
+                    outputContent.textContent = data.error || 'エラーが発生しました';
+                    outputContent.style.color = 'var(--error-color)';
+                }
+            }
+        }
+        
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) return;
+                
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Server-Sent Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    
+                    let name = 'message';
+                    let payload = '';
+                    block.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) name = line.slice(7);
+                        else if (line.startsWith('data: ')) payload += line.slice(6);
+                    });
+                    
+                    if (payload) handleEvent(name, JSON.parse(payload));
+                }
+                
+                return read();
+            });
+        }
+        
+        return read();
+    }
 
     function handleToolClick(tool) {
         switch (tool) {
@@ -0,0 +1,290 @@
+"""
+Metrics - Prometheus-style counters and histograms
+
+A small dependency-free implementation of the Prometheus text exposition
+format. Counters and histograms are updated in place under a per-metric
+lock held only for a dictionary update, so instrumentation can stay on in
+production. Values that already live elsewhere (pool sizes, queue depth)
+are read at scrape time by registered collector functions.
+"""
+
+import bisect
+import threading
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# A collected sample: (metric name, type, help, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: Any) -> str:
+    """Escape a label value"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    """Format a label set as {name="value",...}"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize the counter
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels, in the order values are passed
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: Any, amount: float = 1) -> None:
+        """
+        Increase the counter
+
+        Args:
+            *labelvalues: One value per label name
+            amount: Amount to add
+        """
+        key = tuple(str(value) for value in labelvalues)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        """Render the counter in the text exposition format"""
+        with self.lock:
+            values = sorted(self.values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set"""
+
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Initialize the histogram
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels, in the order values are passed
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        """
+        Record an observation
+
+        Args:
+            value: The observed value
+            *labelvalues: One value per label name
+        """
+        key = tuple(str(label) for label in labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        """Render the histogram in the text exposition format"""
+        with self.lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self.values.items())
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics and collectors rendered by /metrics"""
+
+    def __init__(self):
+        """Initialize the registry"""
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {}
+        self.collectors: List[Callable[[], List[Family]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """
+        Get or create a counter
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels
+
+        Returns:
+            The registered Counter
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, help_text, labelnames)
+            return self.metrics[name]
+
+    def histogram(self,
+                  name: str,
+                  help_text: str,
+                  labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Get or create a histogram
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels
+            buckets: Upper bounds of the buckets
+
+        Returns:
+            The registered Histogram
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, help_text, labelnames, buckets)
+            return self.metrics[name]
+
+    def register_collector(self, collector: Callable[[], List[Family]]) -> None:
+        """
+        Register a function that reports values at scrape time
+
+        Args:
+            collector: Callable returning (name, type, help, samples) tuples,
+                where samples is a list of (labels, value) pairs
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+
+        Returns:
+            The exposition text
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        # Several collectors may report samples of the same family
+        collected: Dict[str, Family] = {}
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector error: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                if name in collected:
+                    collected[name][3].extend(samples)
+                else:
+                    collected[name] = (name, metric_type, help_text, list(samples))
+
+        for name, metric_type, help_text, samples in collected.values():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def stats_families(prefix: str,
+                   stats: Dict[str, Any],
+                   gauges: Sequence[str],
+                   counters: Sequence[str],
+                   labels: Optional[Dict[str, str]] = None) -> List[Family]:
+    """
+    Turn a component's stats() dictionary into metric families
+
+    Args:
+        prefix: Metric name prefix
+        stats: The stats dictionary
+        gauges: Keys reported as gauges
+        counters: Keys reported as counters (with a _total suffix)
+        labels: Labels added to every sample
+
+    Returns:
+        The metric families for the keys present in stats
+    """
+    labels = labels or {}
+    families: List[Family] = []
+    for key in gauges:
+        if isinstance(stats.get(key), (int, float)):
+            families.append((f"{prefix}_{key}", "gauge", f"Current {key.replace('_', ' ')}", [(labels, stats[key])]))
+    for key in counters:
+        if isinstance(stats.get(key), (int, float)):
+            families.append((f"{prefix}_{key}_total", "counter", f"Total {key.replace('_', ' ')}", [(labels, stats[key])]))
+    return families
+
+
+# Registry shared by the whole process
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> MetricsRegistry:
+    """
+    Get the process-wide metrics registry, creating it on first use
+
+    Returns:
+        The shared MetricsRegistry
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
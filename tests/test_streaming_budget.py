@@ -0,0 +1,47 @@
+"""
+Tests that streamed LLM calls are charged to the task's budget
+"""
+
+from pocket_ai.core.budgets import TaskBudget
+from pocket_ai.core.llm import LLMManager
+from pocket_ai.core.llm_backends import ScriptedBackend
+
+
+def make_manager() -> LLMManager:
+    """Create an LLM manager answering from a scripted backend"""
+    manager = LLMManager(api_key="test-key")
+    manager.backend = ScriptedBackend([
+        {"action": "complete", "parameters": {"summary": "Done"}, "reasoning": "The task is finished"}
+    ])
+    return manager
+
+
+def test_streamed_call_drained_in_background_is_charged_to_budget():
+    manager = make_manager()
+    budget = TaskBudget({"tokens": 1})
+    token = budget.activate()
+    try:
+        response = manager.stream_next_action({"task": "Say done"})
+        action = response.wait_for_action()
+        response.drain_in_background()
+    finally:
+        budget.deactivate(token)
+
+    response.finish(timeout=5)
+
+    assert action["action"] == "complete"
+    assert budget.tokens > 0
+    assert budget.exceeded() == "token_budget_exceeded"
+
+
+def test_streamed_call_finished_in_caller_is_charged_to_budget():
+    manager = make_manager()
+    budget = TaskBudget()
+    token = budget.activate()
+    try:
+        response = manager.stream_next_action({"task": "Say done"})
+        response.finish(timeout=5)
+    finally:
+        budget.deactivate(token)
+
+    assert budget.tokens > 0